@@ -744,21 +744,13 @@ class A2AOrchestrator:
                 stage,
                 roundtable
             )
-            response_with_citations, citations = citation_manager.add_citations_to_content(
+            response_with_citations, citations = await asyncio.to_thread(
+                citation_manager.add_citations_to_content,
                 response,
-                role.value
+                role.value,
+                session_id=session_id
             )
 
-            if citations:
-                citation_manager.citations.extend(citations)
-                seen_ids = set()
-                unique_citations = []
-                for cite in citation_manager.citations:
-                    if cite['id'] not in seen_ids:
-                        seen_ids.add(cite['id'])
-                        unique_citations.append(cite)
-                citation_manager.citations = unique_citations
-
             message = A2AMessage(
                 id=str(uuid.uuid4()),
                 session_id=session_id,
@@ -907,20 +899,12 @@ class A2AOrchestrator:
 💡 **提示**：讨论已完成！您可以随时发送消息继续探讨特定问题，或导出完整的研究方案。"""
 
         # 添加引用
-        summary_with_citations, citations = citation_manager.add_citations_to_content(
+        summary_with_citations, citations = await asyncio.to_thread(
+            citation_manager.add_citations_to_content,
             formatted_summary,
-            "clinical_director"
+            "clinical_director",
+            session_id=session_id
         )
-        
-        if citations:
-            citation_manager.citations.extend(citations)
-            seen_ids = set()
-            unique_citations = []
-            for cite in citation_manager.citations:
-                if cite['id'] not in seen_ids:
-                    seen_ids.add(cite['id'])
-                    unique_citations.append(cite)
-            citation_manager.citations = unique_citations
 
         # 发送总结消息
         summary_msg = A2AMessage(
@@ -1063,23 +1047,13 @@ class A2AOrchestrator:
             )
             
             # 添加引用文献
-            response_with_citations, citations = citation_manager.add_citations_to_content(
+            response_with_citations, citations = await asyncio.to_thread(
+                citation_manager.add_citations_to_content,
                 response,
-                role.value
+                role.value,
+                session_id=session_id
             )
             
-            # 保存引用
-            if citations:
-                citation_manager.citations.extend(citations)
-                # 去重
-                seen_ids = set()
-                unique_citations = []
-                for cite in citation_manager.citations:
-                    if cite['id'] not in seen_ids:
-                        seen_ids.add(cite['id'])
-                        unique_citations.append(cite)
-                citation_manager.citations = unique_citations
-            
             message = A2AMessage(
                 id=str(uuid.uuid4()),
                 session_id=session_id,
@@ -1330,22 +1304,12 @@ class A2AOrchestrator:
         )
         
         # 添加引用文献
-        response_with_citations, citations = citation_manager.add_citations_to_content(
-            response, 
-            role.value
+        response_with_citations, citations = await asyncio.to_thread(
+            citation_manager.add_citations_to_content,
+            response,
+            role.value,
+            session_id=session_id
         )
-        
-        # 保存引用
-        if citations:
-            citation_manager.citations.extend(citations)
-            # 去重
-            seen_ids = set()
-            unique_citations = []
-            for cite in citation_manager.citations:
-                if cite['id'] not in seen_ids:
-                    seen_ids.add(cite['id'])
-                    unique_citations.append(cite)
-            citation_manager.citations = unique_citations
 
         response_msg = A2AMessage(
             id=str(uuid.uuid4()),
@@ -1,13 +1,66 @@
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Optional
+import os
 import re
+import threading
 from urllib.parse import quote_plus
 
+try:
+    from backend.reference_index import build_reference_index
+except Exception:  # pragma: no cover - numpy 不可用时退回关键词顺序
+    build_reference_index = None
+
+# 最多保留多少个会话的引用台账；超过后淘汰最久未使用的会话
+MAX_LEDGERS = int(os.getenv("CITATION_MAX_LEDGERS", "1000"))
+
+
+class CitationLedger:
+    """单个圆桌会话的引用台账
+
+    按文献 id 建索引，同一篇文献在会话内只编号一次，编号从 1 连续递增。
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._entries: Dict[str, Dict] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def cite(self, ref: Dict) -> Dict:
+        """登记一篇文献并返回带会话内编号的副本（已登记则复用原编号）"""
+        with self._lock:
+            entry = self._entries.get(ref['id'])
+            if entry is None:
+                self._counter += 1
+                entry = {**ref, 'number': self._counter}
+                self._entries[ref['id']] = entry
+            return entry
+
+    def get(self, ref_id: str) -> Optional[Dict]:
+        return self._entries.get(ref_id)
+
+    def citations(self) -> List[Dict]:
+        """按编号顺序返回全部引用（插入顺序即编号顺序）"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def __contains__(self, ref_id: str) -> bool:
+        return ref_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class CitationManager:
     """文献引用管理器"""
     
     def __init__(self):
-        self.citations = []
-        self.citation_counter = 0
+        # 每个圆桌会话一本独立台账，避免并发会话互相覆盖编号；按最近使用排序，数量有上限
+        self._ledgers: "OrderedDict[str, CitationLedger]" = OrderedDict()
+        self._ledgers_lock = threading.Lock()
+        # 文献向量索引在启动时由 warm_up 在线程里构建或从磁盘映射（未预热时首次引用时构建）
+        self._reference_index = None
+        self._index_lock = threading.Lock()
         
         # 模拟文献数据库（实际应用中应连接真实数据库）
         self.reference_database = {
@@ -201,6 +254,21 @@ class CitationManager:
             ]
         }
 
+    def get_ledger(self, session_id: str) -> CitationLedger:
+        """获取（必要时创建）会话的引用台账
+
+        讨论结束后导出仍要读台账，所以不在结束时清空；台账数超过 MAX_LEDGERS 时淘汰最久未使用的会话。
+        """
+        with self._ledgers_lock:
+            ledger = self._ledgers.get(session_id)
+            if ledger is None:
+                ledger = self._ledgers[session_id] = CitationLedger(session_id)
+                while len(self._ledgers) > MAX_LEDGERS:
+                    self._ledgers.popitem(last=False)
+            else:
+                self._ledgers.move_to_end(session_id)
+        return ledger
+
     def _pubmed_url(self, ref: Dict) -> str:
         query = ref.get("title") or ref.get("authors") or ref.get("journal") or ""
         return f"https://pubmed.ncbi.nlm.nih.gov/?term={quote_plus(query)}"
@@ -238,8 +306,38 @@ class CitationManager:
 
         return relevant_refs
     
-    def add_citations_to_content(self, content: str, role: str) -> tuple:
-        """为内容添加引用标记，返回（带引用的内容，引用列表）"""
+    def _get_reference_index(self):
+        if self._reference_index is None and build_reference_index is not None:
+            with self._index_lock:
+                if self._reference_index is None:
+                    try:
+                        self._reference_index = build_reference_index(self.reference_database)
+                    except Exception as e:
+                        print(f"构建文献索引失败，使用关键词顺序: {e}")
+                        return None
+        return self._reference_index
+
+    def warm_up(self) -> bool:
+        """加载句向量模型并构建文献索引；会阻塞（可能下载模型），应在线程里调用"""
+        return self._get_reference_index() is not None
+
+    def rank_references(self, content: str, refs: List[Dict], top_k: int = 2) -> List[Dict]:
+        """按与内容的语义相似度对候选文献重排，取前 top_k 篇"""
+        if len(refs) <= top_k:
+            return refs[:top_k]
+        index = self._get_reference_index()
+        if index is None:
+            return refs[:top_k]
+        by_id = {ref['id']: ref for ref in refs}
+        ranked = index.top_k(content, k=top_k, candidate_ids=list(by_id))
+        selected = [by_id[ref_id] for ref_id, _ in ranked]
+        return selected or refs[:top_k]
+    
+    def add_citations_to_content(self, content: str, role: str, session_id: str) -> tuple:
+        """为内容添加引用标记并登记到会话台账，返回（带引用的内容，引用列表）
+
+        语义重排要编码文本（索引未就绪时还会加载模型），在事件循环里应通过 asyncio.to_thread 调用。
+        """
         
         # 查找相关文献
         refs = self.find_relevant_references(content)
@@ -247,15 +345,12 @@ class CitationManager:
         if not refs:
             return content, []
         
-        # 根据角色选择最相关的1-2篇文献
-        selected_refs = refs[:2]
+        # 语义重排后选择最相关的1-2篇文献，编号由会话台账统一分配
+        ledger = self.get_ledger(session_id)
+        selected_refs = [ledger.cite(ref) for ref in self.rank_references(content, refs, top_k=2)]
         
         # 添加引用标记
-        citation_marks = []
-        for i, ref in enumerate(selected_refs, 1):
-            self.citation_counter += 1
-            ref['number'] = self.citation_counter
-            citation_marks.append(f"[{self.citation_counter}]")
+        citation_marks = [f"[{ref['number']}]" for ref in selected_refs]
         
         # 在内容末尾添加引用标记
         if citation_marks:
@@ -282,10 +377,13 @@ class CitationManager:
 
         return content, selected_refs
     
-    def get_all_citations(self) -> List[Dict]:
-        """获取所有引用文献的格式化列表"""
-        sorted_refs = sorted(self.citations, key=lambda x: x.get('number', 0))
-        return sorted_refs
+    def get_all_citations(self, session_id: str) -> List[Dict]:
+        """获取会话内所有引用文献（按编号排序）"""
+        with self._ledgers_lock:
+            ledger = self._ledgers.get(session_id)
+            if ledger is not None:
+                self._ledgers.move_to_end(session_id)
+        return ledger.citations() if ledger else []
     
     def format_citation(self, ref: Dict) -> str:
         """格式化单条引用为文本"""
@@ -311,21 +409,22 @@ class CitationManager:
 
         return citation_text
     
-    def generate_reference_list(self) -> str:
-        """生成完整的参考文献列表"""
-        if not self.citations:
+    def generate_reference_list(self, session_id: str) -> str:
+        """生成会话的完整参考文献列表"""
+        citations = self.get_all_citations(session_id)
+        if not citations:
             return ""
         
         ref_list = "## 参考文献\n\n"
-        for ref in sorted(self.citations, key=lambda x: x.get('number', 0)):
+        for ref in citations:
             ref_list += f"[{ref.get('number', '')}] {self.format_citation(ref)}\n\n"
         
         return ref_list
     
-    def reset(self):
-        """重置引用管理器"""
-        self.citations = []
-        self.citation_counter = 0
+    def reset(self, session_id: str):
+        """清空指定会话的引用台账，不影响其他会话"""
+        with self._ledgers_lock:
+            self._ledgers.pop(session_id, None)
 
 # 全局引用管理器实例
 citation_manager = CitationManager()
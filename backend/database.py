@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer, ForeignKey, JSON, Boolean, Float
+from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer, ForeignKey, JSON, Boolean, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import uuid
 import hashlib
+from functools import lru_cache
 import os
 from pathlib import Path
 
@@ -15,6 +16,16 @@ engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+def app_data_dir() -> Path:
+    """应用数据目录：SQLite 时为数据库文件所在目录，否则为运行时数据目录"""
+    if DATABASE_URL.startswith("sqlite:///"):
+        db_file = DATABASE_URL.replace("sqlite:///", "", 1)
+        if db_file and db_file != ":memory:":
+            return Path(db_file).parent
+    return RUNTIME_DATA_ROOT
+
+
 class User(Base):
     """用户表 - 支持Second Me OAuth和本地注册"""
     __tablename__ = "users"
@@ -259,11 +270,19 @@ class ProtocolRecord(Base):
     version = Column(Integer, default=1)
     status = Column(String(50), default="uploaded")
     uploaded_by = Column(String(255), nullable=True)
-    roundtable_id = Column(String(36), nullable=True, index=True)
+    roundtable_id = Column(String(36), nullable=True)
     extra_metadata = Column("metadata", JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 列表按 (created_at, id) 倒序做游标分页，各过滤条件带上排序列
+    __table_args__ = (
+        Index("ix_research_protocols_created", "created_at", "id"),
+        Index("ix_research_protocols_roundtable_created", "roundtable_id", "created_at", "id"),
+        Index("ix_research_protocols_uploader_created", "uploaded_by", "created_at", "id"),
+        Index("ix_research_protocols_status_created", "status", "created_at", "id"),
+    )
+
 
 class DatabaseRecord(Base):
     """研究数据库上传记录"""
@@ -279,12 +298,82 @@ class DatabaseRecord(Base):
     row_count = Column(Integer, nullable=True)
     column_count = Column(Integer, nullable=True)
     uploaded_by = Column(String(255), nullable=True)
-    roundtable_id = Column(String(36), nullable=True, index=True)
-    protocol_id = Column(String(36), nullable=True, index=True)
+    roundtable_id = Column(String(36), nullable=True)
+    protocol_id = Column(String(36), nullable=True)
     extra_metadata = Column("metadata", JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_research_databases_created", "created_at", "id"),
+        Index("ix_research_databases_roundtable_created", "roundtable_id", "created_at", "id"),
+        Index("ix_research_databases_protocol_created", "protocol_id", "created_at", "id"),
+        Index("ix_research_databases_uploader_created", "uploaded_by", "created_at", "id"),
+    )
+
+class ContentBlobRecord(Base):
+    """按内容哈希去重存储的上传文件，多条上传记录可引用同一份内容"""
+    __tablename__ = "content_blobs"
+
+    id = Column(String(100), primary_key=True)  # {kind}:{sha256}.{file_type}
+    kind = Column(String(20), nullable=False)  # database / protocol
+    sha256 = Column(String(64), nullable=False, index=True)
+    file_path = Column(String(1000), nullable=False)
+    file_type = Column(String(20), nullable=False)
+    file_size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    # 由内容决定的解析结果（schema、行列数、列式副本、画像），同一内容的记录共用
+    derived = Column(JSON, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AnalysisTaskRecord(Base):
+    """数据分析任务队列"""
+    __tablename__ = "analysis_tasks"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(500), nullable=False)
+    description = Column(Text, nullable=True)
+    database_id = Column(String(36), nullable=False)
+    analysis_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed, cancelled
+    config = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error_message = Column(Text, nullable=True)
+    created_by = Column(String(255), nullable=True)
+
+    # 队列调度
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=1)
+    worker_id = Column(String(255), nullable=True)  # 认领任务的进程 hostname:pid
+    lease_expires_at = Column(DateTime, nullable=True)  # 超过该时间仍在 running 视为卡死
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_tasks_status_created", "status", "created_at"),
+        Index("ix_analysis_tasks_database_created", "database_id", "created_at"),
+        Index("ix_analysis_tasks_created", "created_at"),
+    )
+
+
+class APICallLogRecord(Base):
+    """外部API调用日志"""
+    __tablename__ = "api_call_logs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    task_id = Column(String(36), nullable=True, index=True)
+    api_name = Column(String(100), nullable=False)
+    endpoint = Column(String(255), nullable=False)
+    request_data = Column(JSON, nullable=True)
+    response_data = Column(JSON, nullable=True)
+    status_code = Column(Integer, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Feedback(Base):
     """用户反馈表"""
     __tablename__ = "feedbacks"
@@ -388,8 +477,106 @@ def init_db():
             print(f"✅ 创建数据目录: {db_path}")
     
     Base.metadata.create_all(bind=engine)
+    # create_all 不会给已存在的表补建新增的索引
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _ensure_catalog_search()
     print("✅ 数据库初始化完成")
 
+
+# 上传目录的全文检索：FTS5 索引表 + 触发器同步，trigram 分词支持中文子串匹配
+# 原表主键是字符串，隐式 rowid 在 VACUUM 时可能被重新编号，所以不用原表 rowid 关联索引，
+# 而是另建键表：INTEGER PRIMARY KEY 的 rowid 是稳定的，FTS 表按它存储，键表再映射回记录 ID。
+CATALOG_SEARCH_COLUMNS = {
+    "research_databases": ("name", "description"),
+    "research_protocols": ("title", "description"),
+}
+
+
+def catalog_search_table(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def catalog_search_keys_table(table_name: str) -> str:
+    return f"{table_name}_fts_keys"
+
+
+def _drop_catalog_search(conn, table_name: str) -> None:
+    fts = catalog_search_table(table_name)
+    for suffix in ("ai", "ad", "au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {fts}")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {catalog_search_keys_table(table_name)}")
+
+
+def _ensure_catalog_search() -> None:
+    """创建上传目录的 FTS5 索引表、键表和同步触发器
+
+    索引缺失、是旧版按原表 rowid 关联的外部内容表，或键表与原表行数对不上（索引漂移）时整体重建。
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    for table_name, columns in CATALOG_SEARCH_COLUMNS.items():
+        fts = catalog_search_table(table_name)
+        keys = catalog_search_keys_table(table_name)
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        assignments = ", ".join(f"{column} = new.{column}" for column in columns)
+        key_of = "(SELECT rowid FROM {keys} WHERE record_id = {row}.id)"
+        try:
+            with engine.begin() as conn:
+                exists = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (keys,)
+                ).first()
+                if exists:
+                    indexed = conn.exec_driver_sql(f"SELECT count(*) FROM {keys}").scalar()
+                    total = conn.exec_driver_sql(f"SELECT count(*) FROM {table_name}").scalar()
+                    if indexed == total:
+                        continue
+                    print(f"⚠️ 全文检索索引与 {table_name} 不一致（{indexed}/{total}），重建索引")
+                _drop_catalog_search(conn, table_name)
+                conn.exec_driver_sql(
+                    f"CREATE TABLE {keys} (rowid INTEGER PRIMARY KEY, record_id VARCHAR(36) NOT NULL UNIQUE)"
+                )
+                conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, tokenize='trigram')")
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+                    f"INSERT INTO {keys}(record_id) VALUES (new.id); "
+                    f"INSERT INTO {fts}(rowid, {column_list}) VALUES "
+                    f"({key_of.format(keys=keys, row='new')}, {new_values}); END"
+                )
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+                    f"DELETE FROM {fts} WHERE rowid = {key_of.format(keys=keys, row='old')}; "
+                    f"DELETE FROM {keys} WHERE record_id = old.id; END"
+                )
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {table_name} BEGIN "
+                    f"UPDATE {fts} SET {assignments} WHERE rowid = {key_of.format(keys=keys, row='new')}; END"
+                )
+                conn.exec_driver_sql(f"INSERT INTO {keys}(record_id) SELECT id FROM {table_name}")
+                conn.exec_driver_sql(
+                    f"INSERT INTO {fts}(rowid, {column_list}) "
+                    f"SELECT k.rowid, {', '.join(f't.{column}' for column in columns)} "
+                    f"FROM {keys} k JOIN {table_name} t ON t.id = k.record_id"
+                )
+        except Exception as e:
+            # SQLite 未编译 FTS5 或不支持 trigram 分词时，搜索退回 LIKE 扫描
+            print(f"⚠️ 全文检索索引创建失败（{table_name}）: {e}")
+    catalog_search_ready.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def catalog_search_ready(table_name: str) -> bool:
+    """该表的全文检索索引是否可用"""
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (catalog_search_keys_table(table_name),)
+        ).first() is not None
+
 def get_db():
     """获取数据库会话"""
     db = SessionLocal()
@@ -29,6 +29,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 列表接口的续页令牌放在响应头里
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ============ 数据模型 ============
@@ -79,6 +81,8 @@ roundtables: Dict[str, RoundTable] = orchestrator.sessions
 SYSTEM_USER_EMAIL = "system@medroundtable.local"
 SYSTEM_USER_NAME = "MedRoundTable System"
 PERSISTENCE_CALLBACK_REGISTERED = False
+# 启动时预热文献索引的后台任务（保留引用，避免任务被回收）
+CITATION_WARMUP_TASK: Optional[asyncio.Task] = None
 ROLE_DISPLAY_NAMES = {
     "clinical_director": "临床主任",
     "phd_student": "博士生",
@@ -475,6 +479,12 @@ async def root():
 async def health():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/health/io")
+async def health_io():
+    """事件循环延迟统计和阻塞 I/O 线程池的排队情况"""
+    from backend.services.io_pools import io_stats
+    return io_stats()
+
 # ---- Agent 信息 ----
 
 @app.get("/api/v1/agents")
@@ -743,10 +753,40 @@ async def startup_event():
     if not PERSISTENCE_CALLBACK_REGISTERED:
         orchestrator.register_message_callback(_persist_message_callback)
         PERSISTENCE_CALLBACK_REGISTERED = True
-    
+
+    # 启动分析任务队列（会先恢复上次中断的任务）
+    from backend.services.analysis_queue import analysis_queue
+    from backend.services.analysis_service import AnalysisService
+    await analysis_queue.start(AnalysisService._execute_analysis)
+
+    # 监测事件循环延迟，见 /health/io
+    from backend.services.io_pools import loop_lag_monitor
+    loop_lag_monitor.start()
+
+    # 在线程里预热文献索引（加载句向量模型，可能需要下载），不阻塞启动和事件循环
+    from backend.citation_manager import citation_manager
+    global CITATION_WARMUP_TASK
+    CITATION_WARMUP_TASK = asyncio.create_task(asyncio.to_thread(citation_manager.warm_up))
+
     print("🚀 MedRoundTable API 启动成功")
     print("📚 文档地址: http://localhost:8000/docs")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 停止队列 worker 并回收分析进程池
+    from backend.services.analysis_executor import analysis_executor
+    from backend.services.analysis_queue import analysis_queue
+    await analysis_queue.stop()
+    analysis_executor.shutdown()
+    # 停止延迟监测并等待 I/O 线程池里的任务结束
+    from backend.services import io_pools
+    await io_pools.loop_lag_monitor.stop()
+    io_pools.shutdown()
+    # 关闭公开数据库连接器的连接池
+    from backend.services.connectors import close_connectors
+    await close_connectors()
+
 # ============ V2.0 新增：技能市场与数据库API ============
 
 # 技能市场API
@@ -0,0 +1,199 @@
+"""
+文献向量索引
+
+为引用管理器提供本地 CPU 语义重排：
+1. 有 sentence-transformers 时用小型多语言句向量模型编码文献；
+2. 没有模型时退化为哈希 TF-IDF（中文按字二元组、英文按单词切分）；
+3. 向量矩阵落盘为 .npy，工作进程启动时以内存映射方式加载，无需重新编码。
+"""
+import hashlib
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:  # pragma: no cover - optional dependency at runtime
+    SentenceTransformer = None
+
+from backend.database import app_data_dir
+
+INDEX_DIR = Path(os.getenv("CITATION_INDEX_DIR") or app_data_dir() / "citation_index")
+EMBEDDING_MODEL = os.getenv("CITATION_EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+HASH_DIM = 2 ** 12
+
+_LATIN_TOKEN = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[一-鿿]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """英文按单词、中文按单字加二元组切分"""
+    lowered = (text or "").lower()
+    tokens = _LATIN_TOKEN.findall(lowered)
+    for run in _CJK_RUN.findall(lowered):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _bucket(token: str) -> int:
+    # 不能用内置 hash()：它按进程随机化，落盘后的向量会对不上
+    return zlib.crc32(token.encode("utf-8")) % HASH_DIM
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashedTfidfEncoder:
+    """无模型时的哈希 TF-IDF 编码器"""
+
+    name = f"hashed-tfidf-{HASH_DIM}"
+
+    def __init__(self, idf: Optional[np.ndarray] = None):
+        self.idf = idf
+
+    def _term_counts(self, texts: Sequence[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = [_bucket(token) for token in _tokenize(text)]
+            if buckets:
+                np.add.at(counts[row], buckets, 1.0)
+        return counts
+
+    def fit(self, texts: Sequence[str]) -> "HashedTfidfEncoder":
+        document_freq = (self._term_counts(texts) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_freq)) + 1.0).astype(np.float32)
+        return self
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        counts = self._term_counts(texts)
+        tf = np.log1p(counts)
+        return _normalize_rows(tf * self.idf)
+
+
+class SentenceEncoder:
+    """sentence-transformers 句向量编码器（仅 CPU）"""
+
+    def __init__(self, model_name: str):
+        self.name = f"st-{model_name.replace('/', '_')}"
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def _load_encoder():
+    if SentenceTransformer is not None:
+        try:
+            return SentenceEncoder(EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"加载句向量模型失败，改用哈希 TF-IDF: {e}")
+    return HashedTfidfEncoder()
+
+
+class ReferenceIndex:
+    """文献向量索引：行归一化矩阵 + 余弦 top-k"""
+
+    def __init__(self, ref_ids: List[str], matrix: np.ndarray, encoder):
+        self.ref_ids = ref_ids
+        self.matrix = matrix
+        self.encoder = encoder
+        self._positions = {ref_id: i for i, ref_id in enumerate(ref_ids)}
+
+    @classmethod
+    def build_or_load(cls, documents: Dict[str, str], index_dir: Path = INDEX_DIR) -> "ReferenceIndex":
+        """documents: {ref_id: 用于编码的文本}；内容未变时直接映射磁盘上的矩阵"""
+        encoder = _load_encoder()
+        ref_ids = list(documents.keys())
+        texts = [documents[ref_id] for ref_id in ref_ids]
+        fingerprint = hashlib.sha256(
+            json.dumps([encoder.name, ref_ids, texts], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+        matrix_path = index_dir / f"{encoder.name}.npy"
+        idf_path = index_dir / f"{encoder.name}.idf.npy"
+        meta_path = index_dir / f"{encoder.name}.json"
+
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("fingerprint") == fingerprint:
+                if isinstance(encoder, HashedTfidfEncoder):
+                    encoder.idf = np.load(idf_path)
+                matrix = np.load(matrix_path, mmap_mode="r")
+                return cls(meta["ref_ids"], matrix, encoder)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"文献索引缓存不可用，重新构建: {e}")
+
+        if isinstance(encoder, HashedTfidfEncoder):
+            encoder.fit(texts)
+        matrix = encoder.encode(texts)
+
+        try:
+            index_dir.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，避免多个 worker 同时构建时读到半截文件
+            suffix = f".{os.getpid()}.tmp"
+            with open(f"{matrix_path}{suffix}", "wb") as f:
+                np.save(f, matrix)
+            os.replace(f"{matrix_path}{suffix}", matrix_path)
+            if isinstance(encoder, HashedTfidfEncoder):
+                with open(f"{idf_path}{suffix}", "wb") as f:
+                    np.save(f, encoder.idf)
+                os.replace(f"{idf_path}{suffix}", idf_path)
+            Path(f"{meta_path}{suffix}").write_text(
+                json.dumps({"fingerprint": fingerprint, "ref_ids": ref_ids}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            os.replace(f"{meta_path}{suffix}", meta_path)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except OSError as e:
+            print(f"文献索引落盘失败，仅使用内存索引: {e}")
+
+        return cls(ref_ids, matrix, encoder)
+
+    def top_k(
+        self,
+        query: str,
+        k: int = 2,
+        candidate_ids: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """返回与 query 余弦相似度最高的 k 篇文献 [(ref_id, score)]"""
+        if candidate_ids is not None:
+            positions = np.fromiter(
+                (self._positions[ref_id] for ref_id in candidate_ids if ref_id in self._positions),
+                dtype=np.int64,
+            )
+        else:
+            positions = np.arange(len(self.ref_ids))
+        if positions.size == 0 or k <= 0:
+            return []
+
+        query_vector = self.encoder.encode([query])[0]
+        scores = np.asarray(self.matrix[positions] @ query_vector)
+        k = min(k, positions.size)
+        best = np.sort(np.argpartition(-scores, k - 1)[:k])
+        # argpartition 不保证顺序；按位置排好后再稳定排序，同分时保持候选原有顺序
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.ref_ids[positions[i]], float(scores[i])) for i in best]
+
+
+def build_reference_index(reference_database: Dict[str, List[Dict]]) -> ReferenceIndex:
+    """把 {主题关键词: [文献]} 形式的文献库编码成索引，主题词并入文献文本"""
+    documents: Dict[str, str] = {}
+    for topic, refs in reference_database.items():
+        for ref in refs:
+            text = documents.get(ref["id"]) or " ".join(
+                str(ref.get(field, "")) for field in ("title", "journal", "authors")
+            )
+            documents[ref["id"]] = f"{topic} {text}"
+    return ReferenceIndex.build_or_load(documents)
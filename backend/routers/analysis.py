@@ -1,11 +1,15 @@
 """
 数据分析API路由
 """
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 
 from backend.upload_models import (
     AnalysisCreate,
+    AnalysisPlanExecuteRequest,
     AnalysisPlanRequest,
     AnalysisPlanResponse,
     AnalysisResult,
@@ -15,6 +19,7 @@ from backend.upload_models import (
     ExternalAPIResponse,
 )
 from backend.services.analysis_service import AnalysisService
+from backend.services.io_pools import run_db
 
 router = APIRouter(prefix="/api/analysis", tags=["数据分析"])
 
@@ -59,6 +64,8 @@ async def profile_database(
     database_id: str,
     sample_rows: int = 1000,
     max_categories: int = 10,
+    mode: str = Query("auto", pattern="^(auto|exact|sketch)$", description="auto 按文件大小自动选择精确或近似画像"),
+    table: Optional[str] = Query(None, description="多表数据库（SQLite / Excel）要画像的表，默认第一张表"),
 ):
     """为上传数据库生成结构化画像，给前台分析规划直接使用。"""
     try:
@@ -66,6 +73,8 @@ async def profile_database(
             database_id=database_id,
             sample_rows=sample_rows,
             max_categories=max_categories,
+            mode=mode,
+            table=table,
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -85,6 +94,7 @@ async def build_analysis_plan(request: AnalysisPlanRequest):
             preferred_analysis_types=request.preferred_analysis_types,
             required_outputs=request.required_outputs,
             constraints=request.constraints,
+            table=request.table,
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -92,6 +102,49 @@ async def build_analysis_plan(request: AnalysisPlanRequest):
         raise HTTPException(status_code=500, detail=f"生成分析规划失败: {str(e)}")
 
 
+@router.post("/plan/execute")
+async def execute_analysis_plan(request: AnalysisPlanExecuteRequest):
+    """
+    一次执行整份分析规划（SSE）
+
+    数据集只加载一次，各步骤共享缺失掩码、数值矩阵、分组编码等中间结果，
+    每完成一个步骤就推送一条 result / error 事件，最后推送 done。
+    """
+    try:
+        steps = await AnalysisService.resolve_plan_steps(
+            database_id=request.database_id,
+            steps=request.steps,
+            suggestions=request.suggested_analyses,
+            preferred_analysis_types=request.preferred_analysis_types,
+            table=request.table,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_generator():
+        async for event in AnalysisService.execute_analysis_plan(
+            request.database_id, steps, timeout=request.timeout_seconds, table=request.table
+        ):
+            yield f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        },
+    )
+
+
+@router.post("/plan/executions/{plan_id}/cancel")
+async def cancel_analysis_plan(plan_id: str):
+    """取消正在执行的分析规划"""
+    if not AnalysisService.cancel_plan_execution(plan_id):
+        raise HTTPException(status_code=404, detail="分析规划不在执行中")
+    return {"plan_id": plan_id, "status": "cancelled"}
+
+
 @router.post("/tasks", response_model=AnalysisTask)
 async def create_analysis_task(create_data: AnalysisCreate):
     """
@@ -123,7 +176,7 @@ async def create_analysis_task(create_data: AnalysisCreate):
 @router.get("/tasks/{task_id}", response_model=AnalysisTask)
 async def get_analysis_task(task_id: str):
     """获取分析任务详情和状态"""
-    task = AnalysisService.get_task(task_id)
+    task = await run_db(AnalysisService.get_task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="分析任务不存在")
     return task
@@ -136,7 +189,7 @@ async def get_analysis_result(task_id: str):
     
     仅当任务状态为 completed 时返回完整结果
     """
-    task = AnalysisService.get_task(task_id)
+    task = await run_db(AnalysisService.get_task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="分析任务不存在")
     
@@ -154,10 +207,10 @@ async def get_analysis_result(task_id: str):
             "message": "任务正在执行中"
         }
     
-    if task.status == "failed":
+    if task.status in ("failed", "cancelled"):
         return {
             "task_id": task_id,
-            "status": "failed",
+            "status": task.status,
             "error": task.error_message
         }
     
@@ -174,6 +227,15 @@ async def get_analysis_result(task_id: str):
     )
 
 
+@router.post("/tasks/{task_id}/cancel", response_model=AnalysisTask)
+async def cancel_analysis_task(task_id: str):
+    """取消排队或运行中的分析任务"""
+    task = await run_db(AnalysisService.cancel_task, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="分析任务不存在")
+    return task
+
+
 @router.get("/tasks", response_model=List[AnalysisTask])
 async def list_analysis_tasks(
     database_id: Optional[str] = None,
@@ -186,7 +248,8 @@ async def list_analysis_tasks(
     
     支持按数据库ID和状态过滤
     """
-    tasks = AnalysisService.get_tasks(
+    tasks = await run_db(
+        AnalysisService.get_tasks,
         database_id=database_id,
         status=status,
         skip=skip,
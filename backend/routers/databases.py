@@ -1,15 +1,17 @@
 """
 数据库API路由
 """
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Optional, List
+from datetime import datetime
 
 from backend.upload_models import (
-    DatabaseCreate, DatabaseUpdate, DatabaseResponse,
+    DatabaseCreate, DatabaseUpdate, DatabaseResponse, DatabaseSummary,
     DatabasePreview, SQLQuery, SQLQueryResult
 )
 from backend.services.database_service import DatabaseService
+from backend.services.io_pools import run_db
 
 router = APIRouter(prefix="/api/databases", tags=["数据库"])
 
@@ -28,13 +30,18 @@ async def upload_database(
     
     支持格式: CSV, Excel(.xlsx/.xls), JSON, SQLite(.sqlite/.db)
     """
+    async def read_chunks():
+        # 分块读取上传内容，不把整个文件读进内存
+        while True:
+            chunk = await file.read(DatabaseService.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
     try:
-        # 读取文件内容
-        content = await file.read()
-        
         # 上传数据库
         database = await DatabaseService.upload_database(
-            file_content=content,
+            file_content=read_chunks(),
             filename=file.filename,
             name=name,
             description=description,
@@ -54,41 +61,63 @@ async def upload_database(
 @router.get("/{database_id}", response_model=DatabaseResponse)
 async def get_database(database_id: str):
     """获取数据库详情"""
-    database = DatabaseService.get_database(database_id)
+    database = await run_db(DatabaseService.get_database, database_id)
     if not database:
         raise HTTPException(status_code=404, detail="数据库不存在")
     return database
 
 
-@router.get("", response_model=List[DatabaseResponse])
+@router.get("", response_model=List[DatabaseSummary])
 async def list_databases(
+    response: Response,
     roundtable_id: Optional[str] = None,
     protocol_id: Optional[str] = None,
+    uploaded_by: Optional[str] = None,
+    q: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ):
     """
     获取数据库列表
     
-    支持按圆桌会ID和研究方案ID过滤
+    支持按圆桌会ID、研究方案ID、上传者和创建时间过滤，q 在名称和描述中检索。
+    列表项只含摘要字段（完整 schema 见详情接口）；还有下一页时响应头 X-Next-Cursor
+    给出续页令牌，作为 cursor 传回即可。
     """
-    databases = DatabaseService.get_databases(
-        roundtable_id=roundtable_id,
-        protocol_id=protocol_id,
-        skip=skip,
-        limit=limit
-    )
+    try:
+        databases, next_cursor = await run_db(
+            DatabaseService.get_databases,
+            roundtable_id=roundtable_id,
+            protocol_id=protocol_id,
+            skip=skip,
+            limit=limit,
+            uploaded_by=uploaded_by,
+            q=q,
+            created_after=created_after,
+            created_before=created_before,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return databases
 
 
 @router.get("/{database_id}/preview", response_model=DatabasePreview)
-async def preview_database(database_id: str, limit: int = 100):
+async def preview_database(database_id: str, limit: int = 100, table: Optional[str] = None):
     """
     获取数据预览
     
-    返回前N行数据预览（默认100行）
+    返回前N行数据预览（默认100行）；table 指定 SQLite 表/视图或 Excel 工作表
     """
-    preview = await DatabaseService.get_preview(database_id, limit=limit)
+    try:
+        preview = await DatabaseService.get_preview(database_id, limit=limit, table=table)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not preview:
         raise HTTPException(status_code=404, detail="数据库不存在或预览失败")
     return preview
@@ -97,7 +126,7 @@ async def preview_database(database_id: str, limit: int = 100):
 @router.get("/{database_id}/schema")
 async def get_database_schema(database_id: str):
     """获取数据库Schema详情"""
-    database = DatabaseService.get_database(database_id)
+    database = await run_db(DatabaseService.get_database, database_id)
     if not database:
         raise HTTPException(status_code=404, detail="数据库不存在")
     
@@ -117,7 +146,8 @@ async def query_database(database_id: str, query: SQLQuery):
     """
     执行SQL查询
     
-    仅支持SQLite数据库
+    SQLite 直接查询其中的表；CSV / Excel / JSON 通过列式 SQL 引擎查询，数据集为视图 data，
+    Excel 的各工作表也可按工作表名查询，参数占位符为 $name
     """
     try:
         result = await DatabaseService.execute_sql(database_id, query)
@@ -130,10 +160,26 @@ async def query_database(database_id: str, query: SQLQuery):
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
+@router.post("/{database_id}/query/stream")
+async def stream_query_database(database_id: str, query: SQLQuery):
+    """
+    流式执行SQL查询（NDJSON）
+
+    每行一个 JSON 事件：columns、若干批 rows、end（超过单次行数上限时带 next_cursor）或 error
+    """
+    try:
+        stream = await DatabaseService.stream_sql(database_id, query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stream is None:
+        raise HTTPException(status_code=404, detail="数据库不存在")
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
 @router.delete("/{database_id}")
 async def delete_database(database_id: str):
     """删除数据库"""
-    success = DatabaseService.delete_database(database_id)
+    success = await run_db(DatabaseService.delete_database, database_id)
     if not success:
         raise HTTPException(status_code=404, detail="数据库不存在")
     return {"message": "删除成功"}
@@ -142,7 +188,7 @@ async def delete_database(database_id: str):
 @router.get("/{database_id}/download")
 async def download_database(database_id: str):
     """下载数据库文件"""
-    database = DatabaseService.get_database(database_id)
+    database = await run_db(DatabaseService.get_database, database_id)
     if not database:
         raise HTTPException(status_code=404, detail="数据库不存在")
     
@@ -157,7 +203,8 @@ async def download_database(database_id: str):
         'xls': 'application/vnd.ms-excel',
         'json': 'application/json',
         'sqlite': 'application/x-sqlite3',
-        'db': 'application/x-sqlite3'
+        'db': 'application/x-sqlite3',
+        'parquet': 'application/vnd.apache.parquet'
     }
     media_type = media_types.get(database.file_type, 'application/octet-stream')
     
@@ -171,7 +218,7 @@ async def download_database(database_id: str):
 @router.get("/{database_id}/stats")
 async def get_database_stats(database_id: str):
     """获取数据库统计信息"""
-    database = DatabaseService.get_database(database_id)
+    database = await run_db(DatabaseService.get_database, database_id)
     if not database:
         raise HTTPException(status_code=404, detail="数据库不存在")
     
@@ -1,7 +1,7 @@
 """
 研究方案API路由
 """
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Response
 from fastapi.responses import FileResponse, JSONResponse
 from typing import Optional, List
 import uuid
@@ -11,6 +11,7 @@ from backend.upload_models import (
     ProtocolCreate, ProtocolUpdate, ProtocolResponse, ResearchProtocol
 )
 from backend.services.protocol_service import ProtocolService
+from backend.services.io_pools import run_db
 
 router = APIRouter(prefix="/api/protocols", tags=["研究方案"])
 
@@ -28,13 +29,18 @@ async def upload_protocol(
     
     支持格式: PDF, Word(.doc/.docx), Markdown, TXT
     """
+    async def read_chunks():
+        # 分块读取上传内容，边写盘边计算内容哈希
+        while True:
+            chunk = await file.read(ProtocolService.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
     try:
-        # 读取文件内容
-        content = await file.read()
-        
         # 上传协议
         protocol = await ProtocolService.upload_protocol(
-            file_content=content,
+            file_content=read_chunks(),
             filename=file.filename,
             title=title,
             description=description,
@@ -53,7 +59,7 @@ async def upload_protocol(
 @router.get("/{protocol_id}", response_model=ProtocolResponse)
 async def get_protocol(protocol_id: str):
     """获取研究方案详情"""
-    protocol = ProtocolService.get_protocol(protocol_id)
+    protocol = await run_db(ProtocolService.get_protocol, protocol_id)
     if not protocol:
         raise HTTPException(status_code=404, detail="研究方案不存在")
     return protocol
@@ -61,22 +67,40 @@ async def get_protocol(protocol_id: str):
 
 @router.get("", response_model=List[ProtocolResponse])
 async def list_protocols(
+    response: Response,
     roundtable_id: Optional[str] = None,
     status: Optional[str] = None,
+    uploaded_by: Optional[str] = None,
+    q: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ):
     """
     获取研究方案列表
     
-    支持按圆桌会ID和状态过滤
+    支持按圆桌会ID、状态、上传者和创建时间过滤，q 在标题和描述中检索。
+    还有下一页时响应头 X-Next-Cursor 给出续页令牌，作为 cursor 传回即可。
     """
-    protocols = ProtocolService.get_protocols(
-        roundtable_id=roundtable_id,
-        status=status,
-        skip=skip,
-        limit=limit
-    )
+    try:
+        protocols, next_cursor = await run_db(
+            ProtocolService.get_protocols,
+            roundtable_id=roundtable_id,
+            status=status,
+            skip=skip,
+            limit=limit,
+            uploaded_by=uploaded_by,
+            q=q,
+            created_after=created_after,
+            created_before=created_before,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return protocols
 
 
@@ -86,7 +110,7 @@ async def update_protocol(
     update_data: ProtocolUpdate
 ):
     """更新研究方案信息"""
-    protocol = ProtocolService.update_protocol(protocol_id, update_data)
+    protocol = await run_db(ProtocolService.update_protocol, protocol_id, update_data)
     if not protocol:
         raise HTTPException(status_code=404, detail="研究方案不存在")
     return protocol
@@ -95,7 +119,7 @@ async def update_protocol(
 @router.delete("/{protocol_id}")
 async def delete_protocol(protocol_id: str):
     """删除研究方案"""
-    success = ProtocolService.delete_protocol(protocol_id)
+    success = await run_db(ProtocolService.delete_protocol, protocol_id)
     if not success:
         raise HTTPException(status_code=404, detail="研究方案不存在")
     return {"message": "删除成功"}
@@ -104,7 +128,7 @@ async def delete_protocol(protocol_id: str):
 @router.get("/{protocol_id}/download")
 async def download_protocol(protocol_id: str):
     """下载研究方案文件"""
-    result = ProtocolService.get_protocol_file(protocol_id)
+    result = await run_db(ProtocolService.get_protocol_file, protocol_id)
     if not result:
         raise HTTPException(status_code=404, detail="研究方案或文件不存在")
     
@@ -1,14 +1,19 @@
 """
 数据库查询 API
 
-统一访问平台已编目的生物医学数据库目录。
+统一访问平台已编目的生物医学数据库目录。PubMed、ClinicalTrials.gov、ClinVar、Europe PMC
+通过在线连接器查询真实接口，其余来源返回模拟数据；在线来源请求失败时查询接口回退到模拟数据并标记 fallback。
 """
 
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
+from backend.services.connectors import (
+    BiomedicalConnector, ConnectorError, connector_status, get_connector, get_fallback_connector
+)
 from backend.services.platform_catalog import get_platform_databases
 from backend.services.database_service import DatabaseService
 from backend.upload_models import DatabaseResponse, PublicDatasetSnapshotCreate
@@ -37,6 +42,9 @@ class QueryResponse(BaseModel):
     total_results: int
     results: List[Dict[str, Any]]
     execution_time: float
+    connector: str = ""
+    # 在线来源请求失败、改用模拟数据时为 True
+    fallback: bool = False
 
 # ============ 数据库注册表 ============
 
@@ -91,6 +99,12 @@ async def get_categories():
     
     return list(categories.values())
 
+
+@router.get("/connectors")
+async def list_connectors():
+    """在线连接器的配置与请求统计（请求数、缓存命中、失败次数、平均耗时）"""
+    return connector_status()
+
 @router.get("/{db_id}")
 async def get_database(db_id: str):
     """获取数据库详情"""
@@ -99,6 +113,21 @@ async def get_database(db_id: str):
     
     return DatabaseInfo(**DATABASES[db_id])
 
+@router.get("/{db_id}/records/{record_id}")
+async def get_database_record(db_id: str, record_id: str):
+    """按来源内的 ID 获取单条记录（如 PMID、NCT 编号）"""
+    if db_id not in DATABASES:
+        raise HTTPException(status_code=404, detail=f"数据库 {db_id} 不存在")
+
+    connector = _connector_for(db_id)
+    try:
+        record = await connector.fetch(record_id)
+    except ConnectorError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"{DATABASES[db_id]['name']} 中没有记录 {record_id}")
+    return {"database": db_id, "connector": type(connector).__name__, "record": record}
+
 @router.post("/query", response_model=QueryResponse)
 async def query_database(request: QueryRequest):
     """
@@ -118,13 +147,16 @@ async def query_database(request: QueryRequest):
     
     # 根据数据库类型执行查询
     try:
-        results = await _execute_query(request)
+        started = time.perf_counter()
+        results, connector, fallback = await _execute_query(request)
         return QueryResponse(
             database=request.database,
             query=request.query,
             total_results=len(results),
             results=results,
-            execution_time=0.5  # 模拟执行时间
+            execution_time=round(time.perf_counter() - started, 3),
+            connector=type(connector).__name__,
+            fallback=fallback,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
@@ -132,116 +164,68 @@ async def query_database(request: QueryRequest):
 
 @router.post("/snapshots", response_model=DatabaseResponse)
 async def save_query_snapshot(request: PublicDatasetSnapshotCreate):
-    """将公开数据库查询结果保存到服务器，作为后续分析可复用数据集。"""
+    """将公开数据库查询结果保存到服务器，作为后续分析可复用数据集。
+
+    结果按来源接口的分页逐页写入；在线来源请求失败时返回 502，不用模拟数据代替。
+    """
     if request.database not in DATABASES:
         raise HTTPException(status_code=404, detail=f"数据库 {request.database} 不存在")
 
-    query_request = QueryRequest(
-        database=request.database,
-        query=request.query,
-        filters=request.filters or {},
-        limit=request.limit,
-    )
-    results = await _execute_query(query_request)
-    saved = await DatabaseService.save_public_dataset_snapshot(
-        source_database_id=request.database,
-        source_database_name=DATABASES[request.database]["name"],
-        source_url=DATABASES[request.database]["url"],
-        query=request.query,
-        results=results,
-        filters=request.filters or {},
-        name=request.name,
-        description=request.description,
-        uploaded_by=request.uploaded_by,
-        roundtable_id=request.roundtable_id,
-        protocol_id=request.protocol_id,
-    )
+    connector = _connector_for(request.database)
+    try:
+        saved = await DatabaseService.save_public_dataset_snapshot(
+            source_database_id=request.database,
+            source_database_name=DATABASES[request.database]["name"],
+            source_url=DATABASES[request.database]["url"],
+            query=request.query,
+            pages=connector.paginate(request.query, _clean_filters(request.filters), request.limit),
+            filters=request.filters or {},
+            name=request.name,
+            description=request.description,
+            uploaded_by=request.uploaded_by,
+            roundtable_id=request.roundtable_id,
+            protocol_id=request.protocol_id,
+            source_connector=type(connector).__name__,
+        )
+    except ConnectorError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return saved
 
-async def _execute_query(request: QueryRequest) -> List[Dict]:
+def _connector_for(db_id: str) -> BiomedicalConnector:
+    return get_connector(db_id, DATABASES.get(db_id, {}).get("name"))
+
+def _clean_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (filters or {}).items() if value not in (None, "")}
+
+async def _collect(connector: BiomedicalConnector, query: str, filters: Dict[str, Any], limit: int) -> List[Dict]:
+    results: List[Dict] = []
+    async for page in connector.paginate(query, filters, limit):
+        results.extend(page)
+    return results
+
+async def _search(
+    db_id: str, query: str, filters: Optional[Dict[str, Any]], limit: int
+) -> Tuple[List[Dict], BiomedicalConnector, bool]:
+    """用来源的连接器检索，在线请求失败时回退到模拟数据
+
+    返回 (结果, 实际使用的连接器, 是否回退)。
+    """
+    filters = _clean_filters(filters)
+    connector = _connector_for(db_id)
+    try:
+        return await _collect(connector, query, filters, limit), connector, False
+    except ConnectorError as e:
+        if not connector.live:
+            raise
+        print(f"{db_id} 在线查询失败，改用模拟数据: {e}")
+    fallback = get_fallback_connector(db_id, DATABASES.get(db_id, {}).get("name"))
+    return await _collect(fallback, query, filters, limit), fallback, True
+
+async def _execute_query(request: QueryRequest) -> Tuple[List[Dict], BiomedicalConnector, bool]:
     """执行数据库查询"""
-    db_id = request.database
-    query = request.query
-    
-    # 模拟查询结果
-    # 实际实现需要集成各个数据库的API
-    
-    if db_id == "pubmed":
-        return _mock_pubmed_results(query, request.limit)
-    elif db_id == "clinicaltrials":
-        return _mock_clinicaltrials_results(query, request.limit)
-    elif db_id == "drugbank":
-        return _mock_drugbank_results(query, request.limit)
-    elif db_id == "clinvar":
-        return _mock_clinvar_results(query, request.limit)
-    else:
-        return _mock_generic_results(db_id, query, request.limit)
-
-def _mock_pubmed_results(query: str, limit: int) -> List[Dict]:
-    """模拟PubMed查询结果"""
-    return [
-        {
-            "pmid": f"3800000{i}",
-            "title": f"关于{query}的最新研究进展",
-            "authors": ["Zhang S", "Li W", "Wang H"],
-            "journal": "Nature Medicine",
-            "year": 2024,
-            "doi": f"10.1000/{i}"
-        }
-        for i in range(1, min(limit + 1, 6))
-    ]
-
-def _mock_clinicaltrials_results(query: str, limit: int) -> List[Dict]:
-    """模拟ClinicalTrials查询结果"""
-    return [
-        {
-            "nct_id": f"NCT0560000{i}",
-            "title": f"{query}治疗的随机对照试验",
-            "phase": "Phase III",
-            "status": "Recruiting",
-            "sponsor": "National Cancer Institute",
-            "locations": ["USA", "China", "EU"]
-        }
-        for i in range(1, min(limit + 1, 6))
-    ]
-
-def _mock_drugbank_results(query: str, limit: int) -> List[Dict]:
-    """模拟DrugBank查询结果"""
-    return [
-        {
-            "drugbank_id": f"DB0000{i}",
-            "name": f"{query}抑制剂",
-            "type": "Small molecule",
-            "groups": ["approved", " investigational"],
-            "mechanism": f"抑制{query}信号通路"
-        }
-        for i in range(1, min(limit + 1, 6))
-    ]
-
-def _mock_clinvar_results(query: str, limit: int) -> List[Dict]:
-    """模拟ClinVar查询结果"""
-    return [
-        {
-            "variant_id": f"VCV0000000{i}",
-            "gene": query.upper(),
-            "chromosome": "chr1",
-            "position": 1000000 + i * 100,
-            "significance": "Pathogenic" if i % 2 == 0 else "Benign",
-            "condition": f"{query}相关疾病"
-        }
-        for i in range(1, min(limit + 1, 6))
-    ]
-
-def _mock_generic_results(db_id: str, query: str, limit: int) -> List[Dict]:
-    """通用模拟结果"""
-    return [
-        {
-            "id": f"{db_id}_{i}",
-            "name": f"{query} - 结果{i}",
-            "description": f"来自{DATABASES.get(db_id, {}).get('name', db_id)}的查询结果"
-        }
-        for i in range(1, min(limit + 1, 6))
-    ]
+    return await _search(request.database, request.query, request.filters, request.limit)
 
 # ============ 特色查询接口 ============
 
@@ -268,12 +252,17 @@ async def advanced_pubmed_search(
         "article_type": article_type
     }
     
-    results = _mock_pubmed_results(query, max_results)
+    try:
+        results, connector, fallback = await _search("pubmed", query, filters, max_results)
+    except ConnectorError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     return {
         "query": query,
         "filters": {k: v for k, v in filters.items() if v},
         "total_results": len(results),
-        "results": results
+        "results": results,
+        "connector": type(connector).__name__,
+        "fallback": fallback,
     }
 
 @router.get("/clinicaltrials/search")
@@ -288,14 +277,26 @@ async def search_clinical_trials(
     """
     临床试验高级搜索
     """
-    results = _mock_clinicaltrials_results(condition, max_results)
+    filters = {
+        "condition": condition,
+        "intervention": intervention,
+        "phase": phase,
+        "status": status,
+        "location": location,
+    }
+    try:
+        results, connector, fallback = await _search("clinicaltrials-gov", "", filters, max_results)
+    except ConnectorError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     return {
         "condition": condition,
         "intervention": intervention,
         "phase": phase,
         "status": status,
         "total_results": len(results),
-        "results": results
+        "results": results,
+        "connector": type(connector).__name__,
+        "fallback": fallback,
     }
 
 @router.get("/drugbank/search")
@@ -307,8 +308,10 @@ async def search_drugs(
 ):
     """
     药物数据库搜索
+
+    DrugBank 接口需要商业授权，目前返回模拟数据。
     """
-    results = _mock_drugbank_results(name, max_results)
+    results, _, _ = await _search("drugbank", name, {}, max_results)
     return {
         "query": name,
         "mechanism": mechanism,
@@ -263,8 +263,8 @@ async def get_citations(session_id: str):
         from backend.citation_manager import citation_manager
         _get_roundtable_or_404(session_id)
         
-        # 获取所有引用
-        citations = citation_manager.get_all_citations()
+        # 直接读取该会话的引用台账
+        citations = citation_manager.get_all_citations(session_id)
         
         return {
             "session_id": session_id,
@@ -408,11 +408,11 @@ async def generate_complete_report(session_id: str):
         doc.add_page_break()
         doc.add_heading('第五部分：参考文献', level=1)
         
-        # 获取所有引用文献
-        citations = citation_manager.get_all_citations()
+        # 获取本会话引用文献，编号与讨论正文中的标记保持一致
+        citations = citation_manager.get_all_citations(session_id)
         if citations:
-            for i, ref in enumerate(citations, 1):
-                citation_text = f"[{i}] {ref.get('authors', '')}. {ref.get('title', '')}. {ref.get('journal', '')}"
+            for ref in citations:
+                citation_text = f"[{ref.get('number', '')}] {ref.get('authors', '')}. {ref.get('title', '')}. {ref.get('journal', '')}"
                 if ref.get('year'):
                     citation_text += f" {ref.get('year')}"
                 if ref.get('volume'):
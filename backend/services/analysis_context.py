@@ -0,0 +1,74 @@
+"""
+分析共享上下文
+
+一份分析规划通常包含描述性统计、组间比较、相关、回归等多个步骤，它们反复用到同样的中间结果：
+各列的缺失掩码、数值列的 float64 矩阵、分组变量的分组编码。AnalysisContext 绑定一次加载的
+DataFrame，按列惰性计算并缓存这些中间结果，同一规划里的后续步骤直接复用。
+单个分析任务也走同一套接口，只是上下文随任务结束而丢弃。
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class AnalysisContext:
+    """一次数据加载上多个分析共享的中间结果（只读，调用方不得原地修改返回值）"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._notna: Dict[Hashable, np.ndarray] = {}
+        self._numeric: Dict[Hashable, np.ndarray] = {}
+        self._groups: Dict[Hashable, Tuple[np.ndarray, List[Any]]] = {}
+
+    def notna(self, column: Hashable) -> np.ndarray:
+        mask = self._notna.get(column)
+        if mask is None:
+            mask = self._notna[column] = self.df[column].notna().to_numpy()
+        return mask
+
+    def complete_rows(self, columns: List[Hashable]) -> np.ndarray:
+        """这些列全部非缺失的行（整行删除的建模行）"""
+        mask = np.ones(len(self.df), dtype=bool)
+        for column in columns:
+            mask &= self.notna(column)
+        return mask
+
+    def missing_count(self, column: Hashable) -> int:
+        return int(len(self.df) - self.notna(column).sum())
+
+    def numeric_frame(self, columns: List[Hashable]) -> pd.DataFrame:
+        """数值列转 float64 后的矩阵（缺失为 NaN），按列缓存"""
+        arrays = []
+        for column in columns:
+            values = self._numeric.get(column)
+            if values is None:
+                values = self._numeric[column] = self.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            arrays.append(values)
+        matrix = np.column_stack(arrays) if arrays else np.empty((len(self.df), 0))
+        return pd.DataFrame(matrix, index=self.df.index, columns=columns)
+
+    def group_codes(self, column: Hashable) -> Tuple[np.ndarray, List[Any]]:
+        """分组变量的整数编码和取值列表；与 groupby(sort=True, dropna=False) 一致，缺失分组排最后"""
+        cached = self._groups.get(column)
+        if cached is not None:
+            return cached
+        series = self.df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # 分类类型按类别顺序编码，未出现的类别也保留（与 groupby 默认的 observed=False 一致）
+            codes = series.cat.codes.to_numpy().astype(np.int64)
+            levels = list(series.cat.categories)
+            if (codes < 0).any():
+                codes[codes < 0] = len(levels)
+                levels.append(np.nan)
+        else:
+            try:
+                codes, levels = pd.factorize(series, sort=True, use_na_sentinel=False)
+            except TypeError:
+                # 混合类型无法排序时按出现顺序编码
+                codes, levels = pd.factorize(series, sort=False, use_na_sentinel=False)
+            levels = list(levels)
+        self._groups[column] = (codes, levels)
+        return codes, levels
@@ -0,0 +1,426 @@
+"""
+分析任务执行器
+
+pandas / scipy / statsmodels 计算全部是 CPU 密集型，直接放在事件循环里会卡住
+所有 SSE 推送和 API 请求。这里用有界的 ProcessPoolExecutor 执行分析：
+
+1. 子进程只收到数据集文件路径，自行加载（并走子进程内的 DataFrame 缓存），
+   不在进程间 pickle 整个 DataFrame；大数据集的描述性统计 / 组间比较按块流式执行；
+2. 工作进程常驻，进程内缓存（DataFrame、回归设计矩阵）可被后续任务复用；
+3. 每个任务有独立超时，从子进程开始执行时起算；
+4. 支持取消：排队中的任务直接撤销，已在运行的任务会终止其工作进程并重建进程池，
+   同一进程池里被连带中断的其他任务自动重新提交；
+5. 整份分析规划可以作为一个任务执行：数据只加载一次，各步骤共享中间结果，
+   每完成一步就通过 Manager 队列把结果推回主进程。
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from backend.database import app_data_dir
+
+# 子进程 pid 文件和取消标记所在目录，默认放在应用数据目录下
+RUN_DIR = Path(os.getenv("ANALYSIS_RUN_DIR") or app_data_dir() / "run" / "analysis")
+DEFAULT_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TASK_TIMEOUT", "600"))
+# 任务开始执行前检查其是否已被子进程接手的间隔
+START_POLL_SECONDS = 0.2
+
+
+class AnalysisCancelledError(Exception):
+    """分析任务被取消"""
+
+
+class AnalysisTimeoutError(Exception):
+    """分析任务超时"""
+
+
+def _pid_file(job_id: str) -> Path:
+    return RUN_DIR / f"{job_id}.pid"
+
+
+def _cancel_marker(job_id: str) -> Path:
+    return RUN_DIR / f"{job_id}.cancelled"
+
+
+def run_analysis_job(
+    job_id: str,
+    analysis_type: str,
+    database_id: str,
+    file_path: str,
+    file_type: str,
+    config: Any,
+    table: Optional[str] = None,
+) -> Dict[str, Any]:
+    """子进程入口：按路径加载数据集（多表数据库中的 table 表）并执行分析"""
+    from backend.services.analysis_service import AnalysisService
+    from backend.services.database_service import DatabaseService
+
+    pid_file = _pid_file(job_id)
+    pid_file.write_text(str(os.getpid()))
+    try:
+        # 任务已交给子进程但还没开始计算时被取消
+        if _cancel_marker(job_id).exists():
+            raise AnalysisCancelledError("分析任务已取消")
+        if AnalysisService.should_stream(analysis_type, Path(file_path), file_type, config):
+            # 大数据集不整表加载，按块流式累积
+            chunks = DatabaseService.iter_dataset_chunks(Path(file_path), file_type, table=table)
+            return AnalysisService.run_streaming_analysis(analysis_type, chunks, config)
+        df = DatabaseService.load_dataset_file(Path(file_path), file_type, table=table)
+        if df is None or df.empty:
+            raise ValueError("无法加载数据")
+        return AnalysisService.run_analysis(analysis_type, df, config, _dataset_key(database_id, file_path, table))
+    finally:
+        pid_file.unlink(missing_ok=True)
+
+
+def run_profile_job(
+    job_id: str,
+    database_id: str,
+    database_name: str,
+    file_path: str,
+    file_type: str,
+    table: Optional[str],
+    table_name: Optional[str],
+    use_sketch: bool,
+    sample_rows: int,
+    max_categories: int,
+) -> Dict[str, Any]:
+    """子进程入口：加载（或流式扫描）数据集并生成数据画像，返回 JSON 形式的画像"""
+    from backend.services.analysis_service import AnalysisService
+
+    pid_file = _pid_file(job_id)
+    pid_file.write_text(str(os.getpid()))
+    try:
+        if _cancel_marker(job_id).exists():
+            raise AnalysisCancelledError("分析任务已取消")
+        return AnalysisService.build_profile(
+            database_id, database_name, Path(file_path), file_type, table, table_name,
+            use_sketch, sample_rows, max_categories,
+        )
+    finally:
+        pid_file.unlink(missing_ok=True)
+
+
+def run_plan_job(
+    job_id: str,
+    database_id: str,
+    file_path: str,
+    file_type: str,
+    steps: List[Tuple[int, str, Any]],
+    events: Any,
+    table: Optional[str] = None,
+) -> None:
+    """子进程入口：一次加载数据集，依次执行规划中的各步骤，每步结果立即放入 events 队列
+
+    事件格式：("loaded", None, 加载耗时) / ("result", 步骤序号, 结果, 耗时) / ("error", 步骤序号, 错误, 耗时)。
+    单个步骤失败不影响后续步骤。所有步骤都适合分块流式执行时不整表加载，各步骤各自扫描一遍数据。
+    """
+    from backend.services.analysis_context import AnalysisContext
+    from backend.services.analysis_service import AnalysisService
+    from backend.services.database_service import DatabaseService
+
+    pid_file = _pid_file(job_id)
+    pid_file.write_text(str(os.getpid()))
+    try:
+        if _cancel_marker(job_id).exists():
+            raise AnalysisCancelledError("分析任务已取消")
+        path = Path(file_path)
+        context = None
+        dataset_key = None
+        started = time.perf_counter()
+        if not all(AnalysisService.should_stream(kind, path, file_type, config) for _, kind, config in steps):
+            df = DatabaseService.load_dataset_file(path, file_type, table=table)
+            if df is None or df.empty:
+                raise ValueError("无法加载数据")
+            context = AnalysisContext(df)
+            dataset_key = _dataset_key(database_id, file_path, table)
+        events.put(("loaded", None, time.perf_counter() - started))
+
+        for index, analysis_type, config in steps:
+            started = time.perf_counter()
+            try:
+                if context is None:
+                    chunks = DatabaseService.iter_dataset_chunks(path, file_type, table=table)
+                    result = AnalysisService.run_streaming_analysis(analysis_type, chunks, config)
+                else:
+                    result = AnalysisService.run_analysis(analysis_type, context.df, config, dataset_key, context)
+            except Exception as exc:
+                events.put(("error", index, str(exc), time.perf_counter() - started))
+            else:
+                events.put(("result", index, result, time.perf_counter() - started))
+    finally:
+        pid_file.unlink(missing_ok=True)
+
+
+def _dataset_key(database_id: str, file_path: str, table: Optional[str] = None) -> str:
+    # 数据集版本：文件被替换后 mtime 变化，进程内缓存自然失效；多表数据库按表区分
+    key = f"{database_id}#{table}" if table else database_id
+    return f"{key}@{os.stat(file_path).st_mtime_ns}"
+
+
+class AnalysisExecutor:
+    """有界进程池 + 超时 + 取消"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, default_timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.max_workers = max(1, max_workers)
+        self.default_timeout = default_timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._aborted: Set[str] = set()
+        self._manager = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # pid 文件决定终止哪个进程，目录只允许本用户写入
+                RUN_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+                # spawn：避免在带线程的事件循环进程里 fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _event_queue(self):
+        """跨进程事件队列（Manager 代理对象可以作为参数传给进程池任务）"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager.Queue()
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _abort(self, job_id: str, future: Future) -> None:
+        """撤销排队中的任务；已在运行的任务直接终止其工作进程"""
+        self._aborted.add(job_id)
+        if future.cancel() or future.done():
+            return
+        # 先留下取消标记：子进程尚未开始执行（或读到的是过期的 pid 文件）时由子进程自行放弃
+        _cancel_marker(job_id).touch()
+        pid_file = _pid_file(job_id)
+        try:
+            pid = int(pid_file.read_text())
+        except (OSError, ValueError):
+            return
+        pool = self._pool
+        workers = (getattr(pool, "_processes", None) or {}) if pool is not None else {}
+        try:
+            # 只终止本进程池的工作进程，过期 pid 可能已被其他进程复用
+            if pid not in workers:
+                return
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                return
+        finally:
+            # 被 SIGKILL 的子进程来不及清理自己的 pid 文件
+            pid_file.unlink(missing_ok=True)
+        self._discard_pool(pool)
+
+    def _deadline(self, job_id: str, deadline: Optional[float], timeout: float) -> Optional[float]:
+        """超时从任务真正开始执行（子进程写出 pid 文件）时起算，排队等待进程池的时间不计入"""
+        if deadline is None and _pid_file(job_id).exists():
+            return asyncio.get_running_loop().time() + timeout
+        return deadline
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务，返回该任务是否仍在执行器中"""
+        future = self._futures.get(job_id)
+        if future is None:
+            return False
+        self._abort(job_id, future)
+        return True
+
+    async def run(
+        self,
+        job_id: str,
+        analysis_type: str,
+        database_id: str,
+        file_path: Path,
+        file_type: str,
+        config: Any,
+        timeout: Optional[float] = None,
+        table: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return await self._run_job(
+            job_id,
+            run_analysis_job,
+            (job_id, analysis_type, database_id, str(file_path), file_type, config, table),
+            timeout,
+            "分析任务",
+        )
+
+    async def run_profile(
+        self,
+        job_id: str,
+        database_id: str,
+        database_name: str,
+        file_path: Path,
+        file_type: str,
+        table: Optional[str],
+        table_name: Optional[str],
+        use_sketch: bool,
+        sample_rows: int,
+        max_categories: int,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """在分析进程池里生成数据画像（整表解析、逐列统计和流式摘要都不占用事件循环）"""
+        return await self._run_job(
+            job_id,
+            run_profile_job,
+            (job_id, database_id, database_name, str(file_path), file_type, table, table_name,
+             use_sketch, sample_rows, max_categories),
+            timeout,
+            "数据画像",
+        )
+
+    async def _run_job(self, job_id: str, target: Any, args: Tuple, timeout: Optional[float], label: str) -> Any:
+        timeout = timeout or self.default_timeout
+        loop = asyncio.get_running_loop()
+        deadline: Optional[float] = None
+        _pid_file(job_id).unlink(missing_ok=True)
+        try:
+            while True:
+                pool = self._get_pool()
+                try:
+                    future = pool.submit(target, *args)
+                except BrokenProcessPool:
+                    self._discard_pool(pool)
+                    continue
+                self._futures[job_id] = future
+                wrapped = asyncio.wrap_future(future)
+                # 超时/取消后不再等待该结果，这里吞掉其异常避免 "never retrieved" 警告
+                wrapped.add_done_callback(lambda f: f.cancelled() or f.exception())
+                try:
+                    while True:
+                        deadline = self._deadline(job_id, deadline, timeout)
+                        # 开始执行前定期检查是否已开始，之后等到截止时间
+                        wait = START_POLL_SECONDS if deadline is None else max(0.0, deadline - loop.time())
+                        done, _ = await asyncio.wait({wrapped}, timeout=wait)
+                        if done:
+                            return wrapped.result()
+                        if deadline is not None and loop.time() >= deadline:
+                            self._abort(job_id, future)
+                            raise AnalysisTimeoutError(f"{label}超时（{timeout:g} 秒）")
+                except asyncio.CancelledError:
+                    if job_id in self._aborted:
+                        raise AnalysisCancelledError(f"{label}已取消")
+                    if future.cancelled():
+                        # 进程池被重建时撤销了排队中的任务，重新提交
+                        continue
+                    # 调用方协程被取消，同步终止子进程里的计算
+                    self._abort(job_id, future)
+                    raise
+                except BrokenProcessPool:
+                    if job_id in self._aborted:
+                        raise AnalysisCancelledError(f"{label}已取消")
+                    # 其他任务被取消时连带中断了本任务，换新进程池重新提交
+                    self._discard_pool(pool)
+        finally:
+            self._futures.pop(job_id, None)
+            self._aborted.discard(job_id)
+            _cancel_marker(job_id).unlink(missing_ok=True)
+
+    async def run_plan(
+        self,
+        job_id: str,
+        database_id: str,
+        file_path: Path,
+        file_type: str,
+        steps: List[Tuple[int, str, Any]],
+        timeout: Optional[float] = None,
+        table: Optional[str] = None,
+    ) -> AsyncIterator[Tuple]:
+        """在一个子进程里执行整份规划，按完成顺序逐个产出 run_plan_job 的事件
+
+        超时默认按步骤数放大；进程池被其他任务的取消连带重建时，只重新提交尚未完成的步骤。
+        """
+        timeout = timeout or self.default_timeout * max(1, len(steps))
+        deadline: Optional[float] = None
+        _pid_file(job_id).unlink(missing_ok=True)
+        events = self._event_queue()
+        remaining = list(steps)
+        try:
+            while remaining:
+                pool = self._get_pool()
+                try:
+                    future = pool.submit(
+                        run_plan_job, job_id, database_id, str(file_path), file_type, remaining, events, table
+                    )
+                except BrokenProcessPool:
+                    self._discard_pool(pool)
+                    continue
+                self._futures[job_id] = future
+                finished = False
+                while not finished:
+                    if job_id in self._aborted:
+                        raise AnalysisCancelledError("分析任务已取消")
+                    deadline = self._deadline(job_id, deadline, timeout)
+                    if deadline is not None and asyncio.get_running_loop().time() > deadline:
+                        self._abort(job_id, future)
+                        raise AnalysisTimeoutError(f"分析规划超时（{timeout:g} 秒）")
+                    # 先判断是否结束再取事件：结束后队列里剩下的事件一次取完
+                    finished = future.done()
+                    batch = []
+                    try:
+                        batch.append(await asyncio.to_thread(events.get, True, 0.2))
+                        while True:
+                            batch.append(events.get_nowait())
+                    except queue.Empty:
+                        pass
+                    except asyncio.CancelledError:
+                        # 调用方（如断开的流式响应）放弃了规划，同步终止子进程里的计算
+                        self._abort(job_id, future)
+                        raise
+                    for event in batch:
+                        if event[0] in ("result", "error"):
+                            remaining = [step for step in remaining if step[0] != event[1]]
+                        try:
+                            yield event
+                        except GeneratorExit:
+                            self._abort(job_id, future)
+                            raise
+                try:
+                    future.result()
+                except BrokenProcessPool:
+                    if job_id in self._aborted:
+                        raise AnalysisCancelledError("分析任务已取消")
+                    self._discard_pool(pool)
+                    continue
+                except CancelledError:
+                    if job_id in self._aborted:
+                        raise AnalysisCancelledError("分析任务已取消")
+                    # 进程池被重建时撤销了排队中的规划，重新提交剩余步骤
+                    continue
+                return
+        finally:
+            self._futures.pop(job_id, None)
+            self._aborted.discard(job_id)
+            _cancel_marker(job_id).unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            manager, self._manager = self._manager, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+
+# 全局执行器实例
+analysis_executor = AnalysisExecutor()
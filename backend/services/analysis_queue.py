@@ -0,0 +1,284 @@
+"""
+分析任务队列
+
+任务持久化在 analysis_tasks 表中，服务重启不丢失：
+1. 创建任务只写入一条 pending 记录；
+2. 后台 worker 协程用条件 UPDATE 原子认领 pending 任务（多进程部署下也不会重复执行）；
+3. 失败任务按 max_attempts 自动重试；
+4. 启动时把卡在 running 的任务（所属进程已退出或租约过期）重新放回队列。
+
+状态流转方法都是同步的数据库读写，在事件循环里调用时经 io_pools.run_db 转交线程池；
+notify 可以在任意线程调用。
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import func, update
+
+from backend.database import AnalysisTaskRecord, SessionLocal
+from backend.services.analysis_executor import DEFAULT_TIMEOUT_SECONDS
+from backend.services.io_pools import run_db
+
+DEFAULT_CONCURRENCY = int(os.getenv("ANALYSIS_QUEUE_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_TASK_MAX_ATTEMPTS", "2"))
+DEFAULT_MAX_PENDING = int(os.getenv("ANALYSIS_QUEUE_MAX_PENDING", "1000"))
+POLL_INTERVAL_SECONDS = float(os.getenv("ANALYSIS_QUEUE_POLL_INTERVAL", "2"))
+RECOVERY_INTERVAL_SECONDS = 60
+# 租约 = 任务超时 + 宽限，超过租约仍是 running 说明认领它的进程已经不在了
+LEASE_GRACE_SECONDS = 60
+
+
+class AnalysisQueueFullError(ValueError):
+    """待执行任务已达上限"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AnalysisTaskQueue:
+    """基于数据库的分析任务队列"""
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._handler: Optional[Callable[[str], Awaitable[None]]] = None
+        self._last_recovery = datetime.min
+
+    # ---------- 入队 ----------
+
+    def enqueue(self, record: AnalysisTaskRecord) -> None:
+        """写入一条 pending 任务并唤醒 worker"""
+        with SessionLocal() as db:
+            pending = (
+                db.query(func.count(AnalysisTaskRecord.id))
+                .filter(AnalysisTaskRecord.status == "pending")
+                .scalar()
+            )
+            if pending >= self.max_pending:
+                raise AnalysisQueueFullError(f"分析队列已满（{self.max_pending} 个待执行任务），请稍后再试")
+            record.status = "pending"
+            record.attempts = 0
+            record.max_attempts = record.max_attempts or self.max_attempts
+            db.add(record)
+            db.commit()
+            db.refresh(record)
+        self.notify()
+
+    def register_running(self, record: AnalysisTaskRecord, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> None:
+        """登记一个由调用方自行执行、不经过 worker 的任务（如外部 API 调用）
+
+        这类任务不可重放，中断后由 recover_stuck 直接标记为 failed。
+        """
+        now = datetime.utcnow()
+        record.status = "running"
+        record.attempts = 1
+        record.max_attempts = 1
+        record.worker_id = self.worker_id
+        record.started_at = now
+        record.lease_expires_at = now + timedelta(seconds=timeout + LEASE_GRACE_SECONDS)
+        with SessionLocal() as db:
+            db.add(record)
+            db.commit()
+            db.refresh(record)
+
+    def notify(self) -> None:
+        """唤醒 worker；状态流转方法在 db 线程池里执行，这里要切回 worker 所在的事件循环"""
+        if self._wakeup is None or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    # ---------- 状态流转 ----------
+
+    def claim(self) -> Optional[str]:
+        """原子认领最早的 pending 任务，返回任务 ID"""
+        with SessionLocal() as db:
+            while True:
+                candidate = (
+                    db.query(AnalysisTaskRecord.id, AnalysisTaskRecord.config)
+                    .filter(AnalysisTaskRecord.status == "pending")
+                    .order_by(AnalysisTaskRecord.created_at)
+                    .first()
+                )
+                if candidate is None:
+                    return None
+                timeout = (candidate.config or {}).get("timeout_seconds") or DEFAULT_TIMEOUT_SECONDS
+                now = datetime.utcnow()
+                claimed = db.execute(
+                    update(AnalysisTaskRecord)
+                    .where(AnalysisTaskRecord.id == candidate.id, AnalysisTaskRecord.status == "pending")
+                    .values(
+                        status="running",
+                        attempts=AnalysisTaskRecord.attempts + 1,
+                        worker_id=self.worker_id,
+                        started_at=now,
+                        lease_expires_at=now + timedelta(seconds=timeout + LEASE_GRACE_SECONDS),
+                    )
+                )
+                db.commit()
+                if claimed.rowcount == 1:
+                    return candidate.id
+                # 被其他 worker 抢先认领，继续找下一条
+
+    def _finish(self, task_id: str, **values) -> bool:
+        with SessionLocal() as db:
+            updated = db.execute(
+                update(AnalysisTaskRecord)
+                .where(AnalysisTaskRecord.id == task_id, AnalysisTaskRecord.status == "running")
+                .values(worker_id=None, lease_expires_at=None, **values)
+            )
+            db.commit()
+            return updated.rowcount == 1
+
+    def complete(self, task_id: str, result) -> bool:
+        return self._finish(task_id, status="completed", result=result, error_message=None,
+                            completed_at=datetime.utcnow())
+
+    def cancelled(self, task_id: str, message: str) -> bool:
+        return self._finish(task_id, status="cancelled", error_message=message, completed_at=datetime.utcnow())
+
+    def fail(self, task_id: str, message: str, retryable: bool = True) -> bool:
+        """失败：还有重试次数则放回 pending，否则标记 failed"""
+        with SessionLocal() as db:
+            record = db.query(AnalysisTaskRecord).filter(AnalysisTaskRecord.id == task_id).first()
+            can_retry = retryable and record is not None and (record.attempts or 0) < (record.max_attempts or 1)
+        if can_retry:
+            retried = self._finish(task_id, status="pending", error_message=message)
+            self.notify()
+            return retried
+        return self._finish(task_id, status="failed", error_message=message, completed_at=datetime.utcnow())
+
+    def cancel_pending(self, task_id: str, message: str) -> bool:
+        with SessionLocal() as db:
+            updated = db.execute(
+                update(AnalysisTaskRecord)
+                .where(AnalysisTaskRecord.id == task_id, AnalysisTaskRecord.status == "pending")
+                .values(status="cancelled", error_message=message, completed_at=datetime.utcnow())
+            )
+            db.commit()
+            return updated.rowcount == 1
+
+    def recover_stuck(self, at_startup: bool = False) -> int:
+        """把认领进程已退出或租约过期的 running 任务放回队列
+
+        at_startup=True 时本进程还没有执行任何任务，记在本进程名下的 running
+        任务（容器重启后 PID 可能复用）同样视为中断。
+        """
+        now = datetime.utcnow()
+        hostname = socket.gethostname()
+        recovered = 0
+        with SessionLocal() as db:
+            running = (
+                db.query(
+                    AnalysisTaskRecord.id,
+                    AnalysisTaskRecord.worker_id,
+                    AnalysisTaskRecord.lease_expires_at,
+                    AnalysisTaskRecord.attempts,
+                    AnalysisTaskRecord.max_attempts,
+                )
+                .filter(AnalysisTaskRecord.status == "running")
+                .all()
+            )
+            for task_id, worker_id, lease_expires_at, attempts, max_attempts in running:
+                host, _, pid = (worker_id or "").rpartition(":")
+                if worker_id is None or worker_id == self.worker_id:
+                    orphaned = worker_id is None or at_startup
+                else:
+                    orphaned = host == hostname and pid.isdigit() and not _pid_alive(int(pid))
+                expired = lease_expires_at is not None and lease_expires_at < now
+                if not (orphaned or expired):
+                    continue
+                if (attempts or 0) < (max_attempts or 1):
+                    values = {"status": "pending", "error_message": "服务重启或执行进程退出，任务已重新排队"}
+                else:
+                    values = {"status": "failed", "error_message": "任务执行中断且已达到最大重试次数",
+                              "completed_at": now}
+                owner_filter = (
+                    AnalysisTaskRecord.worker_id.is_(None) if worker_id is None
+                    else AnalysisTaskRecord.worker_id == worker_id
+                )
+                updated = db.execute(
+                    update(AnalysisTaskRecord)
+                    .where(AnalysisTaskRecord.id == task_id, AnalysisTaskRecord.status == "running", owner_filter)
+                    .values(worker_id=None, lease_expires_at=None, **values)
+                )
+                recovered += updated.rowcount
+            db.commit()
+        self._last_recovery = now
+        return recovered
+
+    # ---------- worker ----------
+
+    async def _worker_loop(self) -> None:
+        while True:
+            if (datetime.utcnow() - self._last_recovery).total_seconds() > RECOVERY_INTERVAL_SECONDS:
+                await run_db(self.recover_stuck)
+            task_id = await run_db(self.claim)
+            if task_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._handler(task_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"分析任务 {task_id} 执行异常: {exc}")
+                await run_db(self.fail, task_id, str(exc))
+
+    async def start(self, handler: Callable[[str], Awaitable[None]]) -> None:
+        """启动 worker：先恢复卡死任务，再按并发数拉起认领循环"""
+        if self._workers:
+            return
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        recovered = await run_db(self.recover_stuck, at_startup=True)
+        if recovered:
+            print(f"♻️ 已恢复 {recovered} 个中断的分析任务")
+        self._workers = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+# 全局队列实例
+analysis_queue = AnalysisTaskQueue()
@@ -10,10 +10,13 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import os
+import time
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -28,22 +31,44 @@ try:
 except Exception:  # pragma: no cover - optional dependency at runtime
     sm = None
 
-from backend.services.database_service import DatabaseService
+from backend.database import AnalysisTaskRecord, APICallLogRecord, SessionLocal
+from backend.services.analysis_context import AnalysisContext
+from backend.services.analysis_executor import (
+    AnalysisCancelledError,
+    AnalysisTimeoutError,
+    analysis_executor,
+)
+from backend.services.analysis_queue import analysis_queue
+from backend.services.content_store import ContentStore
+from backend.services.correlation_engine import CORRELATION_MATRIX_LIMIT, compute_correlations
+from backend.services.database_service import DatabaseService, default_table
+from backend.services.dataset_profiler import profile_dataframe, sketch_profile
 from backend.services.stella import stella_service
+from backend.services.io_pools import run_db, run_disk
+from backend.services.hypothesis_tests import adjust_pvalues, group_tests
+from backend.services.regression_cache import prepare_design, regression_cache
+from backend.services.streaming_analysis import DescriptiveAccumulator, GroupComparisonAccumulator
 from backend.upload_models import (
     AnalysisConfig,
+    AnalysisPlanStep,
     AnalysisSuggestion,
     AnalysisTask,
-    APICallLog,
     ColumnProfile,
     DatabaseProfile,
     ExternalAPIResponse,
 )
 from skills.registry import skill_registry
 
-# 内存存储（生产环境应使用数据库）
-analysis_tasks_db: Dict[str, AnalysisTask] = {}
-api_logs_db: Dict[str, APICallLog] = {}
+# 原始文件达到该大小时 profile_database 默认走流式近似画像（默认为上传上限的一半）
+SKETCH_PROFILE_MIN_BYTES = int(
+    os.getenv("SKETCH_PROFILE_MIN_MB", str(DatabaseService.MAX_FILE_SIZE // 2 // (1024 * 1024)))
+) * 1024 * 1024
+
+ANALYSIS_TYPES = ("descriptive", "comparative", "correlation", "regression", "custom")
+
+# 支持分块流式执行的分析类型，以及数据集展开后达到多大时默认改走分块执行
+STREAMING_ANALYSIS_TYPES = {"descriptive", "comparative"}
+STREAMING_ANALYSIS_MIN_BYTES = int(os.getenv("STREAMING_ANALYSIS_MIN_MB", "128")) * 1024 * 1024
 
 # 外部API配置
 EXTERNAL_APIS = {
@@ -105,6 +130,38 @@ def _sample_values(series: pd.Series, limit: int = 5) -> List[Any]:
     return values
 
 
+def _matrix_dict(matrix: Optional[np.ndarray], labels: List[Any]) -> Optional[Dict[Any, Dict[Any, Any]]]:
+    """方阵转成与 DataFrame.to_dict() 相同的 {列: {行: 值}} 结构；超出矩阵输出上限时为 None"""
+    if matrix is None:
+        return None
+    return pd.DataFrame(matrix, index=labels, columns=labels).to_dict()
+
+
+def _dump_model(model: Any) -> Optional[Dict[str, Any]]:
+    if model is None:
+        return None
+    if hasattr(model, "model_dump"):
+        return model.model_dump()
+    return model.dict()
+
+
+def _task_from_record(record: AnalysisTaskRecord) -> AnalysisTask:
+    return AnalysisTask(
+        id=record.id,
+        name=record.name,
+        description=record.description,
+        database_id=record.database_id,
+        analysis_type=record.analysis_type,
+        status=record.status,
+        config=AnalysisConfig(**record.config) if record.config else None,
+        result=record.result,
+        error_message=record.error_message,
+        created_by=record.created_by,
+        created_at=record.created_at,
+        completed_at=record.completed_at,
+    )
+
+
 def _find_categorical_candidates(df: pd.DataFrame, max_categories: int = 10) -> List[str]:
     candidates: List[str] = []
     for column in df.columns:
@@ -134,30 +191,31 @@ class AnalysisService:
     ) -> AnalysisTask:
         """创建分析任务"""
 
-        database = DatabaseService.get_database(database_id)
+        database = await run_db(DatabaseService.get_database, database_id)
         if not database:
             raise ValueError("数据库不存在")
+        # 提前校验目标表，避免任务排队后才失败
+        DatabaseService.dataset_table(database, config.table if config else None)
 
-        task_id = str(uuid.uuid4())
-        now = datetime.utcnow()
-        task = AnalysisTask(
-            id=task_id,
+        record = AnalysisTaskRecord(
+            id=str(uuid.uuid4()),
             name=name,
             description=description,
             database_id=database_id,
             analysis_type=analysis_type,
-            status="pending",
-            config=config or AnalysisConfig(),
+            config=_dump_model(config or AnalysisConfig()),
             created_by=created_by,
-            created_at=now,
+            created_at=datetime.utcnow(),
         )
-        analysis_tasks_db[task_id] = task
-        asyncio.create_task(cls._execute_analysis(task_id))
-        return task
+        # 只落库排队，由 analysis_queue 的 worker 认领执行
+        await run_db(analysis_queue.enqueue, record)
+        return _task_from_record(record)
 
     @classmethod
     def get_task(cls, task_id: str) -> Optional[AnalysisTask]:
-        return analysis_tasks_db.get(task_id)
+        with SessionLocal() as db:
+            record = db.query(AnalysisTaskRecord).filter(AnalysisTaskRecord.id == task_id).first()
+            return _task_from_record(record) if record else None
 
     @classmethod
     def get_tasks(
@@ -167,13 +225,19 @@ class AnalysisService:
         skip: int = 0,
         limit: int = 100,
     ) -> List[AnalysisTask]:
-        tasks = list(analysis_tasks_db.values())
-        if database_id:
-            tasks = [task for task in tasks if task.database_id == database_id]
-        if status:
-            tasks = [task for task in tasks if task.status == status]
-        tasks.sort(key=lambda item: item.created_at, reverse=True)
-        return tasks[skip : skip + limit]
+        with SessionLocal() as db:
+            query = db.query(AnalysisTaskRecord)
+            if database_id:
+                query = query.filter(AnalysisTaskRecord.database_id == database_id)
+            if status:
+                query = query.filter(AnalysisTaskRecord.status == status)
+            records = (
+                query.order_by(AnalysisTaskRecord.created_at.desc())
+                .offset(skip)
+                .limit(limit)
+                .all()
+            )
+            return [_task_from_record(record) for record in records]
 
     @classmethod
     async def profile_database(
@@ -181,68 +245,124 @@ class AnalysisService:
         database_id: str,
         sample_rows: int = 1000,
         max_categories: int = 10,
+        mode: str = "auto",
+        table: Optional[str] = None,
     ) -> DatabaseProfile:
-        """生成数据库画像，用于前台分析规划和执行前检查。"""
+        """生成数据库画像，用于前台分析规划和执行前检查。
 
-        database = DatabaseService.get_database(database_id)
+        mode: exact 全量精确画像；sketch 流式近似画像；auto 按文件大小自动选择。
+        table: 多表数据库（SQLite 表/视图、Excel 工作表）要画像的表，默认第一张表。
+        画像只由文件内容决定，按内容缓存，内容相同的数据库记录共用。
+        """
+
+        database = await run_db(DatabaseService.get_database, database_id)
         if not database:
             raise ValueError("数据库不存在")
+        table = DatabaseService.dataset_table(database, table)
+
+        use_sketch = mode == "sketch" or (mode == "auto" and database.file_size >= SKETCH_PROFILE_MIN_BYTES)
+        content_blob = (database.metadata or {}).get("content_blob")
+        profile_key = f"{'sketch' if use_sketch else 'exact'}:{sample_rows}:{max_categories}"
+        if table:
+            profile_key = f"{profile_key}:{table}"
+        if content_blob:
+            cached = (await run_db(ContentStore.get_derived, content_blob)).get("profiles", {}).get(profile_key)
+            if cached:
+                return DatabaseProfile(**{**cached, "database_id": database.id, "database_name": database.name})
+
+        # 解析、逐列统计和流式摘要都是 CPU 密集型，放到分析进程池里执行
+        file_path, file_type = await run_disk(DatabaseService.resolve_dataset_file, database, table)
+        payload = await analysis_executor.run_profile(
+            f"profile-{uuid.uuid4()}",
+            database.id,
+            database.name,
+            file_path,
+            file_type,
+            table,
+            table or default_table(database.schema),
+            use_sketch,
+            sample_rows,
+            max_categories,
+        )
+        if content_blob:
+            await run_db(ContentStore.update_derived, content_blob, {"profiles": {profile_key: payload}})
+        return DatabaseProfile(**payload)
 
-        df = await cls._load_dataframe(database)
-        if df is None or df.empty:
-            raise ValueError("无法加载数据或数据库为空")
-
-        datetime_columns: List[str] = []
-        for column in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[column]):
-                datetime_columns.append(column)
+    @classmethod
+    def build_profile(
+        cls,
+        database_id: str,
+        database_name: str,
+        file_path: Path,
+        file_type: str,
+        table: Optional[str],
+        table_name: Optional[str],
+        use_sketch: bool,
+        sample_rows: int,
+        max_categories: int,
+    ) -> Dict[str, Any]:
+        """同步生成数据画像并返回 JSON 形式（由 analysis_executor 在子进程中调用）
+
+        use_sketch 为 True 时按块流式扫描并用摘要估计，否则整表加载后精确计算。
+        """
+        if use_sketch:
+            # 大文件不整表加载，按块流式扫描并用摘要估计
+            stats, head = sketch_profile(
+                DatabaseService.iter_dataset_chunks(file_path, file_type, table=table),
+                sample_rows=sample_rows,
+            )
+            if stats.total_rows == 0:
+                raise ValueError("无法加载数据或数据库为空")
+        else:
+            try:
+                df = DatabaseService.load_dataset_file(file_path, file_type, table)
+            except Exception as exc:
+                print(f"加载数据失败: {exc}")
+                df = None
+            if df is None or df.empty:
+                raise ValueError("无法加载数据或数据库为空")
+            # 一次扫描算出全部列统计量，画像和下面的推荐逻辑共用
+            stats = profile_dataframe(df)
+            head = df.head(sample_rows)
 
-        numeric_columns = _find_numeric_candidates(df)
-        categorical_columns = [
-            column
-            for column in df.columns
-            if column not in numeric_columns and column not in datetime_columns
-        ]
+        numeric_columns = stats.numeric_columns
+        categorical_columns = stats.categorical_columns
+        datetime_columns = stats.datetime_columns
+        total_rows = stats.total_rows
 
         missingness = []
         column_profiles: List[ColumnProfile] = []
-        for column in df.columns:
-            series = df[column]
-            missing_count = int(series.isna().sum())
-            non_null_count = int(series.notna().sum())
-            unique_count = int(series.nunique(dropna=True))
-            missing_rate = round(missing_count / len(df), 4) if len(df) else 0.0
+        for column, column_stats in stats.columns.items():
+            non_null_count = column_stats.non_null_count
+            missing_count = total_rows - non_null_count
+            unique_count = column_stats.unique_count
+            missing_rate = round(missing_count / total_rows, 4) if total_rows else 0.0
 
-            if pd.api.types.is_numeric_dtype(series):
+            if column_stats.kind == "numeric":
                 inferred_role = "measure"
                 numeric_summary = {
-                    "mean": _safe_round(series.mean()),
-                    "std": _safe_round(series.std()),
-                    "min": _safe_round(series.min()),
-                    "median": _safe_round(series.median()),
-                    "max": _safe_round(series.max()),
+                    key: _safe_round(value) for key, value in column_stats.numeric_summary.items()
                 }
                 categorical_summary = None
-            elif pd.api.types.is_datetime64_any_dtype(series):
+            elif column_stats.kind == "datetime":
                 inferred_role = "time"
                 numeric_summary = None
                 categorical_summary = {
-                    "min": _to_native(series.min()),
-                    "max": _to_native(series.max()),
+                    "min": _to_native(column_stats.time_range[0]),
+                    "max": _to_native(column_stats.time_range[1]),
                 }
             else:
-                if unique_count == len(df) and unique_count > 20:
+                if unique_count == total_rows and unique_count > 20:
                     inferred_role = "identifier"
                 elif 2 <= unique_count <= max_categories:
                     inferred_role = "grouping_candidate"
                 else:
                     inferred_role = "attribute"
                 numeric_summary = None
-                top_values = series.value_counts(dropna=True).head(5)
                 categorical_summary = {
                     "top_values": [
-                        {"value": _to_native(index), "count": int(count)}
-                        for index, count in top_values.items()
+                        {"value": _to_native(value), "count": int(count)}
+                        for value, count in column_stats.top_values
                     ]
                 }
 
@@ -258,33 +378,31 @@ class AnalysisService:
             column_profiles.append(
                 ColumnProfile(
                     name=column,
-                    data_type=str(series.dtype),
+                    data_type=column_stats.dtype,
                     inferred_role=inferred_role,
                     non_null_count=non_null_count,
                     missing_count=missing_count,
                     missing_rate=missing_rate,
                     unique_count=unique_count,
-                    sample_values=_sample_values(series.head(sample_rows)),
+                    sample_values=_sample_values(head[column]) if column in head else [],
                     numeric_summary=_to_native(numeric_summary) if numeric_summary else None,
                     categorical_summary=_to_native(categorical_summary) if categorical_summary else None,
+                    approximate_fields=column_stats.approximate_fields,
+                    error_bounds=_to_native(column_stats.error_bounds),
                 )
             )
 
-        recommended_group_by = _find_categorical_candidates(df, max_categories=max_categories)
+        recommended_group_by = stats.grouping_candidates(max_categories=max_categories)
         recommended_targets = numeric_columns[:5]
-        binary_candidates = [
-            column
-            for column in categorical_columns
-            if 2 <= df[column].nunique(dropna=True) <= 2
-        ]
-        recommended_targets.extend(binary_candidates[:3])
+        recommended_targets.extend(stats.binary_columns()[:3])
 
         missingness.sort(key=lambda item: item["missing_rate"], reverse=True)
-        return DatabaseProfile(
-            database_id=database.id,
-            database_name=database.name,
-            total_rows=int(len(df)),
-            total_columns=int(len(df.columns)),
+        profile = DatabaseProfile(
+            database_id=database_id,
+            database_name=database_name,
+            table=table_name,
+            total_rows=total_rows,
+            total_columns=len(stats.columns),
             numeric_columns=numeric_columns,
             categorical_columns=categorical_columns,
             datetime_columns=datetime_columns,
@@ -292,8 +410,10 @@ class AnalysisService:
             recommended_targets=list(dict.fromkeys(recommended_targets))[:8],
             missingness_overview=missingness[:10],
             column_profiles=column_profiles,
+            profile_mode=stats.mode,
             generated_at=datetime.utcnow(),
         )
+        return profile.model_dump(mode="json") if hasattr(profile, "model_dump") else json.loads(profile.json())
 
     @classmethod
     async def build_analysis_plan(
@@ -305,6 +425,7 @@ class AnalysisService:
         preferred_analysis_types: Optional[List[str]] = None,
         required_outputs: Optional[List[str]] = None,
         constraints: Optional[List[str]] = None,
+        table: Optional[str] = None,
     ) -> Dict[str, Any]:
         """结合数据画像、STELLA 和 skills 生成分析规划。"""
 
@@ -312,7 +433,7 @@ class AnalysisService:
         required_outputs = required_outputs or []
         constraints = constraints or []
 
-        profile = await cls.profile_database(database_id)
+        profile = await cls.profile_database(database_id, table=table)
         stella_workflow = stella_service.build_workflow(
             objective=objective,
             clinical_question=clinical_question,
@@ -377,6 +498,108 @@ class AnalysisService:
             "execution_notes": execution_notes,
         }
 
+    @classmethod
+    async def resolve_plan_steps(
+        cls,
+        database_id: str,
+        steps: Optional[List[AnalysisPlanStep]] = None,
+        suggestions: Optional[List[AnalysisSuggestion]] = None,
+        preferred_analysis_types: Optional[List[str]] = None,
+        table: Optional[str] = None,
+    ) -> List[AnalysisPlanStep]:
+        """确定要执行的规划步骤：显式步骤优先，其次是 /plan 给出的建议，都没有时按数据画像重新生成建议"""
+        database = await run_db(DatabaseService.get_database, database_id)
+        if not database:
+            raise ValueError("数据库不存在")
+        DatabaseService.dataset_table(database, table)
+        if not steps:
+            if not suggestions:
+                profile = await cls.profile_database(database_id, table=table)
+                suggestions = cls._suggest_analyses(profile, preferred_analysis_types or [])
+            steps = [
+                AnalysisPlanStep(
+                    analysis_type=suggestion.analysis_type,
+                    title=suggestion.title,
+                    config=AnalysisConfig(
+                        variables=suggestion.recommended_variables or None,
+                        target_variable=suggestion.target_variable,
+                        group_by=suggestion.group_by,
+                    ),
+                )
+                for suggestion in suggestions
+            ]
+        if not steps:
+            raise ValueError("分析规划为空")
+        unsupported = sorted({step.analysis_type for step in steps} - set(ANALYSIS_TYPES))
+        if unsupported:
+            raise ValueError(f"不支持的分析类型: {', '.join(unsupported)}")
+        return steps
+
+    @classmethod
+    async def execute_analysis_plan(
+        cls,
+        database_id: str,
+        steps: List[AnalysisPlanStep],
+        timeout: Optional[float] = None,
+        table: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """在一个分析子进程里执行整份规划：数据只加载一次，各步骤共享中间结果，逐步产出事件
+
+        事件依次为 plan（步骤清单）、loaded（加载耗时）、每个步骤的 result / error，最后是 done。
+        table 指定多表数据库里的表，整份规划都作用在这张表上。
+        """
+        database = await run_db(DatabaseService.get_database, database_id)
+        if not database:
+            raise ValueError("数据库不存在")
+        table = DatabaseService.dataset_table(database, table)
+        file_path, file_type = await run_disk(DatabaseService.resolve_dataset_file, database, table)
+        plan_id = str(uuid.uuid4())
+        started = time.perf_counter()
+        completed = failed = 0
+
+        def describe(index: int) -> Dict[str, Any]:
+            return {"index": index, "analysis_type": steps[index].analysis_type, "title": steps[index].title}
+
+        yield {"type": "plan", "plan_id": plan_id, "database_id": database.id,
+               "steps": [describe(index) for index in range(len(steps))]}
+        try:
+            async for event in analysis_executor.run_plan(
+                plan_id,
+                database.id,
+                file_path,
+                file_type,
+                [(index, step.analysis_type, step.config or AnalysisConfig()) for index, step in enumerate(steps)],
+                timeout=timeout,
+                table=table,
+            ):
+                kind, index = event[0], event[1]
+                if kind == "loaded":
+                    yield {"type": "loaded", "plan_id": plan_id, "load_seconds": round(event[2], 4)}
+                elif kind == "result":
+                    completed += 1
+                    yield {"type": "result", "plan_id": plan_id, **describe(index),
+                           "elapsed_seconds": round(event[3], 4), "result": event[2]}
+                else:
+                    failed += 1
+                    yield {"type": "error", "plan_id": plan_id, **describe(index),
+                           "elapsed_seconds": round(event[3], 4), "error": event[2]}
+        except Exception as exc:
+            # 响应已经开始流式输出，整份规划级别的失败（加载失败、超时、取消）也作为事件返回
+            yield {"type": "error", "plan_id": plan_id, "index": None, "error": str(exc)}
+        yield {
+            "type": "done",
+            "plan_id": plan_id,
+            "completed": completed,
+            "failed": failed,
+            "skipped": len(steps) - completed - failed,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+        }
+
+    @classmethod
+    def cancel_plan_execution(cls, plan_id: str) -> bool:
+        """取消正在执行的规划，返回该规划是否仍在执行"""
+        return analysis_executor.cancel(plan_id)
+
     @classmethod
     def _suggest_analyses(
         cls,
@@ -454,73 +677,76 @@ class AnalysisService:
 
     @classmethod
     async def _execute_analysis(cls, task_id: str):
-        task = analysis_tasks_db.get(task_id)
+        """执行一个已被队列认领（status=running）的分析任务"""
+        task = await run_db(cls.get_task, task_id)
         if not task:
             return
 
-        task.status = "running"
-        analysis_tasks_db[task_id] = task
+        database = await run_db(DatabaseService.get_database, task.database_id)
+        if not database:
+            await run_db(analysis_queue.fail, task_id, "数据库不存在", retryable=False)
+            return
 
         try:
-            database = DatabaseService.get_database(task.database_id)
-            if not database:
-                raise ValueError("数据库不存在")
-
-            df = await cls._load_dataframe(database)
-            if df is None or df.empty:
-                raise ValueError("无法加载数据")
-
-            if task.analysis_type == "descriptive":
-                result = await cls._descriptive_analysis(df, task.config)
-            elif task.analysis_type == "comparative":
-                result = await cls._comparative_analysis(df, task.config)
-            elif task.analysis_type == "correlation":
-                result = await cls._correlation_analysis(df, task.config)
-            elif task.analysis_type == "regression":
-                result = await cls._regression_analysis(df, task.config)
-            else:
-                result = await cls._custom_analysis(df, task.config)
-
-            task.result = result
-            task.status = "completed"
-            task.completed_at = datetime.utcnow()
+            # 计算放到进程池里执行，只把数据文件路径交给子进程
+            table = DatabaseService.dataset_table(database, task.config.table if task.config else None)
+            file_path, file_type = await run_disk(DatabaseService.resolve_dataset_file, database, table)
+            result = await analysis_executor.run(
+                task_id,
+                task.analysis_type,
+                database.id,
+                file_path,
+                file_type,
+                task.config or AnalysisConfig(),
+                timeout=task.config.timeout_seconds if task.config else None,
+                table=table,
+            )
+        except AnalysisCancelledError as exc:
+            await run_db(analysis_queue.cancelled, task_id, str(exc))
+        except (ValueError, AnalysisTimeoutError) as exc:
+            # 数据问题或超时，重试也不会好转
+            await run_db(analysis_queue.fail, task_id, str(exc), retryable=False)
         except Exception as exc:
-            task.status = "failed"
-            task.error_message = str(exc)
-            task.completed_at = datetime.utcnow()
-
-        analysis_tasks_db[task_id] = task
+            await run_db(analysis_queue.fail, task_id, str(exc))
+        else:
+            await run_db(analysis_queue.complete, task_id, result)
 
     @classmethod
-    async def _load_dataframe(cls, database) -> Optional[pd.DataFrame]:
-        file_path = Path(database.file_path)
-        file_type = database.file_type
+    def run_analysis(
+        cls,
+        analysis_type: str,
+        df: pd.DataFrame,
+        config: AnalysisConfig,
+        dataset_key: Optional[str] = None,
+        context: Optional[AnalysisContext] = None,
+    ) -> Dict[str, Any]:
+        """同步执行一次分析（CPU 密集，由 analysis_executor 在子进程中调用）
+
+        dataset_key 标识数据集的具体版本（database_id + 文件 mtime），用于复用回归设计矩阵缓存；
+        context 为同一次数据加载上多个分析共享的中间结果（缺失掩码、数值矩阵、分组编码）。
+        """
+        context = context or AnalysisContext(df)
+        if analysis_type == "descriptive":
+            return cls._descriptive_analysis(df, config, context)
+        if analysis_type == "comparative":
+            return cls._comparative_analysis(df, config, context)
+        if analysis_type == "correlation":
+            return cls._correlation_analysis(df, config, context)
+        if analysis_type == "regression":
+            return cls._regression_analysis(df, config, dataset_key, context)
+        return cls._custom_analysis(df, config)
 
-        try:
-            if file_type == "csv":
-                return pd.read_csv(file_path)
-            if file_type in ["xlsx", "xls"]:
-                return pd.read_excel(file_path)
-            if file_type == "json":
-                import json
-
-                with open(file_path, "r", encoding="utf-8") as handle:
-                    data = json.load(handle)
-                return pd.DataFrame(data if isinstance(data, list) else [data])
-            if file_type in ["sqlite", "db"]:
-                import sqlite3
-
-                conn = sqlite3.connect(str(file_path))
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                table_name = cursor.fetchone()[0]
-                df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-                conn.close()
-                return df
-            return None
-        except Exception as exc:
-            print(f"加载数据失败: {exc}")
+    @classmethod
+    def cancel_task(cls, task_id: str) -> Optional[AnalysisTask]:
+        """取消排队或运行中的分析任务"""
+        task = cls.get_task(task_id)
+        if not task:
             return None
+        if task.status == "pending" and analysis_queue.cancel_pending(task_id, "分析任务已取消"):
+            return cls.get_task(task_id)
+        if task.status == "running":
+            analysis_executor.cancel(task_id)
+        return task
 
     @classmethod
     def _build_result(
@@ -550,21 +776,103 @@ class AnalysisService:
         }
 
     @classmethod
-    async def _descriptive_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
+    def should_stream(cls, analysis_type: str, file_path: Path, file_type: str, config: Optional[AnalysisConfig]) -> bool:
+        """是否改走分块流式执行：config.streaming 显式指定优先，否则按数据集展开后的大小判断"""
+        if analysis_type not in STREAMING_ANALYSIS_TYPES:
+            return False
+        if config is not None and config.streaming is not None:
+            return config.streaming
+        return DatabaseService.estimate_dataset_bytes(file_path, file_type) >= STREAMING_ANALYSIS_MIN_BYTES
+
+    @classmethod
+    def run_streaming_analysis(
+        cls,
+        analysis_type: str,
+        chunks: Iterable[pd.DataFrame],
+        config: AnalysisConfig,
+    ) -> Dict[str, Any]:
+        """按块执行描述性统计或组间比较，内存占用与数据行数无关"""
+        if analysis_type == "descriptive":
+            accumulator = DescriptiveAccumulator(config.variables)
+            for chunk in chunks:
+                accumulator.update(chunk)
+            raw = accumulator.result()
+            if raw["total_rows"] == 0:
+                raise ValueError("无法加载数据")
+
+            numeric_summary = {
+                column: {
+                    "count": int(stats["count"]),
+                    **{key: _safe_round(stats[key]) for key in ("mean", "std", "min", "median", "max")},
+                    "missing": int(stats["missing"]),
+                }
+                for column, stats in raw["numeric"].items()
+            }
+            categorical_summary = {
+                column: {
+                    "unique_count": int(stats["unique_count"]),
+                    "missing": int(stats["missing"]),
+                    "top_values": [
+                        {"value": _to_native(value), "count": int(count)} for value, count in stats["top_values"]
+                    ],
+                }
+                for column, stats in raw["categorical"].items()
+            }
+            return cls._build_descriptive_result(
+                raw["variables"],
+                raw["total_rows"],
+                raw["total_columns"],
+                numeric_summary,
+                categorical_summary,
+                extra_statistics={"execution_mode": "streaming", "approximate_fields": raw["approximate"]},
+            )
+
+        if analysis_type == "comparative":
+            if not config.group_by:
+                return cls._comparative_without_group()
+            accumulator = GroupComparisonAccumulator(config.group_by, config.variables)
+            for chunk in chunks:
+                accumulator.update(chunk)
+            if accumulator.numeric_vars is None:
+                return cls._comparative_without_group()
+            if not accumulator.numeric_vars:
+                return cls._comparative_without_numeric()
+
+            raw = accumulator.result()
+            if raw is None:
+                raise ValueError("无法加载数据")
+            comparisons, testing = cls._group_comparisons(
+                config.group_by, raw["groups"], raw["numeric_vars"],
+                raw["count"], raw["mean"], raw["var"], raw["median"], config,
+            )
+            return cls._build_comparative_result(
+                config.group_by,
+                [str(key) for key in raw["groups"]],
+                comparisons,
+                raw["numeric_vars"],
+                testing,
+                extra_statistics={"execution_mode": "streaming", "approximate_fields": raw["approximate"]},
+            )
+
+        raise ValueError(f"{analysis_type} 分析暂不支持分块执行")
+
+    @classmethod
+    def _descriptive_analysis(
+        cls, df: pd.DataFrame, config: AnalysisConfig, context: Optional[AnalysisContext] = None
+    ) -> Dict[str, Any]:
+        context = context or AnalysisContext(df)
         variables = [column for column in (config.variables or df.columns.tolist()) if column in df.columns]
         if not variables:
             variables = df.columns.tolist()
 
         numeric_summary: Dict[str, Dict[str, Any]] = {}
-        numeric_rows: List[Dict[str, Any]] = []
         categorical_summary: Dict[str, Dict[str, Any]] = {}
-        categorical_rows: List[Dict[str, Any]] = []
 
         for column in variables:
             series = df[column]
-            missing_count = int(series.isna().sum())
+            missing_count = context.missing_count(column)
             if pd.api.types.is_numeric_dtype(series):
-                stats = {
+                numeric_summary[column] = {
                     "count": int(series.count()),
                     "mean": _safe_round(series.mean()),
                     "std": _safe_round(series.std()),
@@ -573,11 +881,9 @@ class AnalysisService:
                     "max": _safe_round(series.max()),
                     "missing": missing_count,
                 }
-                numeric_summary[column] = stats
-                numeric_rows.append({"variable": column, **stats})
             else:
                 top_values = series.value_counts(dropna=True).head(5)
-                summary = {
+                categorical_summary[column] = {
                     "unique_count": int(series.nunique(dropna=True)),
                     "missing": missing_count,
                     "top_values": [
@@ -585,28 +891,52 @@ class AnalysisService:
                         for index, count in top_values.items()
                     ],
                 }
-                categorical_summary[column] = summary
-                categorical_rows.append(
-                    {
-                        "variable": column,
-                        "unique_count": summary["unique_count"],
-                        "missing": missing_count,
-                        "top_value": summary["top_values"][0]["value"] if summary["top_values"] else None,
-                    }
-                )
 
-        missingness = sorted(
-            [
+        return cls._build_descriptive_result(
+            variables, int(len(df)), int(len(df.columns)), numeric_summary, categorical_summary
+        )
+
+    @classmethod
+    def _build_descriptive_result(
+        cls,
+        variables: List[str],
+        total_rows: int,
+        total_columns: int,
+        numeric_summary: Dict[str, Dict[str, Any]],
+        categorical_summary: Dict[str, Dict[str, Any]],
+        extra_statistics: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """内存路径和分块路径共用的描述性统计结果组装"""
+        numeric_rows = [
+            {"variable": column, **numeric_summary[column]} for column in variables if column in numeric_summary
+        ]
+        categorical_rows = [
+            {
+                "variable": column,
+                "unique_count": categorical_summary[column]["unique_count"],
+                "missing": categorical_summary[column]["missing"],
+                "top_value": (
+                    categorical_summary[column]["top_values"][0]["value"]
+                    if categorical_summary[column]["top_values"] else None
+                ),
+            }
+            for column in variables
+            if column in categorical_summary
+        ]
+
+        missingness = []
+        for column in variables:
+            summary = numeric_summary.get(column) or categorical_summary.get(column)
+            if summary is None:
+                continue
+            missingness.append(
                 {
                     "variable": column,
-                    "missing_rate": round(float(df[column].isna().mean()), 4),
-                    "missing_count": int(df[column].isna().sum()),
+                    "missing_rate": round(summary["missing"] / total_rows, 4) if total_rows else 0.0,
+                    "missing_count": summary["missing"],
                 }
-                for column in variables
-            ],
-            key=lambda item: item["missing_rate"],
-            reverse=True,
-        )
+            )
+        missingness.sort(key=lambda item: item["missing_rate"], reverse=True)
 
         recommendations = ["先确认高缺失变量是否需要剔除或插补。"]
         if categorical_rows:
@@ -618,11 +948,12 @@ class AnalysisService:
             "descriptive",
             "已完成数据画像与描述性统计。",
             statistics={
-                "total_rows": int(len(df)),
-                "total_columns": int(len(df.columns)),
+                "total_rows": total_rows,
+                "total_columns": total_columns,
                 "numeric_summary": numeric_summary,
                 "categorical_summary": categorical_summary,
                 "missingness_overview": missingness[:10],
+                **(extra_statistics or {}),
             },
             tables=[
                 {"name": "numeric_summary", "title": "数值变量统计表", "rows": numeric_rows},
@@ -637,59 +968,145 @@ class AnalysisService:
                 }
             ],
             recommendations=recommendations,
-            extra_summary={"rows": int(len(df)), "columns": int(len(df.columns))},
+            extra_summary={"rows": total_rows, "columns": total_columns},
+        )
+
+    @classmethod
+    def _comparative_without_group(cls) -> Dict[str, Any]:
+        return cls._build_result(
+            "comparative",
+            "缺少有效的分组变量，暂时无法执行比较分析。",
+            recommendations=["请先指定 config.group_by，并确保该字段是 2-10 类的分组变量。"],
         )
 
     @classmethod
-    async def _comparative_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
+    def _comparative_without_numeric(cls) -> Dict[str, Any]:
+        return cls._build_result(
+            "comparative",
+            "没有找到可比较的数值变量。",
+            recommendations=["请至少选择一个数值型变量用于组间比较。"],
+        )
+
+    @classmethod
+    def _comparative_analysis(
+        cls, df: pd.DataFrame, config: AnalysisConfig, context: Optional[AnalysisContext] = None
+    ) -> Dict[str, Any]:
         group_by = config.group_by
         if not group_by or group_by not in df.columns:
-            return cls._build_result(
-                "comparative",
-                "缺少有效的分组变量，暂时无法执行比较分析。",
-                recommendations=["请先指定 config.group_by，并确保该字段是 2-10 类的分组变量。"],
-            )
+            return cls._comparative_without_group()
 
         variables = [item for item in (config.variables or df.columns.tolist()) if item in df.columns]
         numeric_vars = [item for item in variables if pd.api.types.is_numeric_dtype(df[item])]
         if not numeric_vars:
-            return cls._build_result(
-                "comparative",
-                "没有找到可比较的数值变量。",
-                recommendations=["请至少选择一个数值型变量用于组间比较。"],
-            )
-
-        grouped = df.groupby(group_by, dropna=False)
-        group_levels = [str(level) for level in grouped.groups.keys()]
-        rows: List[Dict[str, Any]] = []
-        stats_payload: Dict[str, Any] = {}
+            return cls._comparative_without_numeric()
+
+        # 一次 groupby 聚合拿到所有变量的分组充分统计量，检验在矩阵上批量完成
+        context = context or AnalysisContext(df)
+        codes, groups = context.group_codes(group_by)
+        grouped = context.numeric_frame(numeric_vars).groupby(codes)
+        levels = range(len(groups))
+        comparisons, testing = cls._group_comparisons(
+            group_by,
+            groups,
+            numeric_vars,
+            grouped.count().reindex(levels, fill_value=0).to_numpy(dtype=np.float64),
+            grouped.mean().reindex(levels).to_numpy(),
+            grouped.var(ddof=1).reindex(levels).to_numpy(),
+            grouped.median().reindex(levels).to_numpy(),
+            config,
+        )
+        return cls._build_comparative_result(
+            group_by, [str(key) for key in groups], comparisons, numeric_vars, testing
+        )
 
-        for variable in numeric_vars[:8]:
-            per_group = grouped[variable].agg(["count", "mean", "std", "median"]).reset_index()
-            per_group_records = per_group.to_dict("records")
+    @classmethod
+    def _group_comparisons(
+        cls,
+        group_by: str,
+        groups: List[Any],
+        numeric_vars: List[str],
+        count: np.ndarray,
+        mean: np.ndarray,
+        var: np.ndarray,
+        median: np.ndarray,
+        config: AnalysisConfig,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """由 (分组 × 变量) 统计量矩阵生成每个变量的分组汇总、检验结果和多重检验摘要"""
+        tests = group_tests(count, mean, var)
+        method = config.p_adjust_method
+        alpha = round(1 - config.confidence_level, 6)
+        adjusted = adjust_pvalues(tests["p_value"], method) if tests else None
+        std = np.sqrt(var)
+        keys = [_to_native(key) for key in groups]
+
+        comparisons: Dict[str, Any] = {}
+        for j, variable in enumerate(numeric_vars):
+            by_group = [
+                {
+                    group_by: key,
+                    "count": int(count[i, j]),
+                    "mean": _to_native(mean[i, j]),
+                    "std": _to_native(std[i, j]),
+                    "median": _to_native(median[i, j]),
+                }
+                for i, key in enumerate(keys)
+            ]
             test_result = None
-            arrays = [group[variable].dropna().astype(float).values for _, group in grouped]
-            arrays = [arr for arr in arrays if len(arr) > 1]
-
-            if scipy_stats and len(arrays) == 2:
-                stat, p_value = scipy_stats.ttest_ind(arrays[0], arrays[1], equal_var=False)
-                test_result = {"test": "t_test", "statistic": _safe_round(stat), "p_value": _safe_round(p_value)}
-            elif scipy_stats and len(arrays) > 2:
-                stat, p_value = scipy_stats.f_oneway(*arrays)
-                test_result = {"test": "anova", "statistic": _safe_round(stat), "p_value": _safe_round(p_value)}
+            if tests and tests["kind"][j]:
+                test_result = {
+                    "test": "t_test" if tests["kind"][j] == 2 else "anova",
+                    "statistic": _safe_round(tests["statistic"][j]),
+                    "p_value": _safe_round(tests["p_value"][j]),
+                    "p_adjusted": _safe_round(adjusted[j]),
+                }
+            comparisons[variable] = {"by_group": by_group, "test": test_result}
+
+        testing = {"method": method, "alpha": alpha, "tests": 0, "significant": 0, "significant_adjusted": 0}
+        if tests:
+            tested = ~np.isnan(tests["p_value"])
+            testing.update(
+                tests=int(tested.sum()),
+                significant=int((tests["p_value"][tested] < alpha).sum()),
+                significant_adjusted=int((adjusted[tested] < alpha).sum()),
+            )
+        return comparisons, testing
 
-            stats_payload[variable] = {"by_group": _to_native(per_group_records), "test": test_result}
-            for record in per_group_records:
-                rows.append({"variable": variable, **_to_native(record), "test": test_result})
+    @classmethod
+    def _build_comparative_result(
+        cls,
+        group_by: str,
+        group_levels: List[str],
+        comparisons: Dict[str, Any],
+        numeric_vars: List[str],
+        testing: Dict[str, Any],
+        extra_statistics: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """内存路径和分块路径共用的组间比较结果组装"""
+        rows: List[Dict[str, Any]] = []
+        for variable, payload in comparisons.items():
+            for record in payload["by_group"]:
+                rows.append({"variable": variable, **record, "test": payload["test"]})
 
         recommendations = [
             f"当前建议优先围绕 {group_by} 做组间比较。",
             "若显著性成立，可继续进入 regression 做多因素调整。",
         ]
+        if testing["tests"] > 1:
+            recommendations.append(
+                f"共检验 {testing['tests']} 个变量，经 {testing['method']} 校正后 "
+                f"{testing['significant_adjusted']} 个在 α={testing['alpha']} 水平显著（未校正 {testing['significant']} 个），"
+                "结论以校正后的 p 值为准。"
+            )
         return cls._build_result(
             "comparative",
             f"已完成按 {group_by} 的组间比较。",
-            statistics={"group_by": group_by, "group_levels": group_levels, "comparisons": stats_payload},
+            statistics={
+                "group_by": group_by,
+                "group_levels": group_levels,
+                "comparisons": comparisons,
+                "multiple_testing": testing,
+                **(extra_statistics or {}),
+            },
             tables=[{"name": "group_comparison", "title": "组间比较结果", "rows": rows}],
             charts=[
                 {
@@ -704,7 +1121,9 @@ class AnalysisService:
         )
 
     @classmethod
-    async def _correlation_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
+    def _correlation_analysis(
+        cls, df: pd.DataFrame, config: AnalysisConfig, context: Optional[AnalysisContext] = None
+    ) -> Dict[str, Any]:
         variables = [item for item in (config.variables or df.columns.tolist()) if item in df.columns]
         numeric_vars = [item for item in variables if pd.api.types.is_numeric_dtype(df[item])]
         if len(numeric_vars) < 2:
@@ -714,44 +1133,66 @@ class AnalysisService:
                 recommendations=["请至少提供两个数值型变量。"],
             )
 
-        corr_matrix = df[numeric_vars].corr()
-        strong_correlations = []
-        for left_index in range(len(numeric_vars)):
-            for right_index in range(left_index + 1, len(numeric_vars)):
-                corr = corr_matrix.iloc[left_index, right_index]
-                if abs(corr) > 0.5:
-                    strong_correlations.append(
-                        {
-                            "var1": numeric_vars[left_index],
-                            "var2": numeric_vars[right_index],
-                            "correlation": _safe_round(corr),
-                            "strength": "strong" if abs(corr) > 0.7 else "moderate",
-                        }
-                    )
-        strong_correlations.sort(key=lambda item: abs(item["correlation"] or 0), reverse=True)
+        method = config.correlation_method
+        context = context or AnalysisContext(df)
+        engine = compute_correlations(context.numeric_frame(numeric_vars), method=method, threshold=0.5)
+        pairs = engine.pairs
+        strong_correlations = [
+            {
+                "var1": numeric_vars[left],
+                "var2": numeric_vars[right],
+                "correlation": _safe_round(corr),
+                "strength": "strong" if abs(corr) > 0.7 else "moderate",
+                "n": int(n),
+                "p_value": _safe_round(p_value),
+            }
+            for left, right, corr, n, p_value in zip(
+                *(pairs.get(key, []) for key in ("left", "right", "r", "n", "p_value"))
+            )
+        ]
 
         recommendations = [
             "强相关变量进入回归前建议检查共线性。",
             "若存在明确结局变量，可把强相关变量优先纳入多因素模型。",
         ]
+        if engine.matrix is None:
+            recommendations.append(
+                f"变量数超过 {CORRELATION_MATRIX_LIMIT}，未输出完整相关矩阵，仅返回 |r| 最大的强相关变量对。"
+            )
+        if engine.approximate:
+            recommendations.append(
+                "数据含缺失值且变量数 × 行数较大，Spearman 秩按各列自身的非缺失值计算、未按成对完整观测重新排秩，"
+                "相关系数为近似值；需要精确结果时可减少变量数或调大 CORRELATION_SPEARMAN_EXACT_CELLS。"
+            )
         return cls._build_result(
             "correlation",
             "已完成变量相关结构分析。",
             statistics={
                 "variables": numeric_vars,
-                "correlation_matrix": corr_matrix.to_dict(),
+                "method": method,
+                "correlation_matrix": _matrix_dict(engine.matrix, numeric_vars),
+                "p_value_matrix": _matrix_dict(engine.p_value, numeric_vars),
+                "pairwise_n": _matrix_dict(None if engine.n is None else engine.n.astype(np.int64), numeric_vars),
                 "strong_correlations": strong_correlations,
+                "strong_pairs_total": engine.strong_pair_count,
+                "approximate": engine.approximate,
             },
             tables=[{"name": "strong_correlations", "title": "强相关变量对", "rows": strong_correlations}],
             charts=[
                 {"type": "heatmap", "title": "相关矩阵热图", "variables": numeric_vars},
             ],
             recommendations=recommendations,
-            extra_summary={"strong_pairs": len(strong_correlations)},
+            extra_summary={"method": method, "strong_pairs": engine.strong_pair_count},
         )
 
     @classmethod
-    async def _regression_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
+    def _regression_analysis(
+        cls,
+        df: pd.DataFrame,
+        config: AnalysisConfig,
+        dataset_key: Optional[str] = None,
+        context: Optional[AnalysisContext] = None,
+    ) -> Dict[str, Any]:
         target = config.target_variable
         numeric_candidates = _find_numeric_candidates(df)
         if not target:
@@ -776,37 +1217,30 @@ class AnalysisService:
                 recommendations=["请在 config.covariates 中明确指定协变量。"],
             )
 
-        frame = df[[target] + covariates].copy().dropna()
-        if len(frame) < max(20, len(covariates) * 5):
+        covariates = list(dict.fromkeys(covariates))
+        started = time.perf_counter()
+        mask = (context or AnalysisContext(df)).complete_rows([target] + covariates)
+        effective_rows = int(mask.sum())
+        if effective_rows < max(20, len(covariates) * 5):
             return cls._build_result(
                 "regression",
                 "有效样本不足，不建议直接进入回归。",
-                recommendations=[f"当前有效样本仅 {len(frame)} 行，建议先补齐数据或减少协变量数量。"],
-                extra_summary={"effective_rows": int(len(frame))},
+                recommendations=[f"当前有效样本仅 {effective_rows} 行，建议先补齐数据或减少协变量数量。"],
+                extra_summary={"effective_rows": effective_rows},
             )
 
-        y = frame[target]
-        mode = "linear"
-        target_mapping = None
-        if pd.api.types.is_bool_dtype(y):
-            y = y.astype(int)
-            mode = "logistic"
-        elif not pd.api.types.is_numeric_dtype(y):
-            unique_values = list(pd.Series(y).dropna().unique())
-            if len(unique_values) == 2:
-                target_mapping = {str(unique_values[0]): 0, str(unique_values[1]): 1}
-                y = y.map(target_mapping).astype(float)
-                mode = "logistic"
-            else:
-                return cls._build_result(
-                    "regression",
-                    "当前结局变量不是数值型，也不是二分类变量。",
-                    recommendations=["请更换 target_variable，或先把结局变量整理为连续型/二分类。"],
-                )
-
-        X = pd.get_dummies(frame[covariates], drop_first=True)
-        numeric_X = X.select_dtypes(include=[np.number, bool]).astype(float)
-        if numeric_X.empty:
+        # 设计矩阵按 (数据集版本, 结局变量, 缺失值策略, 建模行) 缓存，增删协变量只做增量更新
+        design, design_cache = prepare_design(df, mask, target, covariates, dataset_key)
+        if design is None:
+            return cls._build_result(
+                "regression",
+                "当前结局变量不是数值型，也不是二分类变量。",
+                recommendations=["请更换 target_variable，或先把结局变量整理为连续型/二分类。"],
+            )
+        mode = design.mode
+        target_mapping = design.target_mapping
+        terms, term_index = design.select(covariates)
+        if not terms:
             return cls._build_result(
                 "regression",
                 "协变量编码后为空，无法建模。",
@@ -817,26 +1251,32 @@ class AnalysisService:
         metrics: Dict[str, Any] = {"mode": mode, "target_variable": target, "covariates": covariates}
 
         try:
-            if sm is None:
-                raise RuntimeError("statsmodels 不可用")
-
-            design_matrix = sm.add_constant(numeric_X, has_constant="add")
-            response = y.astype(float)
             if mode == "logistic":
-                model = sm.Logit(response, design_matrix).fit(disp=0)
+                if sm is None:
+                    raise RuntimeError("statsmodels 不可用")
+                start_params = (
+                    regression_cache.start_params(dataset_key, target, ["const"] + terms) if dataset_key else None
+                )
+                model = sm.Logit(design.response(), design.design_matrix(terms, term_index)).fit(
+                    disp=0, start_params=start_params
+                )
+                if dataset_key:
+                    regression_cache.remember_params(dataset_key, target, model.params)
                 metrics["pseudo_r2"] = _safe_round(model.prsquared)
+                metrics["warm_start"] = start_params is not None
+                params, pvalues, conf_int = model.params, model.pvalues, model.conf_int()
             else:
-                model = sm.OLS(response, design_matrix).fit()
-                metrics["r_squared"] = _safe_round(model.rsquared)
-                metrics["adj_r_squared"] = _safe_round(model.rsquared_adj)
+                fit = design.fit_ols(terms, term_index)
+                metrics["r_squared"] = _safe_round(fit["rsquared"])
+                metrics["adj_r_squared"] = _safe_round(fit["rsquared_adj"])
+                params, pvalues, conf_int = fit["params"], fit["pvalues"], fit["conf_int"]
 
-            conf_int = model.conf_int()
-            for name, coefficient in model.params.items():
+            for name, coefficient in params.items():
                 coefficients.append(
                     {
                         "term": str(name),
                         "coefficient": _safe_round(coefficient),
-                        "p_value": _safe_round(model.pvalues.get(name)),
+                        "p_value": _safe_round(pvalues.get(name)),
                         "ci_low": _safe_round(conf_int.loc[name, 0]) if name in conf_int.index else None,
                         "ci_high": _safe_round(conf_int.loc[name, 1]) if name in conf_int.index else None,
                     }
@@ -847,6 +1287,8 @@ class AnalysisService:
                 "回归建模失败，建议先检查目标变量和协变量质量。",
                 recommendations=[f"建模错误: {exc}", "建议先运行 descriptive / correlation，清理异常值后再试。"],
             )
+        metrics["fit_seconds"] = round(time.perf_counter() - started, 4)
+        metrics["design_cache"] = design_cache
 
         coefficients_sorted = sorted(
             coefficients,
@@ -874,11 +1316,11 @@ class AnalysisService:
                 }
             ],
             recommendations=recommendations,
-            extra_summary={"effective_rows": int(len(frame)), "mode": mode},
+            extra_summary={"effective_rows": effective_rows, "mode": mode},
         )
 
     @classmethod
-    async def _custom_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
+    def _custom_analysis(cls, df: pd.DataFrame, config: AnalysisConfig) -> Dict[str, Any]:
         profile_like = {
             "rows": int(len(df)),
             "columns": int(len(df.columns)),
@@ -907,33 +1349,37 @@ class AnalysisService:
         if api_provider not in EXTERNAL_APIS:
             raise ValueError(f"不支持的API提供商: {api_provider}")
 
-        database = DatabaseService.get_database(database_id)
+        database = await run_db(DatabaseService.get_database, database_id)
         if not database:
             raise ValueError("数据库不存在")
 
         task_id = str(uuid.uuid4())
         log_id = str(uuid.uuid4())
-        api_log = APICallLog(
-            id=log_id,
-            task_id=task_id,
-            api_name=api_provider,
-            endpoint=endpoint,
-            request_data={"database_id": database_id, "parameters": parameters},
-            created_at=datetime.utcnow(),
+        now = datetime.utcnow()
+        await run_db(
+            cls._save_api_log,
+            APICallLogRecord(
+                id=log_id,
+                task_id=task_id,
+                api_name=api_provider,
+                endpoint=endpoint,
+                request_data={"database_id": database_id, "parameters": parameters},
+                created_at=now,
+            ),
         )
-        api_logs_db[log_id] = api_log
 
-        task = AnalysisTask(
-            id=task_id,
-            name=f"External API: {api_provider}",
-            description=f"调用 {api_provider} 的 {endpoint}",
-            database_id=database_id,
-            analysis_type="external_api",
-            status="running",
-            config=AnalysisConfig(),
-            created_at=datetime.utcnow(),
+        await run_db(
+            analysis_queue.register_running,
+            AnalysisTaskRecord(
+                id=task_id,
+                name=f"External API: {api_provider}",
+                description=f"调用 {api_provider} 的 {endpoint}",
+                database_id=database_id,
+                analysis_type="external_api",
+                config=_dump_model(AnalysisConfig()),
+                created_at=now,
+            ),
         )
-        analysis_tasks_db[task_id] = task
 
         asyncio.create_task(
             cls._execute_external_api_call(task_id, log_id, api_provider, endpoint, parameters, database)
@@ -959,15 +1405,10 @@ class AnalysisService:
     ):
         import time
 
-        task = analysis_tasks_db.get(task_id)
-        api_log = api_logs_db.get(log_id)
-        if not task or not api_log:
-            return
-
         start_time = time.time()
         try:
             await asyncio.sleep(2)
-            task.result = cls._build_result(
+            result = cls._build_result(
                 "external_api",
                 f"{api_provider} 已完成外部分析。",
                 statistics={
@@ -978,17 +1419,28 @@ class AnalysisService:
                 recommendations=["可把外部 API 结果与平台内部分析结果并排展示。"],
                 extra_summary={"provider": api_provider, "endpoint": endpoint},
             )
-            task.status = "completed"
-            task.completed_at = datetime.utcnow()
-            api_log.response_data = task.result
-            api_log.status_code = 200
+            await run_db(analysis_queue.complete, task_id, result)
+            response_data, status_code = result, 200
         except Exception as exc:
-            task.status = "failed"
-            task.error_message = str(exc)
-            task.completed_at = datetime.utcnow()
-            api_log.response_data = {"error": str(exc)}
-            api_log.status_code = 500
-        finally:
-            api_log.duration_ms = int((time.time() - start_time) * 1000)
-            analysis_tasks_db[task_id] = task
-            api_logs_db[log_id] = api_log
+            await run_db(analysis_queue.fail, task_id, str(exc), retryable=False)
+            response_data, status_code = {"error": str(exc)}, 500
+
+        await run_db(
+            cls._finish_api_log, log_id, response_data, status_code, int((time.time() - start_time) * 1000)
+        )
+
+    @staticmethod
+    def _save_api_log(record: APICallLogRecord) -> None:
+        with SessionLocal() as db:
+            db.add(record)
+            db.commit()
+
+    @staticmethod
+    def _finish_api_log(log_id: str, response_data: Any, status_code: int, duration_ms: int) -> None:
+        with SessionLocal() as db:
+            api_log = db.query(APICallLogRecord).filter(APICallLogRecord.id == log_id).first()
+            if api_log:
+                api_log.response_data = response_data
+                api_log.status_code = status_code
+                api_log.duration_ms = duration_ms
+                db.commit()
@@ -0,0 +1,95 @@
+"""
+上传目录列表查询
+
+数据库和研究方案的列表原来按 created_at 排序后用 OFFSET 翻页，每行都带出完整的 schema 等大字段：
+翻到越后面，SQLite 要跳过的行越多，列表页的耗时随上传数量线性增长。这里统一实现：
+1. 键集分页：按 (created_at, id) 倒序，续页令牌记住上一页最后一行，下一页用
+   (created_at, id) < (令牌) 直接在复合索引上定位，与翻到第几页无关；
+2. 名称和描述的全文检索：SQLite 上用 FTS5 trigram 索引（见 backend.database），
+   检索词不足 3 个字符或索引不可用时退回 LIKE 扫描；
+3. 多取一行判断是否还有下一页，不做 count(*)。
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Query
+
+from backend.database import catalog_search_keys_table, catalog_search_ready, catalog_search_table
+
+# 单页最多返回的条数
+MAX_PAGE_SIZE = 500
+# trigram 分词下能命中索引的最短检索词
+FTS_MIN_TERM_CHARS = 3
+
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    payload = json.dumps([created_at.isoformat(), record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析续页令牌，格式不对时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(record_id)
+    except Exception:
+        raise ValueError("无效的分页令牌")
+
+
+def _search_terms(q: str) -> List[str]:
+    return [term for term in q.split() if term]
+
+
+def apply_search(query: Query, model: Any, columns: Sequence[str], q: Optional[str]) -> Query:
+    """按检索词过滤：每个词都要在任一列中出现（与 LIKE 子串语义一致）"""
+    terms = _search_terms(q or "")
+    if not terms:
+        return query
+    table_name = model.__tablename__
+    fts_terms = [term for term in terms if len(term) >= FTS_MIN_TERM_CHARS]
+    if fts_terms and catalog_search_ready(table_name):
+        fts = catalog_search_table(table_name)
+        keys = catalog_search_keys_table(table_name)
+        # 每个词作为短语加引号，避免检索词里的 AND / * 等被当作 FTS 语法
+        match = " AND ".join('"' + term.replace('"', '""') + '"' for term in fts_terms)
+        query = query.filter(text(
+            f"{table_name}.id IN (SELECT record_id FROM {keys} WHERE rowid IN "
+            f"(SELECT rowid FROM {fts} WHERE {fts} MATCH :catalog_match))"
+        ).bindparams(catalog_match=match))
+        terms = [term for term in terms if len(term) < FTS_MIN_TERM_CHARS]
+    for term in terms:
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.filter(or_(*[
+            getattr(model, column).ilike(pattern, escape="\\") for column in columns
+        ]))
+    return query
+
+
+def fetch_page(query: Query, model: Any, limit: int, cursor: Optional[str] = None, skip: int = 0) -> Tuple[list, Optional[str]]:
+    """按 (created_at, id) 倒序取一页，返回 (记录, 下一页令牌)；没有更多时令牌为 None
+
+    给了 cursor 时从令牌位置继续；否则兼容旧的 skip 偏移。
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        # 展开成 OR 形式，SQLite 对行值比较不一定走索引范围扫描
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < record_id),
+        ))
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if not cursor and skip > 0:
+        query = query.offset(skip)
+    records = query.limit(limit + 1).all()
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    last = records[-1]
+    return records, encode_cursor(last.created_at, last.id)
@@ -0,0 +1,165 @@
+"""
+列式 SQL 引擎
+
+原来只有 SQLite 上传支持 /query，CSV、Excel、JSON 想筛选聚合只能整表加载进 pandas。
+这里用嵌入式的 DuckDB 直接在上传时生成的 Parquet 副本（没有副本时读原始 CSV / JSON）上执行 SQL：
+1. 数据集以视图 data 暴露，Excel 的每个工作表另外以工作表名暴露；
+2. 只读取查询用到的列，WHERE 条件下推到 Parquet 扫描并按行组统计信息跳过不相关的数据块，
+   聚合在引擎内完成，不把整表转成 DataFrame；
+3. 沙箱：每次查询一个内存连接，只允许读取数据集自己的文件，禁止其他文件访问和扩展加载并锁定配置，
+   只接受单条 SELECT 语句；
+4. 超过时限由定时器中断查询；分页、续页令牌和 NDJSON 流式输出与 SQLite 查询一致，
+   计数用引擎内的 count(*) 完成而不是逐行取回。
+参数占位符使用 DuckDB 的 $name 形式。
+"""
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.services.sqlite_pool import (
+    COUNT_MODES, COUNT_SCAN_ROWS, QUERY_TIMEOUT_SECONDS, SQLQueryTimeoutError
+)
+
+try:
+    import duckdb
+except Exception:  # pragma: no cover - optional dependency at runtime
+    duckdb = None
+
+DUCKDB_AVAILABLE = duckdb is not None
+# 单个查询可用的线程数和内存上限
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(min(4, os.cpu_count() or 1))))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "1GB")
+# 数据集（Excel 为第一张工作表）对应的视图名
+DEFAULT_VIEW = "data"
+
+# 各格式的扫描函数；Excel 先转成 Parquet 再查询
+_SCAN_FUNCTIONS = {
+    "parquet": "read_parquet",
+    "csv": "read_csv_auto",
+    "json": "read_json_auto",
+}
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def supports_file_type(file_type: str) -> bool:
+    return file_type in _SCAN_FUNCTIONS
+
+
+@contextmanager
+def connect(
+    sources: Dict[str, Tuple[Path, str]],
+    timeout_seconds: float = QUERY_TIMEOUT_SECONDS,
+) -> Iterator["duckdb.DuckDBPyConnection"]:
+    """打开一个只能读取 sources 的内存连接，sources 为 {视图名: (文件路径, 格式)}
+
+    连接上的语句执行超过 timeout_seconds 会被中断并抛出 SQLQueryTimeoutError，
+    其他 DuckDB 错误转成 ValueError。
+    """
+    if duckdb is None:
+        raise ValueError("未安装 duckdb，只有SQLite数据库支持SQL查询")
+    conn = duckdb.connect(":memory:", config={
+        "threads": max(1, DUCKDB_THREADS),
+        "memory_limit": DUCKDB_MEMORY_LIMIT,
+        "autoinstall_known_extensions": False,
+        "autoload_known_extensions": False,
+    })
+    timer = threading.Timer(timeout_seconds, conn.interrupt)
+    try:
+        for view, (file_path, file_type) in sources.items():
+            conn.execute(
+                f"CREATE VIEW {_quote_identifier(view)} AS "
+                f"SELECT * FROM {_SCAN_FUNCTIONS[file_type]}({_quote_literal(str(file_path))})"
+            )
+        allowed = ", ".join(_quote_literal(str(path)) for path, _ in sources.values())
+        conn.execute(f"SET allowed_paths = [{allowed}]")
+        conn.execute("SET enable_external_access = false")
+        conn.execute("SET lock_configuration = true")
+        timer.start()
+        yield conn
+    except duckdb.InterruptException as e:
+        if timer.finished.is_set():
+            raise SQLQueryTimeoutError(f"SQL执行超时（超过 {timeout_seconds:g} 秒）") from e
+        raise ValueError(f"SQL执行错误: {str(e)}") from e
+    except duckdb.Error as e:
+        raise ValueError(f"SQL执行错误: {str(e)}") from e
+    finally:
+        timer.cancel()
+        conn.close()
+
+
+def prepare(conn: "duckdb.DuckDBPyConnection", sql: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """校验只有一条 SELECT 语句，返回去掉末尾分号的语句和它实际用到的参数
+
+    与 SQLite 一致，语句里没有用到的参数直接忽略。
+    """
+    statements = conn.extract_statements(sql)
+    if len(statements) != 1:
+        raise ValueError("只能执行一条SQL语句")
+    statement = statements[0]
+    if statement.type != duckdb.StatementType.SELECT:
+        raise ValueError("只支持只读的 SELECT 查询")
+    used = set(statement.named_parameters)
+    return sql.strip().rstrip(";").rstrip(), {key: value for key, value in (params or {}).items() if key in used}
+
+
+def execute_from(
+    conn: "duckdb.DuckDBPyConnection",
+    statement: str,
+    params: Dict[str, Any],
+    offset: int,
+    limit: Optional[int] = None,
+) -> "duckdb.DuckDBPyConnection":
+    """执行语句，offset / limit 下推到引擎内；返回可 fetchmany 的连接（结果按需流式取出）"""
+    # 换行包裹，避免语句末尾的注释吞掉右括号
+    paged = f"SELECT * FROM (\n{statement}\n)"
+    if limit is not None:
+        paged += f" LIMIT {int(limit)}"
+    if offset > 0:
+        paged += f" OFFSET {int(offset)}"
+    return conn.execute(paged, params)
+
+
+def fetch_page(
+    conn: "duckdb.DuckDBPyConnection",
+    statement: str,
+    params: Dict[str, Any],
+    offset: int,
+    limit: int,
+    count_mode: str = "exact",
+    scan_rows: int = COUNT_SCAN_ROWS,
+) -> Tuple[List[str], List[Dict[str, Any]], Optional[int], bool, bool]:
+    """取一页结果并计数，语义同 sqlite_pool.fetch_page
+
+    返回 (列名, 当前页, 总行数, 总数是否精确, 是否还有下一页)。
+    """
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"不支持的计数方式: {count_mode}，可选 {', '.join(COUNT_MODES)}")
+    cursor = execute_from(conn, statement, params, offset, limit + 1)
+    columns = [description[0] for description in cursor.description or []]
+    page = cursor.fetchall()
+    has_more = len(page) > limit
+    rows = [dict(zip(columns, row)) for row in page[:limit]]
+    if not has_more:
+        # 最后一页直接得到总数；offset 超出结果范围时再数一次得到实际总数
+        if rows or offset == 0:
+            return columns, rows, offset + len(rows), True, False
+    elif count_mode == "none":
+        return columns, rows, None, False, True
+
+    if count_mode == "estimate":
+        cap = offset + limit + scan_rows
+        counted = conn.execute(f"SELECT count(*) FROM (SELECT 1 FROM (\n{statement}\n) LIMIT {cap})", params).fetchone()[0]
+        return columns, rows, counted, counted < cap, has_more
+    counted = conn.execute(f"SELECT count(*) FROM (\n{statement}\n)", params).fetchone()[0]
+    return columns, rows, counted, True, has_more
@@ -0,0 +1,82 @@
+"""
+公开生物医学数据库连接器
+
+get_connector 按目录 ID 返回连接器：已注册在线连接器的来源访问真实接口，其余来源
+（或 BIOMEDICAL_CONNECTORS=mock 时全部来源）返回模拟数据连接器。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Type
+
+from backend.services.connectors.base import (
+    MAX_RECORDS, BiomedicalConnector, ConnectorError, ConnectorHTTP, SearchPage, connector_http
+)
+from backend.services.connectors.clinicaltrials import ClinicalTrialsConnector
+from backend.services.connectors.europepmc import EuropePMCConnector
+from backend.services.connectors.fallback import FallbackConnector
+from backend.services.connectors.ncbi import ClinVarConnector, PubMedConnector
+
+# live：优先在线连接器；mock：全部使用模拟数据
+CONNECTOR_MODE = os.getenv("BIOMEDICAL_CONNECTORS", "live").lower()
+
+_registry: Dict[str, Type[BiomedicalConnector]] = {}
+_instances: Dict[str, BiomedicalConnector] = {}
+
+
+def register_connector(connector_cls: Type[BiomedicalConnector]) -> Type[BiomedicalConnector]:
+    """按 source_id 注册在线连接器，可作类装饰器使用"""
+    _registry[connector_cls.source_id] = connector_cls
+    _instances.pop(connector_cls.source_id, None)
+    return connector_cls
+
+
+for _connector_cls in (PubMedConnector, ClinVarConnector, ClinicalTrialsConnector, EuropePMCConnector):
+    register_connector(_connector_cls)
+
+
+def get_connector(source_id: str, source_name: Optional[str] = None) -> BiomedicalConnector:
+    if CONNECTOR_MODE == "live" and source_id in _registry:
+        if source_id not in _instances:
+            _instances[source_id] = _registry[source_id]()
+        return _instances[source_id]
+    return FallbackConnector(source_id, source_name)
+
+
+def get_fallback_connector(source_id: str, source_name: Optional[str] = None) -> BiomedicalConnector:
+    return FallbackConnector(source_id, source_name)
+
+
+def connector_status() -> List[Dict[str, Any]]:
+    """已注册在线连接器的配置与请求统计"""
+    return [
+        {
+            **get_connector(source_id).describe(),
+            "stats": connector_http.stats[source_id].as_dict() if source_id in connector_http.stats else None,
+        }
+        for source_id in sorted(_registry)
+    ]
+
+
+async def close_connectors() -> None:
+    await connector_http.aclose()
+
+
+__all__ = [
+    "MAX_RECORDS",
+    "BiomedicalConnector",
+    "ClinVarConnector",
+    "ClinicalTrialsConnector",
+    "ConnectorError",
+    "ConnectorHTTP",
+    "EuropePMCConnector",
+    "FallbackConnector",
+    "PubMedConnector",
+    "SearchPage",
+    "close_connectors",
+    "connector_http",
+    "connector_status",
+    "get_connector",
+    "get_fallback_connector",
+    "register_connector",
+]
@@ -0,0 +1,262 @@
+"""
+公开数据库连接器的公共部分
+
+各连接器共用：
+1. 一个 httpx.AsyncClient 连接池（keep-alive 复用连接，总连接数有上限）；
+2. 按来源的令牌桶限速，同一机构的多个库共用一个桶（如 NCBI 的 PubMed 与 ClinVar）；
+3. 响应缓存：同一 URL 和参数在 CONNECTOR_CACHE_TTL 秒内直接返回缓存结果；
+4. 计时：每次请求的耗时、缓存命中和失败次数按来源累计，/api/v2/databases/connectors 可查看。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    import httpx
+except Exception:  # pragma: no cover - optional dependency at runtime
+    httpx = None
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("CONNECTOR_HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("CONNECTOR_MAX_CONNECTIONS", "20"))
+CACHE_TTL_SECONDS = float(os.getenv("CONNECTOR_CACHE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CONNECTOR_CACHE_ENTRIES", "512"))
+# 一次查询（含快照分页）最多取回的记录数
+MAX_RECORDS = int(os.getenv("CONNECTOR_MAX_RECORDS", "10000"))
+USER_AGENT = "MedRoundTable/2.0 (+https://github.com/medroundtable)"
+
+
+class ConnectorError(RuntimeError):
+    """上游数据库请求失败（网络错误、超时、非 2xx 响应或无法解析的响应）"""
+
+
+@dataclass
+class SearchPage:
+    """一页检索结果；next_cursor 为空表示没有更多"""
+
+    records: List[Dict[str, Any]]
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class SourceStats:
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    last_ms: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else None,
+            "last_ms": round(self.last_ms, 1) if self.last_ms is not None else None,
+        }
+
+
+class RateLimiter:
+    """异步令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 锁绑定在创建它的事件循环上
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ResponseCache:
+    """带过期时间的 LRU 缓存"""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ConnectorHTTP:
+    """连接器共用的 HTTP 客户端、限速器、响应缓存和计时统计"""
+
+    def __init__(self):
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_loop = None
+        self._limiters: Dict[str, RateLimiter] = {}
+        self.cache = ResponseCache()
+        self.stats: Dict[str, SourceStats] = {}
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if httpx is None:
+            raise ConnectorError("未安装 httpx，无法访问公开数据库")
+        loop = asyncio.get_running_loop()
+        # 连接池绑定在事件循环上，换了循环（如测试里多次 asyncio.run）时重新创建
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client_loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+            )
+        return self._client
+
+    def set_rate_limit(self, key: str, rate: float, burst: int = 1) -> None:
+        if key not in self._limiters:
+            self._limiters[key] = RateLimiter(rate, burst)
+
+    async def get_json(
+        self,
+        source: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        rate_key: Optional[str] = None,
+    ) -> Any:
+        """GET 并解析 JSON；命中缓存时不发请求也不占用限速令牌"""
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        cache_key = url + "?" + json.dumps(params, sort_keys=True, default=str)
+        stats = self.stats.setdefault(source, SourceStats())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            stats.cache_hits += 1
+            return cached
+
+        limiter = self._limiters.get(rate_key or source)
+        if limiter is not None:
+            await limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = await self._get_client().get(url, params=params)
+            response.raise_for_status()
+            payload = response.json()
+        except ConnectorError:
+            stats.errors += 1
+            raise
+        except httpx.HTTPStatusError as e:
+            stats.errors += 1
+            # 不带 URL，避免把 api_key 等参数写进错误信息
+            raise ConnectorError(f"{source} 请求失败: HTTP {e.response.status_code}") from e
+        except Exception as e:
+            stats.errors += 1
+            raise ConnectorError(f"{source} 请求失败: {e}") from e
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats.requests += 1
+            stats.total_ms += elapsed_ms
+            stats.last_ms = elapsed_ms
+        self.cache.put(cache_key, payload)
+        return payload
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+connector_http = ConnectorHTTP()
+
+
+class BiomedicalConnector(ABC):
+    """一个公开数据库的检索接口：search 取一页、fetch 按 ID 取单条、paginate 逐页取到 limit 条"""
+
+    source_id: str = ""
+    # 单页最多请求的记录数（受上游接口上限约束）
+    page_size: int = 100
+    live: bool = True
+
+    def __init__(self, http: Optional[ConnectorHTTP] = None):
+        self.http = http or connector_http
+
+    @abstractmethod
+    async def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchPage:
+        """检索一页（最多 limit 条），cursor 为上一页返回的 next_cursor"""
+
+    @abstractmethod
+    async def fetch(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """按来源内的 ID 取单条记录，不存在时返回 None"""
+
+    async def paginate(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """逐页产出记录，合计不超过 limit（以及 MAX_RECORDS）条"""
+        remaining = max(0, min(limit, MAX_RECORDS))
+        cursor = None
+        while remaining > 0:
+            page = await self.search(query, filters, min(remaining, self.page_size), cursor)
+            records = page.records[:remaining]
+            if records:
+                yield records
+            remaining -= len(records)
+            if not page.next_cursor or not records:
+                return
+            cursor = page.next_cursor
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "source_id": self.source_id,
+            "connector": type(self).__name__,
+            "live": self.live,
+            "page_size": self.page_size,
+        }
+
+
+def offset_cursor(cursor: Optional[str]) -> int:
+    """偏移量形式的续页令牌（E-utilities 的 retstart）"""
+    try:
+        return max(0, int(cursor)) if cursor else 0
+    except ValueError:
+        raise ValueError("无效的分页令牌")
@@ -0,0 +1,99 @@
+"""
+ClinicalTrials.gov 连接器（API v2）
+
+/studies 按 pageToken 分页，单页最多 1000 条；/studies/{nctId} 取单个试验。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional
+
+from backend.services.connectors.base import BiomedicalConnector, ConnectorError, ConnectorHTTP, SearchPage
+
+CLINICALTRIALS_API_URL = os.getenv("CLINICALTRIALS_API_URL", "https://clinicaltrials.gov/api/v2")
+# 官方未公布硬性上限，按每秒 5 次请求自我约束
+CLINICALTRIALS_RATE = float(os.getenv("CLINICALTRIALS_RATE", "5"))
+
+
+def _study_record(study: Dict[str, Any]) -> Dict[str, Any]:
+    protocol = study.get("protocolSection", {})
+    identification = protocol.get("identificationModule", {})
+    status = protocol.get("statusModule", {})
+    design = protocol.get("designModule", {})
+    sponsor = protocol.get("sponsorCollaboratorsModule", {}).get("leadSponsor", {})
+    locations = protocol.get("contactsLocationsModule", {}).get("locations", [])
+    countries: List[str] = []
+    for location in locations:
+        country = location.get("country")
+        if country and country not in countries:
+            countries.append(country)
+    return {
+        "nct_id": identification.get("nctId"),
+        "title": identification.get("briefTitle"),
+        "phase": ", ".join(design.get("phases", [])) or None,
+        "status": status.get("overallStatus"),
+        "start_date": status.get("startDateStruct", {}).get("date"),
+        "conditions": protocol.get("conditionsModule", {}).get("conditions", []),
+        "enrollment": design.get("enrollmentInfo", {}).get("count"),
+        "sponsor": sponsor.get("name"),
+        "locations": countries,
+    }
+
+
+class ClinicalTrialsConnector(BiomedicalConnector):
+    """ClinicalTrials.gov；filters 支持 condition、intervention、location、status、phase"""
+
+    source_id = "clinicaltrials-gov"
+    page_size = 100
+
+    def __init__(self, http: Optional[ConnectorHTTP] = None, base_url: str = CLINICALTRIALS_API_URL):
+        super().__init__(http)
+        self.base_url = base_url.rstrip("/")
+        self.http.set_rate_limit(self.source_id, CLINICALTRIALS_RATE, burst=2)
+
+    def _query_params(self, query: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            "query.term": query or None,
+            "query.cond": filters.get("condition"),
+            "query.intr": filters.get("intervention"),
+            "query.locn": filters.get("location"),
+        }
+        if filters.get("status"):
+            params["filter.overallStatus"] = str(filters["status"]).upper().replace(" ", "_")
+        if filters.get("phase"):
+            # Phase III / phase3 -> PHASE3
+            phase = str(filters["phase"]).upper().replace("PHASE", "").strip()
+            phase = {"I": "1", "II": "2", "III": "3", "IV": "4"}.get(phase, phase)
+            params["filter.advanced"] = f"AREA[Phase]PHASE{phase}"
+        return params
+
+    async def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchPage:
+        payload = await self.http.get_json(self.source_id, f"{self.base_url}/studies", {
+            **self._query_params(query, filters or {}),
+            "pageSize": limit,
+            "pageToken": cursor,
+            "countTotal": "true",
+            "format": "json",
+        })
+        if not isinstance(payload, dict):
+            raise ConnectorError(f"{self.source_id} 返回了无法识别的响应")
+        return SearchPage(
+            records=[_study_record(study) for study in payload.get("studies", [])],
+            total=payload.get("totalCount"),
+            next_cursor=payload.get("nextPageToken"),
+        )
+
+    async def fetch(self, record_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = await self.http.get_json(self.source_id, f"{self.base_url}/studies/{record_id}", {"format": "json"})
+        except ConnectorError as e:
+            if "404" in str(e):
+                return None
+            raise
+        return _study_record(payload) if isinstance(payload, dict) else None
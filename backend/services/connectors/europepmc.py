@@ -0,0 +1,75 @@
+"""
+Europe PMC 连接器（REST search）
+
+search 接口用 cursorMark 分页（首页为 *），单页最多 1000 条；按 ID 取单条用 EXT_ID 检索。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from backend.services.connectors.base import BiomedicalConnector, ConnectorError, ConnectorHTTP, SearchPage
+
+EUROPEPMC_API_URL = os.getenv("EUROPEPMC_API_URL", "https://www.ebi.ac.uk/europepmc/webservices/rest")
+EUROPEPMC_RATE = float(os.getenv("EUROPEPMC_RATE", "10"))
+
+
+def _article_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    year = str(item.get("pubYear") or "")
+    return {
+        "id": item.get("id"),
+        "source": item.get("source"),
+        "pmid": item.get("pmid"),
+        "pmcid": item.get("pmcid"),
+        "doi": item.get("doi"),
+        "title": item.get("title"),
+        "authors": item.get("authorString"),
+        "journal": item.get("journalTitle"),
+        "year": int(year) if year.isdigit() else None,
+        "cited_by": item.get("citedByCount"),
+    }
+
+
+class EuropePMCConnector(BiomedicalConnector):
+    """Europe PMC 文献；检索式支持 Europe PMC 查询语法"""
+
+    source_id = "europe-pmc"
+    page_size = 100
+
+    def __init__(self, http: Optional[ConnectorHTTP] = None, base_url: str = EUROPEPMC_API_URL):
+        super().__init__(http)
+        self.base_url = base_url.rstrip("/")
+        self.http.set_rate_limit(self.source_id, EUROPEPMC_RATE, burst=5)
+
+    async def _search(self, query: str, limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+        payload = await self.http.get_json(self.source_id, f"{self.base_url}/search", {
+            "query": query,
+            "format": "json",
+            "resultType": "lite",
+            "pageSize": limit,
+            "cursorMark": cursor or "*",
+        })
+        if not isinstance(payload, dict):
+            raise ConnectorError(f"{self.source_id} 返回了无法识别的响应")
+        return payload
+
+    async def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchPage:
+        payload = await self._search(query, limit, cursor)
+        items = payload.get("resultList", {}).get("result", [])
+        next_cursor = payload.get("nextCursorMark")
+        return SearchPage(
+            records=[_article_record(item) for item in items],
+            total=payload.get("hitCount"),
+            # 最后一页之后 nextCursorMark 不再变化
+            next_cursor=next_cursor if items and next_cursor and next_cursor != (cursor or "*") else None,
+        )
+
+    async def fetch(self, record_id: str) -> Optional[Dict[str, Any]]:
+        page = await self.search(f"EXT_ID:{record_id}", limit=1)
+        return page.records[0] if page.records else None
@@ -0,0 +1,132 @@
+"""
+模拟数据连接器
+
+没有在线连接器的来源、关闭在线访问（BIOMEDICAL_CONNECTORS=mock）或在线来源请求失败时使用，
+返回与在线来源字段一致的示例记录（最多 5 条），便于离线演示和开发。
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from backend.services.connectors.base import BiomedicalConnector, SearchPage
+
+MOCK_RESULT_LIMIT = 5
+
+
+def _mock_pubmed_results(query: str, limit: int) -> List[Dict]:
+    """模拟PubMed查询结果"""
+    return [
+        {
+            "pmid": f"3800000{i}",
+            "title": f"关于{query}的最新研究进展",
+            "authors": ["Zhang S", "Li W", "Wang H"],
+            "journal": "Nature Medicine",
+            "year": 2024,
+            "doi": f"10.1000/{i}"
+        }
+        for i in range(1, min(limit + 1, 6))
+    ]
+
+
+def _mock_clinicaltrials_results(query: str, limit: int) -> List[Dict]:
+    """模拟ClinicalTrials查询结果"""
+    return [
+        {
+            "nct_id": f"NCT0560000{i}",
+            "title": f"{query}治疗的随机对照试验",
+            "phase": "Phase III",
+            "status": "Recruiting",
+            "sponsor": "National Cancer Institute",
+            "locations": ["USA", "China", "EU"]
+        }
+        for i in range(1, min(limit + 1, 6))
+    ]
+
+
+def _mock_drugbank_results(query: str, limit: int) -> List[Dict]:
+    """模拟DrugBank查询结果"""
+    return [
+        {
+            "drugbank_id": f"DB0000{i}",
+            "name": f"{query}抑制剂",
+            "type": "Small molecule",
+            "groups": ["approved", " investigational"],
+            "mechanism": f"抑制{query}信号通路"
+        }
+        for i in range(1, min(limit + 1, 6))
+    ]
+
+
+def _mock_clinvar_results(query: str, limit: int) -> List[Dict]:
+    """模拟ClinVar查询结果"""
+    return [
+        {
+            "variant_id": f"VCV0000000{i}",
+            "gene": query.upper(),
+            "chromosome": "chr1",
+            "position": 1000000 + i * 100,
+            "significance": "Pathogenic" if i % 2 == 0 else "Benign",
+            "condition": f"{query}相关疾病"
+        }
+        for i in range(1, min(limit + 1, 6))
+    ]
+
+
+def _mock_generic_results(db_id: str, db_name: str, query: str, limit: int) -> List[Dict]:
+    """通用模拟结果"""
+    return [
+        {
+            "id": f"{db_id}_{i}",
+            "name": f"{query} - 结果{i}",
+            "description": f"来自{db_name}的查询结果"
+        }
+        for i in range(1, min(limit + 1, 6))
+    ]
+
+
+# 记录 ID 所在字段，fetch 按它在模拟结果里查找
+_MOCK_SOURCES = {
+    "pubmed": (_mock_pubmed_results, "pmid"),
+    "clinicaltrials-gov": (_mock_clinicaltrials_results, "nct_id"),
+    # 旧版目录里的 ID
+    "clinicaltrials": (_mock_clinicaltrials_results, "nct_id"),
+    "drugbank": (_mock_drugbank_results, "drugbank_id"),
+    "clinvar": (_mock_clinvar_results, "variant_id"),
+}
+
+
+class FallbackConnector(BiomedicalConnector):
+    """返回模拟记录的连接器，只有一页"""
+
+    live = False
+    page_size = MOCK_RESULT_LIMIT
+
+    def __init__(self, source_id: str, source_name: Optional[str] = None):
+        super().__init__()
+        self.source_id = source_id
+        self.source_name = source_name or source_id
+
+    def _results(self, query: str, limit: int) -> List[Dict]:
+        if self.source_id in _MOCK_SOURCES:
+            return _MOCK_SOURCES[self.source_id][0](query, limit)
+        return _mock_generic_results(self.source_id, self.source_name, query, limit)
+
+    async def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchPage:
+        if cursor:
+            return SearchPage(records=[], total=0)
+        # ClinicalTrials.gov 高级检索只给 condition
+        records = self._results(query or (filters or {}).get("condition") or "", limit)
+        return SearchPage(records=records, total=len(records))
+
+    async def fetch(self, record_id: str) -> Optional[Dict[str, Any]]:
+        id_field = _MOCK_SOURCES.get(self.source_id, (None, "id"))[1]
+        return next(
+            (record for record in self._results("", MOCK_RESULT_LIMIT) if str(record.get(id_field)) == record_id),
+            None,
+        )
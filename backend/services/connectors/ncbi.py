@@ -0,0 +1,143 @@
+"""
+NCBI E-utilities 连接器：PubMed 与 ClinVar
+
+两步检索：esearch 按检索式取一页 ID（retstart 分页），esummary 批量取摘要。
+NCBI 对同一来源 IP 限速每秒 3 次请求（配置 NCBI_API_KEY 后为 10 次），两个库共用一个令牌桶。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional
+
+from backend.services.connectors.base import (
+    BiomedicalConnector, ConnectorError, ConnectorHTTP, SearchPage, offset_cursor
+)
+
+EUTILS_URL = os.getenv("NCBI_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+NCBI_EMAIL = os.getenv("NCBI_EMAIL", "medroundtable@research.com")
+NCBI_RATE_KEY = "ncbi"
+
+
+class EUtilsConnector(BiomedicalConnector):
+    """E-utilities 上一个库的 esearch + esummary 检索"""
+
+    db: str = ""
+    page_size = 200
+
+    def __init__(self, http: Optional[ConnectorHTTP] = None, base_url: str = EUTILS_URL, api_key: Optional[str] = NCBI_API_KEY):
+        super().__init__(http)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.http.set_rate_limit(NCBI_RATE_KEY, 10 if api_key else 3)
+
+    def _params(self, **params: Any) -> Dict[str, Any]:
+        return {"db": self.db, "retmode": "json", "tool": "medroundtable", "email": NCBI_EMAIL, "api_key": self.api_key, **params}
+
+    async def _get(self, endpoint: str, **params: Any) -> Dict[str, Any]:
+        payload = await self.http.get_json(
+            self.source_id, f"{self.base_url}/{endpoint}", self._params(**params), rate_key=NCBI_RATE_KEY
+        )
+        if not isinstance(payload, dict):
+            raise ConnectorError(f"{self.source_id} 返回了无法识别的响应")
+        if payload.get("error") or payload.get("esearchresult", {}).get("ERROR"):
+            raise ConnectorError(f"{self.source_id} 检索失败: {payload.get('error') or payload['esearchresult']['ERROR']}")
+        return payload
+
+    def build_term(self, query: str, filters: Dict[str, Any]) -> str:
+        return query
+
+    def parse_summary(self, uid: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def _summaries(self, ids: List[str]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        result = (await self._get("esummary.fcgi", id=",".join(ids))).get("result", {})
+        return [self.parse_summary(uid, result[uid]) for uid in result.get("uids", ids) if uid in result]
+
+    async def search(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchPage:
+        start = offset_cursor(cursor)
+        found = (await self._get(
+            "esearch.fcgi", term=self.build_term(query, filters or {}), retstart=start, retmax=limit
+        )).get("esearchresult", {})
+        ids = found.get("idlist", [])
+        total = int(found.get("count", 0))
+        records = await self._summaries(ids)
+        next_start = start + len(ids)
+        return SearchPage(
+            records=records,
+            total=total,
+            next_cursor=str(next_start) if ids and next_start < total else None,
+        )
+
+    async def fetch(self, record_id: str) -> Optional[Dict[str, Any]]:
+        records = await self._summaries([record_id])
+        return records[0] if records else None
+
+
+class PubMedConnector(EUtilsConnector):
+    """PubMed 文献；filters 支持 author、journal、year_from、year_to、article_type"""
+
+    source_id = "pubmed"
+    db = "pubmed"
+
+    def build_term(self, query: str, filters: Dict[str, Any]) -> str:
+        parts = [f"({query})"] if query else []
+        if filters.get("author"):
+            parts.append(f"{filters['author']}[au]")
+        if filters.get("journal"):
+            parts.append(f"\"{filters['journal']}\"[ta]")
+        if filters.get("year_from") or filters.get("year_to"):
+            parts.append(f"{filters.get('year_from') or 1800}:{filters.get('year_to') or 3000}[dp]")
+        if filters.get("article_type"):
+            parts.append(f"\"{filters['article_type']}\"[pt]")
+        return " AND ".join(parts)
+
+    def parse_summary(self, uid: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        doi = next(
+            (item.get("value") for item in summary.get("articleids", []) if item.get("idtype") == "doi"), None
+        )
+        pub_date = summary.get("pubdate") or ""
+        year = pub_date[:4]
+        return {
+            "pmid": uid,
+            "title": summary.get("title"),
+            "authors": [author.get("name") for author in summary.get("authors", []) if author.get("name")],
+            "journal": summary.get("fulljournalname") or summary.get("source"),
+            "year": int(year) if year.isdigit() else None,
+            "pub_date": pub_date or None,
+            "doi": doi,
+        }
+
+
+class ClinVarConnector(EUtilsConnector):
+    """ClinVar 变异；检索式直接传给 esearch（如基因名或 BRCA1[gene]）"""
+
+    source_id = "clinvar"
+    db = "clinvar"
+
+    def parse_summary(self, uid: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        # 新版 esummary 用 germline_classification，旧版为 clinical_significance
+        classification = summary.get("germline_classification") or summary.get("clinical_significance") or {}
+        variation = (summary.get("variation_set") or [{}])[0]
+        locations = variation.get("variation_loc") or []
+        location = next((loc for loc in locations if loc.get("status") == "current"), locations[0] if locations else {})
+        traits = classification.get("trait_set") or summary.get("trait_set") or []
+        start = location.get("start")
+        return {
+            "variant_id": summary.get("accession") or uid,
+            "title": summary.get("title"),
+            "gene": ",".join(gene.get("symbol") for gene in summary.get("genes", []) if gene.get("symbol")) or None,
+            "chromosome": f"chr{location['chr']}" if location.get("chr") else None,
+            "position": int(start) if str(start or "").isdigit() else None,
+            "assembly": location.get("assembly_name"),
+            "significance": classification.get("description"),
+            "condition": "; ".join(trait.get("trait_name") for trait in traits if trait.get("trait_name")) or None,
+        }
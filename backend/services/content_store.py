@@ -0,0 +1,256 @@
+"""
+内容寻址存储
+
+研究者经常在不同圆桌会里重复上传同一份 CSV 或方案文档。上传时边写盘边计算 SHA-256，
+按 (类别, 内容哈希, 文件类型) 只保存一份文件，多条上传记录引用同一份内容并做引用计数，
+最后一条记录删除时才清理文件。由内容决定的解析结果（schema、行列数、列式副本、画像）
+记在内容记录的 derived 字段里，后续相同内容的上传直接复用，不再重新解析。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from backend.database import ContentBlobRecord, SessionLocal
+from backend.services.io_pools import run_disk
+
+# 并发上传同一内容时插入冲突的重试次数
+ACQUIRE_RETRIES = 3
+
+
+@dataclass
+class StoredContent:
+    """一次上传登记后的内容信息；reused 表示内容此前已存在"""
+
+    blob_id: str
+    file_path: Path
+    file_size: int
+    reused: bool
+    derived: Dict[str, Any] = field(default_factory=dict)
+
+
+async def write_upload(
+    file_content: Union[bytes, AsyncIterator[bytes]],
+    file_path: Path,
+    max_size: int,
+) -> Tuple[int, str]:
+    """分块写入上传文件并计算 SHA-256，超过大小上限立即中止；返回 (字节数, 哈希)
+
+    file_content 可以是完整的字节串，也可以是按块产出字节的异步迭代器。
+    打开、写入和改名都在磁盘线程池里执行，不阻塞事件循环。
+    """
+    if isinstance(file_content, bytes):
+        async def single_chunk(content: bytes = file_content):
+            yield content
+        file_content = single_chunk()
+
+    digest = hashlib.sha256()
+    size = 0
+    # 先写临时文件，写完再改名，中途失败不会留下半个数据文件
+    partial_path = file_path.with_name(file_path.name + ".part")
+    try:
+        f = await run_disk(open, partial_path, 'wb')
+        try:
+            async for chunk in file_content:
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(f"文件大小超过限制 ({max_size / 1024 / 1024}MB)")
+                await run_disk(_write_chunk, f, digest, chunk)
+        finally:
+            f.close()
+        await run_disk(partial_path.replace, file_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+def hash_file(file_path: Path, chunk_bytes: int = 1 << 20) -> Tuple[int, str]:
+    """分块计算已写好的文件的 (字节数, SHA-256)，用于服务端生成的文件登记内容"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_bytes):
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+
+def _write_chunk(f, digest, chunk: bytes) -> None:
+    # 大于 2KB 的数据 hashlib 计算时会释放 GIL
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        print(f"删除文件失败: {e}")
+
+
+class ContentStore:
+    """按内容哈希去重的文件存储与引用计数"""
+
+    @staticmethod
+    def blob_id(kind: str, sha256: str, file_type: str) -> str:
+        return f"{kind}:{sha256}.{file_type}"
+
+    @classmethod
+    def acquire(
+        cls,
+        kind: str,
+        staged_path: Path,
+        content_dir: Path,
+        sha256: str,
+        file_type: str,
+        file_size: int,
+    ) -> StoredContent:
+        """登记一份已写入暂存文件的上传
+
+        相同内容已存在时引用计数加一并删除暂存文件；否则把暂存文件移入内容目录。
+        文件移动和记录写入在同一个事务里完成，与 release 的删除互斥。
+        """
+        blob_id = cls.blob_id(kind, sha256, file_type)
+        content_path = content_dir / f"{sha256}.{file_type}"
+        for _ in range(ACQUIRE_RETRIES):
+            with SessionLocal() as db:
+                record = db.query(ContentBlobRecord).filter(ContentBlobRecord.id == blob_id).first()
+                if record is not None:
+                    record.ref_count = ContentBlobRecord.ref_count + 1
+                    try:
+                        db.flush()
+                    except StaleDataError:
+                        # 读取之后最后一个引用恰好被释放，重新登记
+                        db.rollback()
+                        continue
+                    if not os.path.exists(record.file_path):
+                        # 内容文件被手工清理过，用这次上传的文件补回
+                        Path(record.file_path).parent.mkdir(parents=True, exist_ok=True)
+                        staged_path.replace(record.file_path)
+                    else:
+                        staged_path.unlink(missing_ok=True)
+                    db.commit()
+                    db.refresh(record)
+                    return StoredContent(
+                        blob_id=blob_id,
+                        file_path=Path(record.file_path),
+                        file_size=record.file_size,
+                        reused=True,
+                        derived=dict(record.derived or {}),
+                    )
+
+                db.add(ContentBlobRecord(
+                    id=blob_id,
+                    kind=kind,
+                    sha256=sha256,
+                    file_path=str(content_path),
+                    file_type=file_type,
+                    file_size=file_size,
+                    ref_count=1,
+                    derived={},
+                ))
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # 另一个请求刚登记了同一内容，重新按已存在处理
+                    db.rollback()
+                    continue
+                content_dir.mkdir(parents=True, exist_ok=True)
+                staged_path.replace(content_path)
+                db.commit()
+                return StoredContent(blob_id=blob_id, file_path=content_path, file_size=file_size, reused=False)
+        raise RuntimeError(f"登记上传内容失败: {blob_id}")
+
+    @classmethod
+    def release(cls, blob_id: str, derived_paths: Iterable[str] = ()) -> bool:
+        """引用计数减一；最后一个引用释放时删除内容文件和 derived_paths 并返回 True"""
+        with SessionLocal() as db:
+            moved = None
+            try:
+                moved = cls.release_in(db, blob_id, derived_paths)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                cls.restore(moved or [])
+                raise
+        if moved is None:
+            return False
+        cls.purge(moved)
+        return True
+
+    @classmethod
+    def release_in(
+        cls, db: Session, blob_id: str, derived_paths: Iterable[str] = ()
+    ) -> Optional[List[Tuple[str, str]]]:
+        """在调用方的事务里把引用计数减一，不提交
+
+        最后一个引用释放时删除内容记录，并把内容文件和 derived_paths 改名为待删除文件
+        （同一内容的新上传不会写到将被删除的路径上），返回 [(原路径, 待删除路径)]：
+        调用方提交后用 purge 删除这些文件，回滚后用 restore 改回原名。还有其他引用时返回 None。
+        """
+        db.query(ContentBlobRecord).filter(ContentBlobRecord.id == blob_id).update(
+            {ContentBlobRecord.ref_count: ContentBlobRecord.ref_count - 1},
+            synchronize_session=False,
+        )
+        record = db.query(ContentBlobRecord).filter(ContentBlobRecord.id == blob_id).first()
+        if record is None or record.ref_count > 0:
+            return None
+        moved: List[Tuple[str, str]] = []
+        try:
+            for path in dict.fromkeys([record.file_path, *derived_paths]):
+                if path and os.path.exists(path):
+                    tombstone = f"{path}.deleting-{uuid.uuid4().hex}"
+                    os.replace(path, tombstone)
+                    moved.append((path, tombstone))
+            db.delete(record)
+            db.flush()
+        except BaseException:
+            cls.restore(moved)
+            raise
+        return moved
+
+    @staticmethod
+    def purge(moved: Iterable[Tuple[str, str]]) -> None:
+        for _, tombstone in moved:
+            _remove_file(tombstone)
+
+    @staticmethod
+    def restore(moved: Iterable[Tuple[str, str]]) -> None:
+        for path, tombstone in moved:
+            try:
+                if tombstone and os.path.exists(tombstone):
+                    os.replace(tombstone, path)
+            except Exception as e:
+                print(f"恢复文件失败: {e}")
+
+    @classmethod
+    def get_derived(cls, blob_id: str) -> Dict[str, Any]:
+        with SessionLocal() as db:
+            record = db.query(ContentBlobRecord).filter(ContentBlobRecord.id == blob_id).first()
+            return dict(record.derived or {}) if record else {}
+
+    @classmethod
+    def update_derived(cls, blob_id: str, updates: Dict[str, Any]) -> None:
+        """合并写入解析结果；新旧值都是字典时合并一层（如按参数区分的多份画像）"""
+        with SessionLocal() as db:
+            record = db.query(ContentBlobRecord).filter(ContentBlobRecord.id == blob_id).first()
+            if record is None:
+                return
+            derived = dict(record.derived or {})
+            for key, value in updates.items():
+                if isinstance(value, dict) and isinstance(derived.get(key), dict):
+                    value = {**derived[key], **value}
+                derived[key] = value
+            # JSON 列需要整体赋值才会被标记为已修改
+            record.derived = derived
+            db.commit()
@@ -0,0 +1,336 @@
+"""
+相关性计算引擎
+
+相关分析原来先用 DataFrame.corr() 算出整张矩阵，再用 Python 双重循环逐对 iloc 取值筛选强相关。
+这里改为按列分块的矩阵运算：
+- Pearson 用 BLAS 矩阵乘一次算出一个 (块 × 块) 的相关系数；有缺失值时按成对完整观测
+  （pairwise-complete，与 DataFrame.corr 一致）由掩码矩阵乘法得到每对的 N 与离差和；
+- Spearman 先对每列求平均秩，再在秩上做 Pearson；有缺失值时，成对完整观测与某列自身非缺失值
+  不一致的变量对按成对完整观测重新排秩（与 DataFrame.corr(method="spearman") 一致）：每列只排序一次，
+  子集上的秩由排序位置上的掩码累加得到，左块每列向量化处理一整行变量对；
+  工作量（变量对数 × 行数）超过 SPEARMAN_EXACT_CELLS 时退回按列排秩的近似，结果标记 approximate；
+- p 值由 t = r·sqrt((N-2)/(1-r²)) 向量化计算；
+- 强相关变量对在每个块内用阈值掩码筛选，argpartition 只保留绝对值最大的若干对。
+内存只与 行数 × 块宽 和 块宽² 有关，变量数上千（组学宽表）时不需要构造完整的 V × V 矩阵。
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats as scipy_stats
+except Exception:  # pragma: no cover - optional dependency at runtime
+    scipy_stats = None
+
+CORRELATION_METHODS = ("pearson", "spearman")
+# 每个列块的最大宽度，以及单个列块数据（行数 × 块宽 × 8 字节）的预算
+CORRELATION_BLOCK_SIZE = int(os.getenv("CORRELATION_BLOCK_SIZE", "512"))
+CORRELATION_BLOCK_BYTES = int(os.getenv("CORRELATION_BLOCK_MB", "64")) * 1024 * 1024
+# 变量数不超过该值时输出完整的相关矩阵 / p 值矩阵 / 成对 N 矩阵
+CORRELATION_MATRIX_LIMIT = int(os.getenv("CORRELATION_MATRIX_LIMIT", "200"))
+# 最多返回多少个强相关变量对（按 |r| 从大到小）
+STRONG_PAIR_LIMIT = int(os.getenv("CORRELATION_STRONG_PAIR_LIMIT", "1000"))
+# 有缺失值时 Spearman 按成对完整观测重新排秩的工作量上限（变量对数 × 行数），超过后用按列排秩的近似
+SPEARMAN_EXACT_CELLS = int(os.getenv("CORRELATION_SPEARMAN_EXACT_CELLS", "40000000"))
+
+
+@dataclass
+class CorrelationResult:
+    """相关性计算结果；matrix / n / p_value 仅在变量数不超过矩阵上限时保留"""
+
+    variables: List[str]
+    method: str
+    matrix: Optional[np.ndarray] = None
+    n: Optional[np.ndarray] = None
+    p_value: Optional[np.ndarray] = None
+    # 强相关变量对：左右变量下标、r、成对 N、p 值，按 |r| 降序
+    pairs: Dict[str, np.ndarray] = field(default_factory=dict)
+    strong_pair_count: int = 0
+    # Spearman 有缺失值且超过 SPEARMAN_EXACT_CELLS 时为 True：秩按各列自身的非缺失值计算，未按成对完整观测重排
+    approximate: bool = False
+
+
+class _Prepared:
+    """列优先存放的预处理数据，按列块切片时是连续视图"""
+
+    def __init__(self, values: np.ndarray):
+        mask = ~np.isnan(values)
+        self.rows = values.shape[0]
+        self.complete = bool(mask.all())
+        counts = mask.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nansum(values, axis=0) / counts
+        # 先按列均值中心化，成对离差和不会因原始量级大而损失精度
+        centered = np.where(mask, values - means, 0.0)
+        if self.complete:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                norms = np.sqrt((centered * centered).sum(axis=0))
+                centered = centered / norms
+        self.values = np.asfortranarray(centered)
+        self.mask = None if self.complete else np.asfortranarray(mask.astype(np.float64))
+
+    def block(self, columns: slice) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        values = self.values[:, columns]
+        if self.complete:
+            return values, None, None
+        return values, self.mask[:, columns], values * values
+
+
+def _rank_columns(frame: pd.DataFrame) -> np.ndarray:
+    # 平均秩处理并列值，缺失值保持 NaN
+    return frame.rank(method="average").to_numpy(dtype=np.float64)
+
+
+class _RankIndex:
+    """按成对完整观测重新排秩用的排序索引（每列只排序一次）
+
+    某列在另一列的非缺失行上的平均秩 = 排序后落在该子集里、比它小的值个数 + (子集里与它并列的值个数 + 1) / 2，
+    按排序位置对子集掩码做累加，再在并列组首尾位置取累加值即可，不需要对每个变量对重新排序。
+    数组按 (列, 行) 存放，每列的排序位置连续，按行取值时不会跨列跳读。
+    """
+
+    def __init__(self, raw: np.ndarray):
+        columns = np.ascontiguousarray(raw.T)
+        rows = columns.shape[1]
+        self.present = ~np.isnan(columns)
+        self.counts = self.present.sum(axis=1)
+        # argsort 把 NaN 排在最后，每列前 counts[j] 个位置是该列的非缺失值
+        self.order = np.argsort(columns, axis=1, kind="stable")
+        ordered = np.take_along_axis(columns, self.order, axis=1)
+        positions = np.broadcast_to(np.arange(rows), columns.shape)
+        first = np.ones(columns.shape, dtype=bool)
+        first[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+        last = np.ones(columns.shape, dtype=bool)
+        last[:, :-1] = first[:, 1:]
+        # 每个排序位置所在并列组的首位置和尾位置之后一位；NaN 彼此不相等，各自成组
+        self.tie_start = np.maximum.accumulate(np.where(first, positions, 0), axis=1)
+        self.tie_stop = np.minimum.accumulate(np.where(last, positions, rows)[:, ::-1], axis=1)[:, ::-1] + 1
+
+    def subset_ranks(self, columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """columns 中每列只在 rows（布尔行掩码）上的平均秩，按各列自身的排序位置排列，不在子集里的位置为 0"""
+        order = self.order[columns]
+        keep = rows[order] & (np.arange(order.shape[1]) < self.counts[columns][:, None])
+        return self._ranks(keep, self.tie_start[columns], self.tie_stop[columns])
+
+    def column_ranks(self, column: int, columns: np.ndarray) -> np.ndarray:
+        """第 column 列分别在 columns 中每列的非缺失行上的平均秩，按 columns 各列自身的排序位置排列，不在子集里的位置为 0"""
+        count = self.counts[column]
+        order = self.order[column, :count]
+        keep = self.present[columns][:, order]
+        ranks = self._ranks(keep, self.tie_start[column, :count], self.tie_stop[column, :count])
+        # 行号 → 该行在 column 排序中的位置；column 缺失的行指向末尾补的 0
+        position = np.full(self.present.shape[1], count)
+        position[order] = np.arange(count)
+        padded = np.zeros((len(columns), count + 1))
+        padded[:, :count] = ranks
+        return np.take_along_axis(padded, position[self.order[columns]], axis=1)
+
+    @staticmethod
+    def _ranks(keep: np.ndarray, tie_start: np.ndarray, tie_stop: np.ndarray) -> np.ndarray:
+        cumulative = np.zeros((keep.shape[0], keep.shape[1] + 1))
+        np.cumsum(keep, axis=1, out=cumulative[:, 1:])
+        if tie_start.ndim == 1:
+            below = cumulative[:, tie_start]
+            tied = cumulative[:, tie_stop] - below
+        else:
+            below = np.take_along_axis(cumulative, tie_start, axis=1)
+            tied = np.take_along_axis(cumulative, tie_stop, axis=1) - below
+        return (below + (tied + 1) / 2) * keep
+
+
+def _rerank_pairs(
+    index: _RankIndex,
+    left_columns: slice,
+    right_columns: slice,
+    r: np.ndarray,
+    n: np.ndarray,
+) -> None:
+    """修正一个块里需要按成对完整观测重新排秩的 Spearman 系数（原地修改 r）
+
+    某对的成对 N 与两列各自的非缺失数都相等时，成对完整观测就是各列自身的非缺失值，
+    按列排秩的结果已经精确；否则该对重新排秩计算。左块每列一次向量化处理它在右块里的全部待修正变量对：
+    两边的秩之和都是 N(N+1)/2，相关系数只需要秩的乘积和与平方和。
+    """
+    counts = index.counts
+    stale = ((n != counts[left_columns][:, None]) | (n != counts[right_columns][None, :])) & (n >= 2)
+    if left_columns == right_columns:
+        stale &= np.triu(np.ones(stale.shape, dtype=bool), k=1)
+    for i in np.nonzero(stale.any(axis=1))[0]:
+        targets = np.nonzero(stale[i])[0]
+        column = left_columns.start + i
+        columns = right_columns.start + targets
+        other = index.subset_ranks(columns, index.present[column])
+        own = index.column_ranks(column, columns)
+        pair_n = n[i, targets]
+        offset = pair_n * ((pair_n + 1) / 2) ** 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = (np.einsum("ij,ij->i", own, other) - offset) / np.sqrt(
+                (np.einsum("ij,ij->i", own, own) - offset) * (np.einsum("ij,ij->i", other, other) - offset)
+            )
+        r[i, targets] = np.clip(value, -1.0, 1.0)
+        if left_columns == right_columns:
+            r[targets, i] = r[i, targets]
+
+
+def _pair_block(
+    prepared: _Prepared,
+    left: Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]],
+    right: Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """计算一个 (左块 × 右块) 的相关系数和成对 N"""
+    x, x_mask, x_sq = left
+    y, y_mask, y_sq = right
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if prepared.complete:
+            r = x.T @ y
+            n = np.full(r.shape, float(prepared.rows))
+        else:
+            n = x_mask.T @ y_mask
+            sum_x = x.T @ y_mask
+            sum_y = x_mask.T @ y
+            cov = x.T @ y - sum_x * sum_y / n
+            var_x = x_sq.T @ y_mask - sum_x * sum_x / n
+            var_y = x_mask.T @ y_sq - sum_y * sum_y / n
+            r = cov / np.sqrt(var_x * var_y)
+            r[n < 2] = np.nan
+    return np.clip(r, -1.0, 1.0), n
+
+
+def correlation_pvalues(r: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """相关系数的双侧 p 值（t 分布，自由度 N-2）；N < 3 时为 NaN"""
+    p_value = np.full(np.shape(r), np.nan)
+    if scipy_stats is None:
+        return p_value
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dof = n - 2
+        t = r * np.sqrt(dof / np.maximum(1.0 - r * r, 0.0))
+        valid = (dof > 0) & ~np.isnan(r)
+        p_value[valid] = 2 * scipy_stats.t.sf(np.abs(t[valid]), dof[valid])
+    return p_value
+
+
+def _column_blocks(rows: int, columns: int, block_size: Optional[int]) -> List[slice]:
+    width = block_size or max(16, min(CORRELATION_BLOCK_SIZE, CORRELATION_BLOCK_BYTES // max(rows * 8, 1)))
+    return [slice(start, min(start + width, columns)) for start in range(0, columns, width)]
+
+
+def spearman_rerank_exact(rows: int, columns: int, complete: bool = False) -> bool:
+    """有缺失值时 Spearman 是否按成对完整观测精确重排：工作量（变量对数 × 行数）不超过预算时才重排"""
+    return complete or columns * (columns - 1) // 2 * rows <= SPEARMAN_EXACT_CELLS
+
+
+def iter_correlation_blocks(
+    values: np.ndarray, method: str = "pearson", block_size: Optional[int] = None
+) -> Iterator[Tuple[slice, slice, np.ndarray, np.ndarray]]:
+    """按列块遍历上三角（含对角块），逐块产出 (左列范围, 右列范围, r, N)"""
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"不支持的相关系数方法: {method}，可选 {', '.join(CORRELATION_METHODS)}")
+    raw = np.asarray(values, dtype=np.float64)
+    if method == "spearman":
+        values = _rank_columns(pd.DataFrame(raw))
+    prepared = _Prepared(np.asarray(values, dtype=np.float64))
+    rerank = (
+        method == "spearman"
+        and not prepared.complete
+        and spearman_rerank_exact(prepared.rows, prepared.values.shape[1])
+    )
+    index = _RankIndex(raw) if rerank else None
+    blocks = _column_blocks(prepared.rows, prepared.values.shape[1], block_size)
+    for i, left_columns in enumerate(blocks):
+        left = prepared.block(left_columns)
+        for right_columns in blocks[i:]:
+            right = left if right_columns == left_columns else prepared.block(right_columns)
+            r, n = _pair_block(prepared, left, right)
+            if rerank:
+                _rerank_pairs(index, left_columns, right_columns, r, n)
+            yield left_columns, right_columns, r, n
+
+
+def _top_pairs(
+    left_idx: List[np.ndarray],
+    right_idx: List[np.ndarray],
+    pair_r: List[np.ndarray],
+    pair_n: List[np.ndarray],
+    limit: int,
+) -> Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray], List[np.ndarray]]:
+    """合并候选变量对并用部分排序只保留 |r| 最大的 limit 个"""
+    left, right = np.concatenate(left_idx), np.concatenate(right_idx)
+    r, n = np.concatenate(pair_r), np.concatenate(pair_n)
+    if r.size > limit:
+        keep = np.argpartition(-np.abs(r), limit - 1)[:limit]
+        left, right, r, n = left[keep], right[keep], r[keep], n[keep]
+    return [left], [right], [r], [n]
+
+
+def compute_correlations(
+    frame: pd.DataFrame,
+    method: str = "pearson",
+    threshold: float = 0.5,
+    max_pairs: int = STRONG_PAIR_LIMIT,
+    matrix_limit: int = CORRELATION_MATRIX_LIMIT,
+    block_size: Optional[int] = None,
+) -> CorrelationResult:
+    """计算数值列两两之间的相关系数、p 值和成对 N，并筛出 |r| > threshold 的变量对"""
+    variables = [str(column) for column in frame.columns]
+    width = len(variables)
+    keep_matrix = width <= matrix_limit
+    result = CorrelationResult(variables=variables, method=method)
+    values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+    if method == "spearman":
+        result.approximate = not spearman_rerank_exact(
+            values.shape[0], width, complete=not np.isnan(values).any()
+        )
+    if keep_matrix:
+        result.matrix = np.full((width, width), np.nan)
+        result.n = np.zeros((width, width))
+
+    left_idx: List[np.ndarray] = []
+    right_idx: List[np.ndarray] = []
+    pair_r: List[np.ndarray] = []
+    pair_n: List[np.ndarray] = []
+    kept = 0
+    for left_columns, right_columns, r, n in iter_correlation_blocks(values, method, block_size):
+        if keep_matrix:
+            result.matrix[left_columns, right_columns] = r
+            result.matrix[right_columns, left_columns] = r.T
+            result.n[left_columns, right_columns] = n
+            result.n[right_columns, left_columns] = n.T
+
+        strong = np.abs(r) > threshold
+        if left_columns == right_columns:
+            # 对角块只取严格上三角
+            strong &= np.triu(np.ones(strong.shape, dtype=bool), k=1)
+        rows, cols = np.nonzero(strong)
+        if rows.size == 0:
+            continue
+        result.strong_pair_count += int(rows.size)
+        left_idx.append(rows + left_columns.start)
+        right_idx.append(cols + right_columns.start)
+        pair_r.append(r[rows, cols])
+        pair_n.append(n[rows, cols])
+        kept += int(rows.size)
+        if kept > 2 * max_pairs:
+            left_idx, right_idx, pair_r, pair_n = _top_pairs(left_idx, right_idx, pair_r, pair_n, max_pairs)
+            kept = pair_r[0].size
+
+    if keep_matrix:
+        result.p_value = correlation_pvalues(result.matrix, result.n)
+        np.fill_diagonal(result.p_value, 0.0)
+
+    if pair_r:
+        left_idx, right_idx, pair_r, pair_n = _top_pairs(left_idx, right_idx, pair_r, pair_n, max_pairs)
+        r = pair_r[0]
+        order = np.lexsort((right_idx[0], left_idx[0], -np.abs(r)))
+        result.pairs = {
+            "left": left_idx[0][order],
+            "right": right_idx[0][order],
+            "r": r[order],
+            "n": pair_n[0][order],
+            "p_value": correlation_pvalues(r[order], pair_n[0][order]),
+        }
+    return result
@@ -3,27 +3,74 @@
 处理数据库文件的上传、存储、解析和分析
 """
 import os
+import time
 import uuid
 import json
 import sqlite3
+import hashlib
+from contextlib import ExitStack, closing
 import pandas as pd
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, AsyncIterable, AsyncIterator, Iterable, Iterator, Tuple, Union
 from pathlib import Path
 import io
 
+from sqlalchemy.orm import load_only
+
 from backend.database import DatabaseRecord, SessionLocal
+from backend.services import catalog_query, columnar_sql
+from backend.services.content_store import ContentStore, hash_file, write_upload
+from backend.services.dataframe_cache import dataframe_cache
+from backend.services.io_pools import run_db, run_disk
+from backend.services.json_stream import iter_json_frames, scan_json
+from backend.services.parquet_parts import ChunkedParquetWriter
+from backend.services.snapshot_writer import SnapshotWriter
+from backend.services.sqlite_pool import (
+    MAX_PAGE_ROWS, STREAM_BATCH_ROWS, STREAM_MAX_ROWS, STREAM_TIMEOUT_SECONDS,
+    decode_cursor, encode_cursor, fetch_page, json_default, ndjson_line, paginate_sql, query_digest, sqlite_pools
+)
 from backend.upload_models import (
-    ResearchDatabase, DatabaseCreate, DatabaseUpdate, DatabaseResponse,
-    DatabaseSchema, DatabaseColumn, DatabasePreview, SQLQuery, SQLQueryResult
+    ResearchDatabase, DatabaseCreate, DatabaseUpdate, DatabaseResponse, DatabaseSummary,
+    DatabaseSchema, DatabaseColumn, DatabaseTable, DatabasePreview, SQLQuery, SQLQueryResult
 )
 
 # 上传目录配置
 UPLOAD_DIR = Path("/tmp/medroundtable/uploads")
 DATABASES_DIR = UPLOAD_DIR / "databases"
+# 按内容哈希去重保存的数据文件
+CONTENT_DIR = DATABASES_DIR / "content"
+COLUMNAR_DIR = UPLOAD_DIR / "columnar"
+# 流式读取时每块的行数
+DEFAULT_CHUNK_ROWS = int(os.getenv("DATASET_CHUNK_ROWS", "100000"))
+# 上传时推断 schema 读取的样本行数
+SCHEMA_SAMPLE_ROWS = 1000
+# 不超过该大小的 SQLite 文件逐表 COUNT(*) 精确计数，更大的文件用索引统计或 rowid 估计
+SQLITE_EXACT_COUNT_MAX_BYTES = int(os.getenv("SQLITE_EXACT_COUNT_MAX_MB", "32")) * 1024 * 1024
+# 上传时预先生成并随内容缓存的预览行数，不超过该行数的预览请求不再读取数据文件
+PREVIEW_CACHE_ROWS = int(os.getenv("DATABASE_PREVIEW_ROWS", "100"))
 
 # 确保目录存在
 DATABASES_DIR.mkdir(parents=True, exist_ok=True)
+COLUMNAR_DIR.mkdir(parents=True, exist_ok=True)
+
+try:
+    import pyarrow  # noqa: F401 - pandas 的 Parquet 引擎
+    PARQUET_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency at runtime
+    PARQUET_AVAILABLE = False
+
+try:
+    import openpyxl
+except Exception:  # pragma: no cover - optional dependency at runtime
+    openpyxl = None
+
+try:
+    import xlrd
+except Exception:  # pragma: no cover - optional dependency at runtime
+    xlrd = None
+
+# 解析代价高的格式上传时不转列式，等第一次分析加载时再生成 Parquet 副本
+LAZY_COLUMNAR_TYPES = {'xlsx', 'xls'}
 
 def _dump_schema(schema: Optional[DatabaseSchema]) -> Optional[Dict[str, Any]]:
     if not schema:
@@ -33,6 +80,39 @@ def _dump_schema(schema: Optional[DatabaseSchema]) -> Optional[Dict[str, Any]]:
     return schema.dict()
 
 
+def _columnar_path_for(file_path: Path, table: Optional[str] = None) -> Path:
+    """数据文件（或其中非默认的一张表）对应的 Parquet 副本路径；同一内容的记录共用同一份副本"""
+    if table is None:
+        return COLUMNAR_DIR / f"{file_path.name}.parquet"
+    digest = hashlib.sha1(table.encode("utf-8")).hexdigest()[:16]
+    return COLUMNAR_DIR / f"{file_path.name}.t{digest}.parquet"
+
+
+def _preview_payload(df: pd.DataFrame) -> Dict[str, Any]:
+    """预览行转成可直接 JSON 序列化的 {"columns", "rows"}：缺失值为 None，时间等类型转字符串"""
+    frame = df.astype(object).where(df.notna(), None)
+    frame.columns = [str(col) for col in frame.columns]
+    rows = frame.to_dict('records')
+    return {
+        "columns": list(frame.columns),
+        "rows": json.loads(json.dumps(rows, ensure_ascii=False, default=json_default)),
+    }
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def default_table(schema: Optional[DatabaseSchema]) -> Optional[str]:
+    """多表文件默认读取的表：第一张数据表（SQLite 跳过视图），没有表目录时返回 None"""
+    if not schema or not schema.tables:
+        return None
+    for table in schema.tables:
+        if table.kind != "view":
+            return table.name
+    return schema.tables[0].name
+
+
 def _database_from_record(record: DatabaseRecord) -> ResearchDatabase:
     schema = DatabaseSchema(**record.schema_payload) if record.schema_payload else None
     return ResearchDatabase(
@@ -59,6 +139,19 @@ class DatabaseService:
     
     ALLOWED_EXTENSIONS = {'.csv', '.xlsx', '.xls', '.json', '.sqlite', '.db'}
     MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+    UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+    # 列表只读取的列，schema_payload 等大字段留给详情接口
+    SUMMARY_COLUMNS = (
+        DatabaseRecord.id, DatabaseRecord.name, DatabaseRecord.description, DatabaseRecord.file_type,
+        DatabaseRecord.file_size, DatabaseRecord.row_count, DatabaseRecord.column_count,
+        DatabaseRecord.uploaded_by, DatabaseRecord.roundtable_id, DatabaseRecord.protocol_id,
+        DatabaseRecord.created_at, DatabaseRecord.updated_at, DatabaseRecord.extra_metadata,
+    )
+    # 列表项保留的元数据键（前端据此显示来源标签和是否可分析）
+    SUMMARY_METADATA_KEYS = (
+        "original_filename", "parsed", "analysis_ready", "source_kind",
+        "source_database_id", "source_database_name",
+    )
     
     @staticmethod
     def get_file_extension(filename: str) -> str:
@@ -74,7 +167,7 @@ class DatabaseService:
     @classmethod
     async def upload_database(
         cls,
-        file_content: bytes,
+        file_content: Union[bytes, AsyncIterator[bytes]],
         filename: str,
         name: str,
         description: Optional[str] = None,
@@ -82,70 +175,240 @@ class DatabaseService:
         roundtable_id: Optional[str] = None,
         protocol_id: Optional[str] = None
     ) -> ResearchDatabase:
-        """上传数据库文件"""
+        """上传数据库文件
+
+        file_content 可以是完整的字节串，也可以是按块产出字节的异步迭代器；
+        后者边接收边写盘，内存占用只与块大小有关。
+        相同内容（SHA-256 与文件类型都相同）只保存一份，schema、行列数和列式副本直接复用。
+        写盘、解析和元数据读写分别在磁盘 / 数据库线程池里执行。
+        """
         
         # 验证文件类型
         if not cls.is_allowed_file(filename):
             raise ValueError(f"不支持的文件类型。允许的类型: {cls.ALLOWED_EXTENSIONS}")
         
         # 验证文件大小
-        if len(file_content) > cls.MAX_FILE_SIZE:
+        if isinstance(file_content, bytes) and len(file_content) > cls.MAX_FILE_SIZE:
             raise ValueError(f"文件大小超过限制 ({cls.MAX_FILE_SIZE / 1024 / 1024}MB)")
         
         # 生成唯一ID
         database_id = str(uuid.uuid4())
         
-        # 生成存储路径
         file_ext = cls.get_file_extension(filename)
-        storage_filename = f"{database_id}{file_ext}"
-        file_path = DATABASES_DIR / storage_filename
-        
-        # 保存文件
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        # 解析数据schema
+        file_type = file_ext[1:]
+
+        # 先写到以记录 ID 命名的暂存文件，同时计算内容哈希
+        staged_path = DATABASES_DIR / f"{database_id}{file_ext}"
+        file_size, content_hash = await write_upload(file_content, staged_path, cls.MAX_FILE_SIZE)
+
+        # 相同内容只存一份，多条记录按引用计数共享
+        content = await run_db(
+            ContentStore.acquire, "database", staged_path, CONTENT_DIR, content_hash, file_type, file_size
+        )
+        file_path = content.file_path
+        try:
+            if "schema" in content.derived:
+                derived = content.derived
+                schema = DatabaseSchema(**derived["schema"]) if derived["schema"] else None
+                row_count = derived.get("row_count")
+                column_count = derived.get("column_count")
+                columnar_path = derived.get("columnar_path")
+            else:
+                schema, row_count, column_count, columnar_path = await cls._parse_content(
+                    file_path, file_ext, convert=not content.reused
+                )
+                # 只由首次登记该内容的上传写入解析结果，并发的重复上传不覆盖
+                if not content.reused:
+                    derived = {
+                        "schema": _dump_schema(schema),
+                        "row_count": row_count,
+                        "column_count": column_count,
+                        "columnar_path": columnar_path,
+                    }
+                    # 默认表的预览随内容缓存，预览接口不再读取数据文件
+                    try:
+                        derived["previews"] = {"": await run_disk(
+                            cls._read_preview, file_path, file_type, default_table(schema), PREVIEW_CACHE_ROWS
+                        )}
+                    except Exception as e:
+                        print(f"生成预览失败: {e}")
+                    await run_db(ContentStore.update_derived, content.blob_id, derived)
+
+            now = datetime.utcnow()
+            record = DatabaseRecord(
+                id=database_id,
+                name=name,
+                description=description,
+                file_path=str(file_path),
+                file_type=file_type,
+                file_size=file_size,
+                schema_payload=_dump_schema(schema),
+                row_count=row_count,
+                column_count=column_count,
+                uploaded_by=uploaded_by,
+                roundtable_id=roundtable_id,
+                protocol_id=protocol_id,
+                created_at=now,
+                updated_at=now,
+                extra_metadata={
+                    "original_filename": filename,
+                    "upload_timestamp": now.isoformat(),
+                    "sha256": content_hash,
+                    "content_blob": content.blob_id,
+                    "deduplicated": content.reused,
+                    "parsed": schema is not None,
+                    "columnar_path": columnar_path
+                }
+            )
+
+            return await run_db(cls._insert_record, record)
+        except BaseException:
+            # 失败（包括请求被取消）时同步归还引用，不依赖之后还能 await
+            ContentStore.release(content.blob_id, cls._derived_paths(file_path, None))
+            raise
+
+    @staticmethod
+    def _insert_record(record: DatabaseRecord) -> ResearchDatabase:
+        with SessionLocal() as db:
+            db.add(record)
+            db.commit()
+            db.refresh(record)
+            return _database_from_record(record)
+
+    @classmethod
+    async def save_public_dataset_snapshot(
+        cls,
+        source_database_id: str,
+        source_database_name: str,
+        source_url: Optional[str],
+        query: str,
+        pages: AsyncIterable[List[Dict[str, Any]]],
+        filters: Optional[Dict[str, Any]] = None,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        uploaded_by: Optional[str] = None,
+        roundtable_id: Optional[str] = None,
+        protocol_id: Optional[str] = None,
+        source_connector: Optional[str] = None
+    ) -> ResearchDatabase:
+        """把公开数据库的查询结果保存为服务器数据集
+
+        pages 按页产出记录，每页到达即写入 Parquet 分片，不在内存里拼出完整结果。
+        写出的 Parquet 按内容登记（相同结果只存一份），同时作为列式副本，分析直接读取；
+        schema 只读文件元数据，默认预览随内容缓存。来源、取数用的连接器、查询条件和抓取时间记在 metadata 里。
+        查询没有返回记录时抛出 ValueError。
+        """
+        database_id = str(uuid.uuid4())
+        staged_path = DATABASES_DIR / f"{database_id}.parquet"
+        retrieved_at = datetime.utcnow()
+        writer = await run_disk(SnapshotWriter, staged_path)
+        try:
+            async for page in pages:
+                await run_disk(writer.append_page, page)
+            written = await run_disk(writer.finish)
+        except BaseException:
+            writer.abort()
+            raise
+        if not written:
+            raise ValueError("查询没有返回记录，未保存快照")
+
+        file_size, content_hash = await run_disk(hash_file, staged_path)
+        content = await run_db(
+            ContentStore.acquire, "database", staged_path, CONTENT_DIR, content_hash, "parquet", file_size
+        )
+        file_path = content.file_path
+        try:
+            if "schema" in content.derived:
+                derived = content.derived
+                schema = DatabaseSchema(**derived["schema"])
+                row_count = derived.get("row_count")
+                column_count = derived.get("column_count")
+            else:
+                schema, row_count, column_count = await run_disk(cls._parse_parquet_schema, file_path)
+                if not content.reused:
+                    derived = {
+                        "schema": _dump_schema(schema),
+                        "row_count": row_count,
+                        "column_count": column_count,
+                        "columnar_path": str(file_path),
+                    }
+                    try:
+                        derived["previews"] = {"": await run_disk(
+                            cls._read_preview, file_path, "parquet", None, PREVIEW_CACHE_ROWS
+                        )}
+                    except Exception as e:
+                        print(f"生成预览失败: {e}")
+                    await run_db(ContentStore.update_derived, content.blob_id, derived)
+
+            now = datetime.utcnow()
+            record = DatabaseRecord(
+                id=database_id,
+                name=name or f"{source_database_name} · {query}",
+                description=description or f"{source_database_name} 查询「{query}」的结果快照",
+                file_path=str(file_path),
+                file_type="parquet",
+                file_size=file_size,
+                schema_payload=_dump_schema(schema),
+                row_count=row_count,
+                column_count=column_count,
+                uploaded_by=uploaded_by,
+                roundtable_id=roundtable_id,
+                protocol_id=protocol_id,
+                created_at=now,
+                updated_at=now,
+                extra_metadata={
+                    "original_filename": f"{source_database_id}-snapshot.parquet",
+                    "upload_timestamp": now.isoformat(),
+                    "sha256": content_hash,
+                    "content_blob": content.blob_id,
+                    "deduplicated": content.reused,
+                    "parsed": True,
+                    "analysis_ready": bool(row_count),
+                    # 快照文件本身就是列式副本
+                    "columnar_path": str(file_path),
+                    "source_kind": "public-dataset-snapshot",
+                    "source_database_id": source_database_id,
+                    "source_database_name": source_database_name,
+                    "source_url": source_url,
+                    "source_connector": source_connector,
+                    "source_query": query,
+                    "source_filters": filters or {},
+                    "retrieved_at": retrieved_at.isoformat(),
+                    "completed_at": now.isoformat(),
+                    "page_count": writer.page_count,
+                }
+            )
+            return await run_db(cls._insert_record, record)
+        except BaseException:
+            ContentStore.release(content.blob_id, cls._derived_paths(file_path, None))
+            raise
+
+    @classmethod
+    async def _parse_content(
+        cls,
+        file_path: Path,
+        file_ext: str,
+        convert: bool = True
+    ) -> Tuple[Optional[DatabaseSchema], Optional[int], Optional[int], Optional[str]]:
+        """解析 schema 并（按需）生成列式副本，都在磁盘线程池里执行"""
         schema = None
         row_count = None
         column_count = None
         
         try:
-            schema, row_count, column_count = await cls._parse_schema(file_path, file_ext)
+            schema, row_count, column_count = await run_disk(cls._parse_schema, file_path, file_ext)
         except Exception as e:
             print(f"解析schema失败: {e}")
-        
-        now = datetime.utcnow()
-        record = DatabaseRecord(
-            id=database_id,
-            name=name,
-            description=description,
-            file_path=str(file_path),
-            file_type=file_ext[1:],
-            file_size=len(file_content),
-            schema_payload=_dump_schema(schema),
-            row_count=row_count,
-            column_count=column_count,
-            uploaded_by=uploaded_by,
-            roundtable_id=roundtable_id,
-            protocol_id=protocol_id,
-            created_at=now,
-            updated_at=now,
-            extra_metadata={
-                "original_filename": filename,
-                "upload_timestamp": now.isoformat(),
-                "parsed": schema is not None
-            }
-        )
 
-        with SessionLocal() as db:
-            db.add(record)
-            db.commit()
-            db.refresh(record)
+        # 上传时一次性转成列式存储，后续分析不再重复解析原始文件；Excel 推迟到首次加载
+        columnar_path = None
+        if convert and file_ext[1:] not in LAZY_COLUMNAR_TYPES:
+            columns = [column.name for column in schema.columns] if schema else None
+            columnar_path = await run_disk(cls._convert_to_columnar, file_path, file_ext[1:], columns)
+        return schema, row_count, column_count, columnar_path
 
-        return _database_from_record(record)
-    
     @classmethod
-    async def _parse_schema(
+    def _parse_schema(
         cls,
         file_path: Path,
         file_ext: str
@@ -153,20 +416,22 @@ class DatabaseService:
         """解析数据库schema"""
         
         if file_ext == '.csv':
-            return await cls._parse_csv_schema(file_path)
+            return cls._parse_csv_schema(file_path)
         elif file_ext in ['.xlsx', '.xls']:
-            return await cls._parse_excel_schema(file_path)
+            return cls._parse_excel_schema(file_path)
         elif file_ext == '.json':
-            return await cls._parse_json_schema(file_path)
+            return cls._parse_json_schema(file_path)
         elif file_ext in ['.sqlite', '.db']:
-            return await cls._parse_sqlite_schema(file_path)
+            return cls._parse_sqlite_schema(file_path)
+        elif file_ext == '.parquet':
+            return cls._parse_parquet_schema(file_path)
         else:
             return None, None, None
     
     @classmethod
-    async def _parse_csv_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
-        """解析CSV文件schema"""
-        df = pd.read_csv(file_path, nrows=1000)
+    def _parse_csv_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
+        """解析CSV文件schema：类型取前 SCHEMA_SAMPLE_ROWS 行推断，行数按 CSV 语法分块计数"""
+        df = pd.read_csv(file_path, nrows=SCHEMA_SAMPLE_ROWS)
         
         columns = []
         for col in df.columns:
@@ -178,15 +443,25 @@ class DatabaseService:
                 description=None
             ))
         
-        # 获取总行数
-        row_count = sum(1 for _ in open(file_path)) - 1  # 减去表头
-        
-        return DatabaseSchema(columns=columns), row_count, len(columns)
+        return DatabaseSchema(columns=columns), cls._count_csv_rows(file_path), len(columns)
+
+    @staticmethod
+    def _count_csv_rows(file_path: Path) -> int:
+        """按 CSV 语法分块计数数据行（引号内的换行不会被算作新行），只转换第一列以节省内存"""
+        if len(pd.read_csv(file_path, nrows=0).columns) == 0:
+            return 0
+        return sum(
+            len(chunk) for chunk in pd.read_csv(file_path, usecols=[0], chunksize=DEFAULT_CHUNK_ROWS)
+        )
     
     @classmethod
-    async def _parse_excel_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
-        """解析Excel文件schema"""
-        df = pd.read_excel(file_path, nrows=1000)
+    def _parse_excel_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
+        """解析Excel文件schema
+
+        列类型取第一张工作表前 SCHEMA_SAMPLE_ROWS 行推断；各工作表的行列数只读工作簿元数据，
+        不做整表解析。
+        """
+        df = pd.read_excel(file_path, nrows=SCHEMA_SAMPLE_ROWS)
         
         columns = []
         for col in df.columns:
@@ -198,78 +473,406 @@ class DatabaseService:
                 description=None
             ))
         
-        # 获取总行数（近似）
-        full_df = pd.read_excel(file_path)
-        row_count = len(full_df)
-        
-        return DatabaseSchema(columns=columns), row_count, len(columns)
-    
-    @classmethod
-    async def _parse_json_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
-        """解析JSON文件schema"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        if isinstance(data, list) and len(data) > 0:
-            # JSON数组格式
-            first_item = data[0]
-            columns = [
-                DatabaseColumn(name=k, type=type(v).__name__, nullable=False)
-                for k, v in first_item.items()
-            ]
-            return DatabaseSchema(columns=columns), len(data), len(columns)
-        elif isinstance(data, dict):
-            # JSON对象格式
-            columns = [
-                DatabaseColumn(name=k, type=type(v).__name__, nullable=False)
-                for k, v in data.items()
-            ]
-            return DatabaseSchema(columns=columns), 1, len(columns)
+        tables = cls._excel_sheet_dimensions(file_path)
+        if tables:
+            tables[0].columns = columns
+            row_count = tables[0].row_count
         else:
-            return DatabaseSchema(columns=[]), 0, 0
+            # 读不到元数据时退回整表解析计数
+            row_count = len(pd.read_excel(file_path))
+
+        return DatabaseSchema(columns=columns, tables=tables or None), row_count, len(columns)
+
+    @staticmethod
+    def _excel_sheet_dimensions(file_path: Path) -> List[DatabaseTable]:
+        """列出所有工作表及其行列数（行数不含表头）
+
+        xlsx 读各工作表 XML 中记录的 dimension（openpyxl 只读模式，不加载单元格），
+        缺少 dimension 时才流式扫描该表；xls 用 xlrd 按需加载。依赖缺失时返回空列表。
+        """
+        tables = []
+        if file_path.suffix.lower() == '.xlsx' and openpyxl is not None:
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                for sheet in workbook.worksheets:
+                    if sheet.max_row is None or sheet.max_column is None:
+                        sheet.calculate_dimension(force=True)
+                    rows, cols = sheet.max_row or 0, sheet.max_column or 0
+                    tables.append(
+                        DatabaseTable(name=sheet.title, kind="sheet", row_count=max(rows - 1, 0), column_count=cols)
+                    )
+            finally:
+                workbook.close()
+        elif file_path.suffix.lower() == '.xls' and xlrd is not None:
+            workbook = xlrd.open_workbook(str(file_path), on_demand=True)
+            try:
+                for index in range(workbook.nsheets):
+                    sheet = workbook.sheet_by_index(index)
+                    tables.append(
+                        DatabaseTable(
+                            name=sheet.name, kind="sheet", row_count=max(sheet.nrows - 1, 0), column_count=sheet.ncols
+                        )
+                    )
+                    workbook.unload_sheet(index)
+            finally:
+                workbook.release_resources()
+        return tables
     
     @classmethod
-    async def _parse_sqlite_schema(
-        cls,
-        file_path: Path
-    ) -> Tuple[DatabaseSchema, int, int]:
-        """解析SQLite文件schema"""
-        conn = sqlite3.connect(str(file_path))
-        cursor = conn.cursor()
-        
-        # 获取表名
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-        
-        if not tables:
-            conn.close()
-            return DatabaseSchema(columns=[]), 0, 0
-        
-        # 使用第一个表
-        table_name = tables[0][0]
-        
-        # 获取表结构
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        
+    def _parse_json_schema(cls, file_path: Path) -> Tuple[DatabaseSchema, int, int]:
+        """解析JSON文件schema：流式扫描一遍，列取所有记录展开后的并集，类型取前 SCHEMA_SAMPLE_ROWS 条推断"""
+        scan = scan_json(file_path, SCHEMA_SAMPLE_ROWS)
+        sample = pd.DataFrame.from_records(scan.sample, columns=scan.columns)
         columns = [
             DatabaseColumn(
-                name=col[1],
-                type=col[2],
-                nullable=not col[3],
+                name=col,
+                type=str(sample[col].dtype),
+                nullable=bool(sample[col].isnull().any()),
                 description=None
             )
-            for col in columns_info
+            for col in scan.columns
         ]
-        
-        # 获取行数
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        row_count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return DatabaseSchema(columns=columns), row_count, len(columns)
+        return DatabaseSchema(columns=columns), scan.row_count, len(columns)
     
+    @staticmethod
+    def _parse_parquet_schema(file_path: Path) -> Tuple[DatabaseSchema, int, int]:
+        """解析Parquet文件schema：只读文件尾的元数据，列类型取 pandas 读取后的类型，可空取各行组的空值统计"""
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        metadata = parquet_file.metadata
+        dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+        columns = []
+        for index, name in enumerate(parquet_file.schema_arrow.names):
+            statistics = [
+                metadata.row_group(group).column(index).statistics
+                for group in range(metadata.num_row_groups)
+            ]
+            # 缺少统计信息时按可空处理
+            nullable = any(stats is None or not stats.has_null_count or stats.null_count > 0 for stats in statistics)
+            columns.append(DatabaseColumn(name=name, type=str(dtypes[name]), nullable=nullable, description=None))
+        return DatabaseSchema(columns=columns), metadata.num_rows, len(columns)
+
+    @classmethod
+    def _parse_sqlite_schema(
+        cls,
+        file_path: Path
+    ) -> Tuple[DatabaseSchema, int, int]:
+        """解析SQLite文件schema：一次读出全部表、视图和索引，作为表目录保存在 schema.tables
+
+        schema.columns / primary_key / indexes 对应默认表（第一张数据表）。
+        """
+        exact_counts = os.path.getsize(file_path) <= SQLITE_EXACT_COUNT_MAX_BYTES
+        with sqlite_pools.get(file_path).connection() as conn:
+            tables = cls._sqlite_catalog(conn, exact_counts)
+
+        if not tables:
+            return DatabaseSchema(columns=[], tables=[]), 0, 0
+
+        default = next((table for table in tables if table.kind == "table"), tables[0])
+        schema = DatabaseSchema(
+            columns=default.columns,
+            primary_key=default.primary_key,
+            indexes=default.indexes,
+            tables=tables
+        )
+        return schema, default.row_count or 0, len(default.columns)
+
+    @staticmethod
+    def _sqlite_catalog(conn: sqlite3.Connection, exact_counts: bool) -> List[DatabaseTable]:
+        """读取 SQLite 表目录
+
+        行数：文件较小时逐表 COUNT(*)；否则优先用 ANALYZE 留下的 sqlite_stat1 统计，
+        其次用 MAX(rowid) 估计（rowid 表在 B 树上取最大值，不扫全表），视图不计数。
+        """
+        entries = conn.execute(
+            "SELECT type, name FROM sqlite_master "
+            "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchall()
+        stat_counts: Dict[str, int] = {}
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone():
+            for table_name, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                try:
+                    stat_counts.setdefault(table_name, int(str(stat).split()[0]))
+                except (ValueError, IndexError):
+                    continue
+
+        tables = []
+        for kind, name in entries:
+            columns_info = conn.execute("SELECT name, type, \"notnull\", pk FROM pragma_table_info(?)", (name,)).fetchall()
+            columns = [
+                DatabaseColumn(name=col[0], type=col[1] or "", nullable=not col[2], description=None)
+                for col in columns_info
+            ]
+            primary_key = [col[0] for col in sorted(columns_info, key=lambda col: col[3]) if col[3]] or None
+            indexes = None
+            row_count = None
+            exact = True
+            if kind == "table":
+                indexes = [
+                    {
+                        "name": index_name,
+                        "unique": bool(unique),
+                        "origin": origin,
+                        "columns": [
+                            row[0] for row in conn.execute("SELECT name FROM pragma_index_info(?)", (index_name,))
+                        ],
+                    }
+                    for _, index_name, unique, origin, _ in conn.execute(
+                        "SELECT seq, name, \"unique\", origin, partial FROM pragma_index_list(?)", (name,)
+                    )
+                ]
+                quoted = _quote_identifier(name)
+                if exact_counts:
+                    row_count = conn.execute(f"SELECT COUNT(*) FROM {quoted}").fetchone()[0]
+                elif name in stat_counts:
+                    row_count, exact = stat_counts[name], False
+                else:
+                    try:
+                        row_count, exact = conn.execute(f"SELECT MAX(rowid) FROM {quoted}").fetchone()[0] or 0, False
+                    except sqlite3.OperationalError:
+                        # WITHOUT ROWID 表没有 rowid，只能计数
+                        row_count = conn.execute(f"SELECT COUNT(*) FROM {quoted}").fetchone()[0]
+            tables.append(DatabaseTable(
+                name=name,
+                kind=kind,
+                row_count=row_count,
+                row_count_exact=exact,
+                column_count=len(columns),
+                columns=columns,
+                primary_key=primary_key,
+                indexes=indexes
+            ))
+        return tables
+
+    @staticmethod
+    def _first_sqlite_table(conn: sqlite3.Connection) -> str:
+        # 没有表目录的旧记录才需要查 sqlite_master
+        row = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchone()
+        if row is None:
+            raise ValueError("SQLite 数据库中没有数据表")
+        return row[0]
+
+    @classmethod
+    def dataset_table(cls, database: ResearchDatabase, table: Optional[str] = None) -> Optional[str]:
+        """校验要读取的表（SQLite 表/视图、Excel 工作表）
+
+        默认表（或未指定）返回 None，走上传时生成的列式副本；其他表返回表名。
+        单表格式指定 table、或表目录里没有该表时抛出 ValueError。
+        """
+        if not table:
+            return None
+        if database.file_type not in ['sqlite', 'db', 'xlsx', 'xls']:
+            raise ValueError(f"{database.file_type} 文件只有一张表，不能指定 table")
+        catalog = database.schema.tables if database.schema else None
+        if catalog is not None and table not in {item.name for item in catalog}:
+            raise ValueError(f"表不存在: {table}")
+        return None if table == default_table(database.schema) else table
+
+    @staticmethod
+    def read_source_dataframe(file_path: Path, file_type: str, table: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """按原始格式完整解析数据文件；table 指定 SQLite 表/视图或 Excel 工作表，为空时读第一张"""
+        if file_type == 'csv':
+            return pd.read_csv(file_path)
+        if file_type == 'parquet':
+            return pd.read_parquet(file_path)
+        if file_type in ['xlsx', 'xls']:
+            return pd.read_excel(file_path, sheet_name=table if table is not None else 0)
+        if file_type == 'json':
+            # 按块解析并展开嵌套对象，不整体 json.load
+            frames = list(iter_json_frames(file_path, DEFAULT_CHUNK_ROWS))
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if file_type in ['sqlite', 'db']:
+            conn = sqlite3.connect(str(file_path))
+            try:
+                table_name = table if table is not None else DatabaseService._first_sqlite_table(conn)
+                return pd.read_sql_query(f"SELECT * FROM {_quote_identifier(table_name)}", conn)
+            finally:
+                conn.close()
+        return None
+
+    @classmethod
+    def _convert_to_columnar(
+        cls,
+        file_path: Path,
+        file_type: str,
+        columns: Optional[List[str]] = None
+    ) -> Optional[str]:
+        """把上传文件转成 Parquet，失败时返回 None 并继续使用原始文件
+
+        CSV 和 JSON 按块转换；columns 为 JSON 各块对齐的列（解析 schema 时已收集，为空时重新扫描）。
+        """
+        if not PARQUET_AVAILABLE:
+            return None
+        columnar_path = _columnar_path_for(file_path)
+        # 先写临时文件再改名，同一内容的其他记录不会读到半个文件
+        partial_path = columnar_path.with_name(columnar_path.name + ".part")
+        try:
+            if file_type == 'csv':
+                chunks = pd.read_csv(file_path, chunksize=DEFAULT_CHUNK_ROWS)
+            elif file_type == 'json':
+                columns = columns if columns is not None else scan_json(file_path, 0).columns
+                chunks = iter_json_frames(file_path, DEFAULT_CHUNK_ROWS, columns)
+            else:
+                chunks = None
+            if not (chunks is not None and cls._convert_chunked(chunks, partial_path)):
+                df = cls.read_source_dataframe(file_path, file_type)
+                if df is None:
+                    return None
+                # Parquet 要求列名为字符串
+                df.columns = [str(col) for col in df.columns]
+                df.to_parquet(partial_path, index=False)
+            partial_path.replace(columnar_path)
+            return str(columnar_path)
+        except Exception as e:
+            partial_path.unlink(missing_ok=True)
+            print(f"列式转换失败: {e}")
+            return None
+
+    @staticmethod
+    def _convert_chunked(chunks: Iterable[pd.DataFrame], columnar_path: Path) -> bool:
+        """按块转 Parquet（CSV 的 read_csv 分块、JSON 的记录分块），内存只与块大小有关
+
+        分片写入后合并 schema，结果与整表解析后写 Parquet 一致，见 ChunkedParquetWriter。
+        某列在不同块里分别是数值和文本等无法合并的情况返回 False，由调用方退回整表转换。
+        """
+        import pyarrow as pa
+
+        writer = ChunkedParquetWriter(columnar_path)
+        try:
+            for chunk in chunks:
+                writer.append(chunk)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            writer.abort()
+            return False
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    @classmethod
+    def resolve_dataset_file(cls, database: ResearchDatabase, table: Optional[str] = None) -> Tuple[Path, str]:
+        """返回加载数据集应读取的文件及其格式（有 Parquet 副本时优先）
+
+        table 为 dataset_table 返回的非默认表；它有自己的 Parquet 副本（首次加载时生成），
+        读原始文件时仍需把 table 传给 load_dataset_file / iter_dataset_chunks。
+        """
+        if table is not None:
+            table_path = _columnar_path_for(Path(database.file_path), table)
+            if table_path.exists():
+                return table_path, "parquet"
+            return Path(database.file_path), database.file_type
+        columnar_path = (database.metadata or {}).get("columnar_path")
+        if columnar_path and os.path.exists(columnar_path):
+            return Path(columnar_path), "parquet"
+        # 延迟转换的格式在首次加载后、或由同一内容的其他记录生成固定路径的 Parquet 副本
+        derived_path = _columnar_path_for(Path(database.file_path))
+        if derived_path.exists():
+            return derived_path, "parquet"
+        return Path(database.file_path), database.file_type
+
+    @classmethod
+    def load_dataset_file(
+        cls,
+        file_path: Path,
+        file_type: str,
+        table: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """按文件路径加载数据集并走进程内缓存，可在分析子进程中直接调用
+
+        table 为 dataset_table 返回的非默认表，为空时读默认表；
+        缓存按文件路径（和表名）区分：共享同一内容文件的记录共用缓存，文件删除后缓存项随之释放。
+        不同的表分别缓存，非默认表和 Excel 首次整表解析后补写 Parquet 副本。
+        """
+        mtime_ns = os.stat(file_path).st_mtime_ns
+        df = dataframe_cache.get(file_path, mtime_ns, table)
+        if df is not None:
+            return df
+
+        if file_type == "parquet":
+            df = pd.read_parquet(file_path)
+        else:
+            df = cls.read_source_dataframe(file_path, file_type, table)
+            if df is not None and (file_type in LAZY_COLUMNAR_TYPES or table is not None):
+                cls._save_lazy_columnar(file_path, df, table)
+        if df is not None:
+            dataframe_cache.put(file_path, mtime_ns, df, table)
+        return df
+
+    @staticmethod
+    def _save_lazy_columnar(file_path: Path, df: pd.DataFrame, table: Optional[str] = None) -> None:
+        """首次整表解析后补写 Parquet 副本，之后 resolve_dataset_file 直接读副本"""
+        if not PARQUET_AVAILABLE:
+            return
+        columnar_path = _columnar_path_for(file_path, table)
+        # 先写临时文件再改名，多个分析进程同时补写也不会读到半个文件
+        partial_path = columnar_path.with_name(f"{columnar_path.name}.{os.getpid()}.part")
+        try:
+            frame = df.copy(deep=False)
+            frame.columns = [str(col) for col in frame.columns]
+            frame.to_parquet(partial_path, index=False)
+            partial_path.replace(columnar_path)
+        except Exception as e:
+            partial_path.unlink(missing_ok=True)
+            print(f"列式转换失败: {e}")
+
+    @staticmethod
+    def estimate_dataset_bytes(file_path: Path, file_type: str) -> int:
+        """估算数据集解压/解析后的大小：Parquet 取元数据里的未压缩字节数，其余格式取文件大小"""
+        if file_type == "parquet":
+            import pyarrow.parquet as pq
+
+            metadata = pq.ParquetFile(file_path).metadata
+            return sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+        return os.path.getsize(file_path)
+
+    @classmethod
+    def iter_dataset_chunks(
+        cls,
+        file_path: Path,
+        file_type: str,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        table: Optional[str] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """按块流式读取数据集，内存占用与分块大小相关而不是与文件大小相关
+
+        Parquet 按 record batch、CSV 按行块、JSON 按记录块、SQLite 按游标分批读取；
+        Excel 没有流式解析，只能整表解析后再切块。table 含义同 read_source_dataframe。
+        """
+        if file_type == "parquet":
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(file_path)
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+            return
+        if file_type == "csv":
+            with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+                yield from reader
+            return
+        if file_type == 'json':
+            # 先扫描一遍收集全部列，各块按相同的列输出
+            yield from iter_json_frames(file_path, chunk_rows, scan_json(file_path, 0).columns)
+            return
+        if file_type in ['sqlite', 'db']:
+            conn = sqlite3.connect(str(file_path))
+            try:
+                table_name = table if table is not None else cls._first_sqlite_table(conn)
+                yield from pd.read_sql_query(
+                    f"SELECT * FROM {_quote_identifier(table_name)}", conn, chunksize=chunk_rows
+                )
+            finally:
+                conn.close()
+            return
+
+        df = cls.read_source_dataframe(file_path, file_type, table)
+        if df is None:
+            return
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
     @classmethod
     def get_database(cls, database_id: str) -> Optional[ResearchDatabase]:
         """获取数据库信息"""
@@ -283,80 +886,139 @@ class DatabaseService:
         roundtable_id: Optional[str] = None,
         protocol_id: Optional[str] = None,
         skip: int = 0,
-        limit: int = 100
-    ) -> List[ResearchDatabase]:
-        """获取数据库列表"""
+        limit: int = 100,
+        uploaded_by: Optional[str] = None,
+        q: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[DatabaseSummary], Optional[str]]:
+        """获取数据库列表，返回 (摘要列表, 下一页令牌)
+
+        按创建时间倒序键集分页，只读取摘要列；q 在名称和描述中检索。
+        令牌无效时抛出 ValueError。
+        """
         with SessionLocal() as db:
-            query = db.query(DatabaseRecord)
+            query = db.query(DatabaseRecord).options(load_only(*cls.SUMMARY_COLUMNS))
             if roundtable_id:
                 query = query.filter(DatabaseRecord.roundtable_id == roundtable_id)
             if protocol_id:
                 query = query.filter(DatabaseRecord.protocol_id == protocol_id)
+            if uploaded_by:
+                query = query.filter(DatabaseRecord.uploaded_by == uploaded_by)
+            if created_after:
+                query = query.filter(DatabaseRecord.created_at >= created_after)
+            if created_before:
+                query = query.filter(DatabaseRecord.created_at < created_before)
+            query = catalog_query.apply_search(query, DatabaseRecord, ("name", "description"), q)
+            records, next_cursor = catalog_query.fetch_page(query, DatabaseRecord, limit, cursor=cursor, skip=skip)
+            return [cls._summary_from_record(record) for record in records], next_cursor
 
-            records = (
-                query.order_by(DatabaseRecord.created_at.desc())
-                .offset(skip)
-                .limit(limit)
-                .all()
-            )
-            return [_database_from_record(record) for record in records]
+    @classmethod
+    def _summary_from_record(cls, record: DatabaseRecord) -> DatabaseSummary:
+        metadata = record.extra_metadata or {}
+        return DatabaseSummary(
+            id=record.id,
+            name=record.name,
+            description=record.description,
+            file_type=record.file_type,
+            file_size=record.file_size,
+            row_count=record.row_count,
+            column_count=record.column_count,
+            uploaded_by=record.uploaded_by,
+            roundtable_id=record.roundtable_id,
+            protocol_id=record.protocol_id,
+            created_at=record.created_at,
+            updated_at=record.updated_at,
+            metadata={key: metadata[key] for key in cls.SUMMARY_METADATA_KEYS if key in metadata},
+        )
     
     @classmethod
     async def get_preview(
         cls,
         database_id: str,
-        limit: int = 100
+        limit: int = 100,
+        table: Optional[str] = None
     ) -> Optional[DatabasePreview]:
-        """获取数据预览"""
-        database = cls.get_database(database_id)
+        """获取数据预览；table 指定 SQLite 表/视图或 Excel 工作表，表不存在时抛出 ValueError
+
+        前 PREVIEW_CACHE_ROWS 行按内容缓存（默认表在上传时生成，其他表首次预览时生成），
+        命中缓存时不读取数据文件，耗时与文件大小无关。
+        """
+        database = await run_db(cls.get_database, database_id)
         if not database:
             return None
         
-        file_path = Path(database.file_path)
-        file_type = database.file_type
-        
-        try:
-            if file_type == 'csv':
-                df = pd.read_csv(file_path, nrows=limit)
-            elif file_type in ['xlsx', 'xls']:
-                df = pd.read_excel(file_path, nrows=limit)
-            elif file_type == 'json':
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                if isinstance(data, list):
-                    df = pd.DataFrame(data[:limit])
-                else:
-                    df = pd.DataFrame([data])
-            elif file_type in ['sqlite', 'db']:
-                conn = sqlite3.connect(str(file_path))
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                table_name = cursor.fetchone()[0]
-                df = pd.read_sql_query(f"SELECT * FROM {table_name} LIMIT {limit}", conn)
-                conn.close()
-            else:
+        table = cls.dataset_table(database, table)
+        table_name = table or default_table(database.schema)
+        total_rows = database.row_count or 0
+        for item in (database.schema.tables if database.schema else None) or []:
+            if item.name == table_name:
+                total_rows = item.row_count or 0
+
+        # 缓存键为表名，默认表为空串
+        preview_key = table or ""
+        content_blob = (database.metadata or {}).get("content_blob")
+        cacheable = content_blob is not None and limit <= PREVIEW_CACHE_ROWS
+        preview = None
+        if cacheable:
+            preview = (await run_db(ContentStore.get_derived, content_blob)).get("previews", {}).get(preview_key)
+        if preview is None:
+            try:
+                preview = await run_disk(
+                    cls._read_preview,
+                    Path(database.file_path),
+                    database.file_type,
+                    table_name,
+                    max(limit, PREVIEW_CACHE_ROWS),
+                )
+            except Exception as e:
+                print(f"获取预览失败: {e}")
                 return None
-            
-            # 转换DataFrame为字典列表
-            rows = df.head(limit).to_dict('records')
-            columns = df.columns.tolist()
-            
-            # 处理NaN值
-            for row in rows:
-                for key, value in row.items():
-                    if pd.isna(value):
-                        row[key] = None
-            
-            return DatabasePreview(
-                columns=columns,
-                rows=rows,
-                total_rows=database.row_count or 0,
-                preview_rows=min(limit, len(rows))
-            )
-            
-        except Exception as e:
-            print(f"获取预览失败: {e}")
+            if preview is None:
+                return None
+            if cacheable:
+                await run_db(ContentStore.update_derived, content_blob, {"previews": {preview_key: preview}})
+
+        rows = preview["rows"][:max(limit, 0)]
+        return DatabasePreview(
+            columns=preview["columns"],
+            rows=rows,
+            total_rows=total_rows,
+            preview_rows=len(rows)
+        )
+
+    @classmethod
+    def _read_preview(
+        cls,
+        file_path: Path,
+        file_type: str,
+        table_name: Optional[str],
+        limit: int
+    ) -> Optional[Dict[str, Any]]:
+        """只读取数据文件的前 limit 行；JSON 流式解析顶层数组，不整体加载"""
+        if file_type == 'csv':
+            df = pd.read_csv(file_path, nrows=limit)
+        elif file_type in ['xlsx', 'xls']:
+            df = pd.read_excel(file_path, nrows=limit, sheet_name=table_name if table_name is not None else 0)
+        elif file_type == 'json':
+            df = next(iter_json_frames(file_path, max(limit, 1)), pd.DataFrame())
+        elif file_type == 'parquet':
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(file_path)
+            batch = next(parquet_file.iter_batches(batch_size=max(limit, 1)), None)
+            df = batch.to_pandas() if batch is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+        elif file_type in ['sqlite', 'db']:
+            with sqlite_pools.get(file_path).connection() as conn:
+                if table_name is None:
+                    table_name = cls._first_sqlite_table(conn)
+                df = pd.read_sql_query(
+                    f"SELECT * FROM {_quote_identifier(table_name)} LIMIT ?", conn, params=(limit,)
+                )
+        else:
             return None
+        return _preview_payload(df.head(limit))
     
     @classmethod
     async def execute_sql(
@@ -364,67 +1026,259 @@ class DatabaseService:
         database_id: str,
         query: SQLQuery
     ) -> Optional[SQLQueryResult]:
-        """执行SQL查询"""
-        database = cls.get_database(database_id)
+        """执行SQL查询
+
+        SQLite 在只读连接池上执行，查询本身和计数在同一遍扫描内完成；
+        CSV / Excel / JSON 由列式 SQL 引擎在 Parquet 副本上执行，数据集以视图 data 暴露。
+        每页最多 MAX_PAGE_ROWS 行，还有后续行时返回 next_cursor，续页复用第一页算出的总数。
+        查询是阻塞的，放到磁盘线程池里执行，超过时限会被中断。
+        """
+        database = await run_db(cls.get_database, database_id)
         if not database:
             return None
         
-        file_path = Path(database.file_path)
-        file_type = database.file_type
-        
-        if file_type not in ['sqlite', 'db']:
-            raise ValueError("只有SQLite数据库支持SQL查询")
-        
-        import time
-        start_time = time.time()
+        if database.file_type not in ['sqlite', 'db']:
+            return await run_disk(cls._run_columnar_sql, database, query)
         
+        return await run_disk(cls._run_sql, Path(database.file_path), query)
+
+    @staticmethod
+    def _resolve_page(query: SQLQuery) -> Tuple[str, int, str, Optional[int]]:
+        """返回 (查询指纹, 起始行, 计数方式, 已知的精确总数)"""
+        digest = query_digest(query.sql, query.params)
+        if not query.cursor:
+            return digest, max(query.offset, 0), query.count_mode, None
+        state = decode_cursor(query.cursor, digest)
+        return digest, state["offset"], state["count_mode"], state["total"]
+
+    @classmethod
+    def _run_sql(cls, file_path: Path, query: SQLQuery) -> SQLQueryResult:
+        start_time = time.perf_counter()
+        digest, offset, count_mode, known_total = cls._resolve_page(query)
+        limit = min(max(query.limit, 0), MAX_PAGE_ROWS)
+        sql, params, skip = paginate_sql(query.sql, query.params, offset)
         try:
-            conn = sqlite3.connect(str(file_path))
-            conn.row_factory = sqlite3.Row
-            
-            # 执行查询
-            cursor = conn.execute(query.sql, query.params or {})
-            
-            # 获取列名
-            columns = [description[0] for description in cursor.description]
-            
-            # 获取数据
-            rows = []
-            for row in cursor.fetchall():
-                rows.append(dict(row))
-            
-            # 获取总行数
-            count_cursor = conn.execute(f"SELECT COUNT(*) FROM ({query.sql}) as t")
-            total_count = count_cursor.fetchone()[0]
-            
-            conn.close()
-            
-            execution_time = int((time.time() - start_time) * 1000)
-            
-            return SQLQueryResult(
-                columns=columns,
-                rows=rows,
-                total_count=total_count,
-                execution_time_ms=execution_time
+            with sqlite_pools.get(file_path).connection() as conn:
+                cursor = conn.execute(sql, params)
+                try:
+                    columns = [description[0] for description in cursor.description or []]
+                    rows, total_count, exact, has_more = fetch_page(
+                        cursor, skip, limit, "none" if known_total is not None else count_mode
+                    )
+                finally:
+                    cursor.close()
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise ValueError(f"SQL执行错误: {str(e)}")
+
+        if total_count is not None and known_total is None:
+            # offset 已下推到 SQLite 时计数从 offset 开始
+            total_count += offset - skip
+        return cls._page_result(
+            columns, rows, total_count, exact, has_more, digest, offset, count_mode, known_total, start_time
+        )
+
+    @classmethod
+    def _run_columnar_sql(cls, database: ResearchDatabase, query: SQLQuery) -> SQLQueryResult:
+        start_time = time.perf_counter()
+        digest, offset, count_mode, known_total = cls._resolve_page(query)
+        limit = min(max(query.limit, 0), MAX_PAGE_ROWS)
+        sources = cls._columnar_sources(database)
+        with columnar_sql.connect(sources) as conn:
+            statement, params = columnar_sql.prepare(conn, query.sql, query.params)
+            columns, rows, total_count, exact, has_more = columnar_sql.fetch_page(
+                conn, statement, params, offset, limit, "none" if known_total is not None else count_mode
             )
-            
-        except Exception as e:
+        return cls._page_result(
+            columns, rows, total_count, exact, has_more, digest, offset, count_mode, known_total, start_time
+        )
+
+    @staticmethod
+    def _page_result(
+        columns: List[str],
+        rows: List[Dict[str, Any]],
+        total_count: Optional[int],
+        exact: bool,
+        has_more: bool,
+        digest: str,
+        offset: int,
+        count_mode: str,
+        known_total: Optional[int],
+        start_time: float
+    ) -> SQLQueryResult:
+        """组装一页查询结果；续页沿用令牌里的总数，还有后续行时生成 next_cursor"""
+        if known_total is not None:
+            total_count, exact = known_total, True
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(digest, offset + len(rows), count_mode, total_count if exact else None)
+
+        return SQLQueryResult(
+            columns=columns,
+            rows=rows,
+            total_count=total_count,
+            total_count_exact=exact,
+            has_more=has_more,
+            next_cursor=next_cursor,
+            execution_time_ms=int((time.perf_counter() - start_time) * 1000)
+        )
+
+    @classmethod
+    def _columnar_sources(cls, database: ResearchDatabase) -> Dict[str, Tuple[Path, str]]:
+        """列式 SQL 引擎读取的视图：数据集本身为 data，Excel 的每张工作表另以工作表名暴露"""
+        sources = {columnar_sql.DEFAULT_VIEW: cls._columnar_source(database)}
+        if database.file_type in ['xlsx', 'xls'] and database.schema and database.schema.tables:
+            default = default_table(database.schema)
+            for sheet in database.schema.tables:
+                if sheet.name not in sources:
+                    table = None if sheet.name == default else sheet.name
+                    sources[sheet.name] = cls._columnar_source(database, table)
+        return sources
+
+    @classmethod
+    def _columnar_source(cls, database: ResearchDatabase, table: Optional[str] = None) -> Tuple[Path, str]:
+        """数据集（或非默认工作表）可供列式引擎直接扫描的文件；Excel 首次查询时补写 Parquet 副本"""
+        file_path, file_type = cls.resolve_dataset_file(database, table)
+        if columnar_sql.supports_file_type(file_type):
+            return file_path, file_type
+        df = cls.read_source_dataframe(file_path, file_type, table)
+        if df is None:
+            raise ValueError("无法加载数据")
+        cls._save_lazy_columnar(file_path, df, table)
+        file_path, file_type = cls.resolve_dataset_file(database, table)
+        if not columnar_sql.supports_file_type(file_type):
+            raise ValueError(f"{database.file_type} 文件无法生成列式副本，不支持SQL查询")
+        return file_path, file_type
+
+    @classmethod
+    async def stream_sql(
+        cls,
+        database_id: str,
+        query: SQLQuery
+    ) -> Optional[Iterator[bytes]]:
+        """以 NDJSON 流式返回查询结果
+
+        先执行语句（SQL 错误在返回响应前抛出），之后按批产出事件行：
+        {"type": "columns"}、若干 {"type": "rows"}，最后 {"type": "end"}（达到 STREAM_MAX_ROWS 时带 next_cursor）
+        或 {"type": "error"}。忽略 limit，起始行取 offset 或 cursor。
+        """
+        database = await run_db(cls.get_database, database_id)
+        if not database:
+            return None
+
+        if database.file_type not in ['sqlite', 'db']:
+            return await run_disk(cls._open_columnar_stream, database, query)
+
+        return await run_disk(cls._open_sql_stream, Path(database.file_path), query)
+
+    @classmethod
+    def _open_sql_stream(cls, file_path: Path, query: SQLQuery) -> Iterator[bytes]:
+        digest, offset, count_mode, _ = cls._resolve_page(query)
+        sql, params, skip = paginate_sql(query.sql, query.params, offset)
+        stack = ExitStack()
+        try:
+            conn = stack.enter_context(sqlite_pools.get(file_path).connection(STREAM_TIMEOUT_SECONDS))
+            cursor = stack.enter_context(closing(conn.execute(sql, params)))
+            while skip > 0:
+                skipped = cursor.fetchmany(min(STREAM_BATCH_ROWS, skip))
+                if not skipped:
+                    break
+                skip -= len(skipped)
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            stack.close()
             raise ValueError(f"SQL执行错误: {str(e)}")
+        except BaseException:
+            stack.close()
+            raise
+        return cls._iter_sql_stream(stack, cursor, digest, offset, count_mode)
+
+    @classmethod
+    def _open_columnar_stream(cls, database: ResearchDatabase, query: SQLQuery) -> Iterator[bytes]:
+        digest, offset, count_mode, _ = cls._resolve_page(query)
+        sources = cls._columnar_sources(database)
+        with ExitStack() as stack:
+            conn = stack.enter_context(columnar_sql.connect(sources, STREAM_TIMEOUT_SECONDS))
+            statement, params = columnar_sql.prepare(conn, query.sql, query.params)
+            cursor = columnar_sql.execute_from(conn, statement, params, offset)
+            # 语句执行成功后连接交给流式迭代器，出错时由 with 关闭连接并转换错误
+            stack = stack.pop_all()
+        return cls._iter_sql_stream(stack, cursor, digest, offset, count_mode)
+
+    @staticmethod
+    def _iter_sql_stream(
+        stack: ExitStack,
+        cursor: Any,
+        digest: str,
+        offset: int,
+        count_mode: str
+    ) -> Iterator[bytes]:
+        columns = [description[0] for description in cursor.description or []]
+        sent = 0
+        try:
+            with stack:
+                yield ndjson_line({"type": "columns", "columns": columns})
+                while sent < STREAM_MAX_ROWS:
+                    batch = cursor.fetchmany(min(STREAM_BATCH_ROWS, STREAM_MAX_ROWS - sent))
+                    if not batch:
+                        break
+                    sent += len(batch)
+                    yield ndjson_line({"type": "rows", "rows": [dict(zip(columns, row)) for row in batch]})
+                has_more = sent >= STREAM_MAX_ROWS and cursor.fetchone() is not None
+            next_cursor = encode_cursor(digest, offset + sent, count_mode, None) if has_more else None
+            yield ndjson_line({"type": "end", "row_count": sent, "has_more": has_more, "next_cursor": next_cursor})
+        except (ValueError, sqlite3.Error) as e:
+            yield ndjson_line({"type": "error", "row_count": sent, "error": str(e)})
     
+    @staticmethod
+    def _derived_paths(file_path: Path, columnar_path: Optional[str]) -> List[str]:
+        """数据文件派生出的列式副本（上传时生成的、首次加载时补写的以及各表的副本）"""
+        table_copies = [str(path) for path in COLUMNAR_DIR.glob(f"{file_path.name}.t*.parquet")]
+        return [path for path in [columnar_path, str(_columnar_path_for(file_path)), *table_copies] if path]
+
     @classmethod
     def delete_database(cls, database_id: str) -> bool:
-        """删除数据库"""
+        """删除数据库
+
+        记录删除和内容引用计数减一在同一个事务里完成：并发删除同一条记录时只有一个请求
+        删到记录并释放引用；文件在提交之后才删除，提交失败时记录和文件都保持原样。
+        """
         with SessionLocal() as db:
             record = db.query(DatabaseRecord).filter(DatabaseRecord.id == database_id).first()
             if not record:
                 return False
 
+            file_path = Path(record.file_path)
+            metadata = record.extra_metadata or {}
+            content_blob = metadata.get("content_blob")
+            derived_paths = cls._derived_paths(file_path, metadata.get("columnar_path"))
+            deleted = db.query(DatabaseRecord).filter(DatabaseRecord.id == database_id).delete(
+                synchronize_session=False
+            )
+            if deleted != 1:
+                # 另一个请求已经删除了这条记录
+                db.rollback()
+                return False
+            moved = None
             try:
-                if os.path.exists(record.file_path):
-                    os.remove(record.file_path)
-            except Exception as e:
-                print(f"删除文件失败: {e}")
+                if content_blob:
+                    # 内容由多条记录共享，最后一个引用删除时才清理文件
+                    moved = ContentStore.release_in(db, content_blob, derived_paths)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                ContentStore.restore(moved or [])
+                raise
 
-            db.delete(record)
-            db.commit()
-            return True
+        # 分析子进程里的 DataFrame 缓存按文件路径检查，文件删除后自行释放
+        if content_blob:
+            if moved is not None:
+                sqlite_pools.close(file_path)
+                ContentStore.purge(moved)
+        else:
+            sqlite_pools.close(file_path)
+            for path in [str(file_path), *derived_paths]:
+                try:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                except Exception as e:
+                    print(f"删除文件失败: {e}")
+        return True
@@ -0,0 +1,102 @@
+"""
+进程内 DataFrame 缓存
+
+按 (数据文件路径[#表名], 文件 mtime) 缓存已解析的数据集，按内存占用做 LRU 淘汰。
+同一份数据的重复画像/分析直接复用，不再重新解析文件。
+
+缓存只在分析子进程里填充，API 进程删除数据库时无法直接清理子进程的缓存；
+因此 get / put 时（最多每 PRUNE_INTERVAL_SECONDS 秒一次）检查缓存项对应的文件，
+文件已删除或已被替换的缓存项随即释放，不必等到 LRU 淘汰。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+
+DEFAULT_MAX_BYTES = int(os.getenv("DATAFRAME_CACHE_MAX_MB", "512")) * 1024 * 1024
+PRUNE_INTERVAL_SECONDS = float(os.getenv("DATAFRAME_CACHE_PRUNE_SECONDS", "5"))
+
+
+class DataFrameCache:
+    """内存上限受控的 LRU DataFrame 缓存
+
+    缓存中的 DataFrame 会被多个请求共享，调用方不得原地修改，需要改动时先 copy()。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, prune_interval: float = PRUNE_INTERVAL_SECONDS):
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self._entries: "OrderedDict[str, Tuple[str, int, pd.DataFrame, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_bytes(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    @staticmethod
+    def _key(file_path: Path, table: Optional[str]) -> str:
+        return str(file_path) if table is None else f"{file_path}#{table}"
+
+    def _drop(self, key: str) -> None:
+        self._total_bytes -= self._entries.pop(key)[3]
+
+    def _prune_stale(self) -> None:
+        """释放文件已删除或 mtime 已变化的缓存项（调用方持有锁）"""
+        now = time.monotonic()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        for key, (path, mtime_ns, _, _) in list(self._entries.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self._drop(key)
+
+    def get(self, file_path: Path, mtime_ns: int, table: Optional[str] = None) -> Optional[pd.DataFrame]:
+        key = self._key(file_path, table)
+        with self._lock:
+            self._prune_stale()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] != mtime_ns:
+                # 文件已被替换，旧版本作废
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, file_path: Path, mtime_ns: int, df: pd.DataFrame, table: Optional[str] = None) -> None:
+        size = self._frame_bytes(df)
+        if size > self.max_bytes:
+            return
+        key = self._key(file_path, table)
+        with self._lock:
+            self._prune_stale()
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (str(file_path), mtime_ns, df, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, (_, _, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 全局缓存实例
+dataframe_cache = DataFrameCache()
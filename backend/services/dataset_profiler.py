@@ -0,0 +1,357 @@
+"""
+数据集单遍画像
+
+profile_database 原来逐列调用 isna / notna / nunique / mean / std / min / median / max，
+推荐分组变量时又对每列再算一次 nunique，一列数据要被扫描十来遍。这里改成：
+1. 数值列按 dtype 分组、切成列块转为 Fortran 序矩阵，每块只做一次排序，
+   min / max / 中位数 / 去重计数都从排好序的矩阵里直接取，均值和标准差向量化计算；
+2. 文本等其他列每列只做一次 value_counts，去重计数、非空计数和高频值都从这一次结果得到；
+3. 结果汇总成 DatasetStats，画像和分析推荐共用，不再重复扫描数据。
+
+接近上传上限的大文件连单遍精确画像也不够快，sketch_profile 按块流式读取，
+用 HyperLogLog / 分位数摘要 / 高频值摘要估计去重数、中位数和高频值，内存有界，
+并在结果里标明哪些字段是近似值及其误差界。
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.services.sketches import FrequentItems, HyperLogLog, QuantileSketch, RunningMoments
+
+# 每个数值列块的目标大小：排序副本和比较掩码会再各占一份同等量级的内存
+BLOCK_BYTES = int(os.getenv("PROFILER_BLOCK_MB", "32")) * 1024 * 1024
+
+
+@dataclass
+class ColumnStats:
+    """单列统计量（未做 JSON 转换的原始值）"""
+    name: str
+    dtype: str
+    kind: str  # numeric / datetime / categorical
+    non_null_count: int
+    unique_count: int
+    numeric_summary: Optional[Dict[str, Optional[float]]] = None
+    top_values: Optional[List[Tuple[Any, int]]] = None
+    time_range: Optional[Tuple[Any, Any]] = None
+    # 近似模式下哪些字段是估计值，以及对应的误差界
+    approximate_fields: List[str] = field(default_factory=list)
+    error_bounds: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class DatasetStats:
+    """整表统计结果，按原始列顺序保存"""
+    total_rows: int
+    columns: Dict[str, ColumnStats] = field(default_factory=dict)
+    mode: str = "exact"  # exact / sketch
+
+    def _names(self, kind: str) -> List[str]:
+        return [name for name, stats in self.columns.items() if stats.kind == kind]
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        return self._names("numeric")
+
+    @property
+    def datetime_columns(self) -> List[str]:
+        return self._names("datetime")
+
+    @property
+    def categorical_columns(self) -> List[str]:
+        return self._names("categorical")
+
+    def grouping_candidates(self, max_categories: int = 10) -> List[str]:
+        """非数值且取值个数在 [2, max_categories] 之间的列"""
+        return [
+            name
+            for name, stats in self.columns.items()
+            if stats.kind != "numeric" and 2 <= stats.unique_count <= max_categories
+        ]
+
+    def binary_columns(self) -> List[str]:
+        return [
+            name
+            for name, stats in self.columns.items()
+            if stats.kind == "categorical" and stats.unique_count == 2
+        ]
+
+
+def _block_dtype(series: pd.Series) -> np.dtype:
+    """整数列保持原生类型（避免大整数转浮点后去重失真），其余数值列统一转 float64"""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return dtype
+    return np.dtype(np.float64)
+
+
+def _numeric_block_stats(block: np.ndarray) -> Dict[str, np.ndarray]:
+    """一次排序得到一个列块的全部统计量；NaN 经排序后统一落在每列末尾"""
+    rows, width = block.shape
+    if rows == 0:
+        empty = np.full(width, np.nan)
+        zeros = np.zeros(width, dtype=np.int64)
+        return {"count": zeros, "unique": zeros, "mean": empty, "std": empty,
+                "min": empty, "median": empty, "max": empty}
+    ordered = np.sort(np.asfortranarray(block), axis=0)
+    cols = np.arange(width)
+
+    if ordered.dtype.kind == "f":
+        valid = ~np.isnan(ordered)
+        count = valid.sum(axis=0)
+        # 相邻不等的次数里，NaN 段每行都算一次变化（NaN != NaN），需要扣掉
+        changes = (ordered[1:] != ordered[:-1]).sum(axis=0)
+        unique = np.where(count > 0, changes + 1 - (rows - count), 0)
+    else:
+        valid = None
+        count = np.full(width, rows)
+        unique = (ordered[1:] != ordered[:-1]).sum(axis=0) + 1
+
+    has_value = count > 0
+    last = np.maximum(count - 1, 0)
+    low = ordered[last // 2, cols].astype(np.float64)
+    high = ordered[(count // 2).clip(max=rows - 1), cols].astype(np.float64)
+    minimum = ordered[0].astype(np.float64)
+    maximum = ordered[last, cols].astype(np.float64)
+
+    values = ordered.astype(np.float64, copy=False)
+    if valid is not None:
+        values = np.where(valid, values, 0.0)
+    # 含 inf 的列会产生 inf - inf，结果按 pandas 的口径记为 NaN
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=0) / np.maximum(count, 1)
+        deviations = values - mean
+        if valid is not None:
+            deviations[~valid] = 0.0
+        sum_sq = np.einsum("ij,ij->j", deviations, deviations)
+        std = np.sqrt(sum_sq / (count - 1))
+
+    nan = np.full(width, np.nan)
+    return {
+        "count": count,
+        "unique": unique,
+        "mean": np.where(has_value, mean, nan),
+        "std": np.where(count > 1, std, nan),
+        "min": np.where(has_value, minimum, nan),
+        "median": np.where(has_value, (low + high) / 2, nan),
+        "max": np.where(has_value, maximum, nan),
+    }
+
+
+def _profile_numeric(df: pd.DataFrame, positions: List[int], block_bytes: int) -> Dict[int, ColumnStats]:
+    groups: Dict[np.dtype, List[int]] = {}
+    for position in positions:
+        groups.setdefault(_block_dtype(df.iloc[:, position]), []).append(position)
+
+    rows = max(len(df), 1)
+    per_block = max(1, block_bytes // (rows * 8))
+    results: Dict[int, ColumnStats] = {}
+    for dtype, members in groups.items():
+        for start in range(0, len(members), per_block):
+            chunk = members[start:start + per_block]
+            frame = df.iloc[:, chunk]
+            if dtype.kind == "f":
+                block = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                block = frame.to_numpy(dtype=dtype)
+            stats = _numeric_block_stats(block)
+            for offset, position in enumerate(chunk):
+                results[position] = ColumnStats(
+                    name=df.columns[position],
+                    dtype=str(df.dtypes.iloc[position]),
+                    kind="numeric",
+                    non_null_count=int(stats["count"][offset]),
+                    unique_count=int(stats["unique"][offset]),
+                    numeric_summary={
+                        key: float(stats[key][offset]) for key in ("mean", "std", "min", "median", "max")
+                    },
+                )
+    return results
+
+
+def _profile_other(series: pd.Series, top_n: int) -> ColumnStats:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        non_null = int(series.count())
+        return ColumnStats(
+            name=series.name,
+            dtype=str(series.dtype),
+            kind="datetime",
+            non_null_count=non_null,
+            unique_count=int(series.nunique(dropna=True)),
+            time_range=(series.min(), series.max()),
+        )
+
+    counts = series.value_counts(dropna=True)
+    # category 类型会带出计数为 0 的未出现取值
+    observed = counts[counts > 0]
+    return ColumnStats(
+        name=series.name,
+        dtype=str(series.dtype),
+        kind="categorical",
+        non_null_count=int(observed.sum()),
+        unique_count=int(len(observed)),
+        top_values=list(counts.head(top_n).items()),
+    )
+
+
+def profile_dataframe(df: pd.DataFrame, top_n: int = 5, block_bytes: int = BLOCK_BYTES) -> DatasetStats:
+    """单遍计算所有列的画像统计量"""
+    numeric_positions = [
+        position
+        for position in range(df.shape[1])
+        if pd.api.types.is_numeric_dtype(df.dtypes.iloc[position])
+    ]
+    computed = _profile_numeric(df, numeric_positions, block_bytes)
+    for position in range(df.shape[1]):
+        if position not in computed:
+            computed[position] = _profile_other(df.iloc[:, position], top_n)
+
+    result = DatasetStats(total_rows=int(len(df)))
+    for position in range(df.shape[1]):
+        stats = computed[position]
+        result.columns[stats.name] = stats
+    return result
+
+
+class ColumnSketch:
+    """单列的流式摘要，列类型由第一次出现该列的分块决定
+
+    quantile_exact_limit / top_capacity 控制精确区间：非空值个数、不同取值个数不超过它们时
+    中位数和高频值是精确的；track_distinct=False 时数值列不做去重计数；
+    detect_datetime=False 时时间列按分类变量统计高频值。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        series: pd.Series,
+        top_n: int = 5,
+        quantile_exact_limit: int = 0,
+        top_capacity: Optional[int] = None,
+        track_distinct: bool = True,
+        detect_datetime: bool = True,
+    ):
+        self.name = name
+        self.dtype = str(series.dtype)
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            self.kind = "numeric"
+        elif detect_datetime and pd.api.types.is_datetime64_any_dtype(series.dtype):
+            self.kind = "datetime"
+        else:
+            self.kind = "categorical"
+        self.non_null_count = 0
+        self.coerced_values = 0
+        self.distinct = HyperLogLog() if track_distinct or self.kind != "numeric" else None
+        self.moments = RunningMoments() if self.kind == "numeric" else None
+        self.quantiles = QuantileSketch(exact_limit=quantile_exact_limit) if self.kind == "numeric" else None
+        self.frequent = (
+            FrequentItems(capacity=top_capacity or max(64, top_n * 8)) if self.kind == "categorical" else None
+        )
+        self.time_min = None
+        self.time_max = None
+
+    def update(self, series: pd.Series) -> None:
+        if self.kind == "numeric":
+            if not pd.api.types.is_numeric_dtype(series.dtype):
+                # 分块推断出的类型可能不一致（如 CSV 后面出现文本），无法解析的值按缺失处理
+                coerced = pd.to_numeric(series, errors="coerce")
+                self.coerced_values += int(series.notna().sum() - coerced.notna().sum())
+                series = coerced
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.moments.update(values)
+            self.quantiles.update(values)
+            if self.distinct is not None:
+                self.distinct.update(series)
+            self.non_null_count = self.moments.count
+        elif self.kind == "datetime":
+            if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+                coerced = pd.to_datetime(series, errors="coerce")
+                self.coerced_values += int(series.notna().sum() - coerced.notna().sum())
+                series = coerced
+            present = series.dropna()
+            if present.empty:
+                return
+            self.non_null_count += int(present.size)
+            self.distinct.update(present)
+            low, high = present.min(), present.max()
+            self.time_min = low if self.time_min is None else min(self.time_min, low)
+            self.time_max = high if self.time_max is None else max(self.time_max, high)
+        else:
+            counts = series.value_counts(dropna=True, sort=False)
+            counts = counts[counts > 0]
+            self.non_null_count += int(counts.sum())
+            self.frequent.update_counts(counts)
+            self.distinct.update(pd.Series(counts.index))
+
+    def finish(self, top_n: int) -> ColumnStats:
+        stats = ColumnStats(
+            name=self.name,
+            dtype=self.dtype,
+            kind=self.kind,
+            non_null_count=self.non_null_count,
+            unique_count=self.distinct.estimate() if self.distinct is not None else 0,
+        )
+        if self.distinct is not None and not self.distinct.is_exact:
+            stats.approximate_fields.append("unique_count")
+            stats.error_bounds["unique_count"] = {"relative_std_error": round(self.distinct.relative_error, 4)}
+        if self.coerced_values:
+            stats.error_bounds["unparsed_values_as_missing"] = self.coerced_values
+
+        if self.kind == "numeric":
+            moments = self.moments
+            stats.numeric_summary = {
+                "mean": moments.mean if moments.count else float("nan"),
+                "std": moments.std,
+                "min": moments.minimum if moments.count else float("nan"),
+                "median": self.quantiles.quantile(0.5),
+                "max": moments.maximum if moments.count else float("nan"),
+            }
+            if not self.quantiles.is_exact:
+                stats.approximate_fields.append("median")
+                # 误差以秩表示：返回值在真实分布中的位置与 50% 的偏差上界（99% 置信度）
+                stats.error_bounds["median"] = {"rank_error": round(self.quantiles.rank_error, 6)}
+        elif self.kind == "datetime":
+            stats.time_range = (self.time_min, self.time_max)
+        else:
+            stats.top_values = self.frequent.top(top_n)
+            if not self.frequent.is_exact:
+                stats.approximate_fields.append("top_values")
+                stats.error_bounds["top_values"] = {"max_count_error": self.frequent.max_error}
+        return stats
+
+
+def sketch_profile(
+    chunks: Iterable[pd.DataFrame],
+    top_n: int = 5,
+    sample_rows: int = 1000,
+) -> Tuple[DatasetStats, pd.DataFrame]:
+    """流式近似画像，返回 (统计结果, 前 sample_rows 行样本)
+
+    计数、缺失、均值、标准差、最值是精确的；去重数、中位数和高频值在数据量超过
+    摘要容量后变为估计值，并在 approximate_fields / error_bounds 中注明。
+    """
+    sketches: Dict[str, ColumnSketch] = {}
+    head_parts: List[pd.DataFrame] = []
+    head_rows = 0
+    total_rows = 0
+    for chunk in chunks:
+        total_rows += len(chunk)
+        if head_rows < sample_rows:
+            head_parts.append(chunk.head(sample_rows - head_rows))
+            head_rows += len(head_parts[-1])
+        for column in chunk.columns:
+            series = chunk[column]
+            sketch = sketches.get(column)
+            if sketch is None:
+                sketch = sketches[column] = ColumnSketch(column, series, top_n)
+            sketch.update(series)
+
+    result = DatasetStats(total_rows=total_rows, mode="sketch")
+    for column, sketch in sketches.items():
+        result.columns[column] = sketch.finish(top_n)
+    head = pd.concat(head_parts, ignore_index=True) if head_parts else pd.DataFrame()
+    return result, head
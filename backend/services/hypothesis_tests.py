@@ -0,0 +1,102 @@
+"""
+批量组间检验
+
+组间比较原来逐个变量把每组的原始值取出来再调用 ttest_ind / f_oneway。两种检验其实只依赖
+各组的样本量、均值和方差，这里直接在 (分组 × 变量) 的充分统计量矩阵上用 NumPy 一次算出
+所有变量的 Welch t 或单因素 ANOVA，并做多重检验校正。
+内存路径（一次 groupby 聚合）和分块路径（跨块合并的 count / mean / M2）共用这里的实现。
+"""
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    from scipy import stats as scipy_stats
+except Exception:  # pragma: no cover - optional dependency at runtime
+    scipy_stats = None
+
+P_ADJUST_METHODS = ("fdr_bh", "holm", "bonferroni", "none")
+
+
+def group_tests(count: np.ndarray, mean: np.ndarray, var: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+    """按列（变量）批量做组间检验
+
+    count / mean / var 形状均为 (分组数, 变量数)，var 为 ddof=1 的样本方差。
+    每个变量只使用非空值多于 1 个的分组：恰好 2 组时做 Welch t 检验（第一组减第二组），
+    多于 2 组时做单因素 ANOVA，不足 2 组时不检验。
+    返回 kind（0 不检验 / 2 t 检验 / 3 ANOVA）、statistic、p_value 三个长度为变量数的数组。
+    """
+    if scipy_stats is None:
+        return None
+    count = np.asarray(count, dtype=np.float64)
+    mean = np.asarray(mean, dtype=np.float64)
+    var = np.asarray(var, dtype=np.float64)
+    usable = count > 1
+    groups = usable.sum(axis=0)
+    n_vars = count.shape[1]
+
+    statistic = np.full(n_vars, np.nan)
+    p_value = np.full(n_vars, np.nan)
+    kind = np.where(groups == 2, 2, np.where(groups > 2, 3, 0))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        two = np.flatnonzero(kind == 2)
+        if two.size:
+            # 每个变量取前两个可用分组的行号，保持分组原有顺序
+            rows = np.argsort(~usable[:, two], axis=0, kind="stable")[:2]
+            n1, n2 = count[rows[0], two], count[rows[1], two]
+            m1, m2 = mean[rows[0], two], mean[rows[1], two]
+            se1, se2 = var[rows[0], two] / n1, var[rows[1], two] / n2
+            se = se1 + se2
+            t = (m1 - m2) / np.sqrt(se)
+            dof = se ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+            statistic[two] = t
+            p_value[two] = 2 * scipy_stats.t.sf(np.abs(t), dof)
+
+        many = np.flatnonzero(kind == 3)
+        if many.size:
+            weights = np.where(usable[:, many], count[:, many], 0.0)
+            means = np.where(usable[:, many], mean[:, many], 0.0)
+            within_ss = np.where(usable[:, many], (count[:, many] - 1) * var[:, many], 0.0).sum(axis=0)
+            total = weights.sum(axis=0)
+            grand_mean = (weights * means).sum(axis=0) / total
+            between_ss = (weights * (means - grand_mean) ** 2).sum(axis=0)
+            between_df = groups[many] - 1
+            within_df = total - groups[many]
+            f = (between_ss / between_df) / (within_ss / within_df)
+            statistic[many] = f
+            p_value[many] = scipy_stats.f.sf(f, between_df, within_df)
+
+    return {"kind": kind, "statistic": statistic, "p_value": p_value}
+
+
+def adjust_pvalues(p_values: np.ndarray, method: str = "fdr_bh") -> np.ndarray:
+    """多重检验校正；NaN（未检验）不参与校正并原样保留"""
+    if method not in P_ADJUST_METHODS:
+        raise ValueError(f"不支持的多重检验校正方法: {method}，可选 {', '.join(P_ADJUST_METHODS)}")
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full_like(p_values, np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    m = tested.size
+    if m == 0 or method == "none":
+        adjusted[tested] = p_values[tested]
+        return adjusted
+
+    p = p_values[tested]
+    if method == "bonferroni":
+        result = p * m
+    elif method == "holm":
+        order = np.argsort(p, kind="stable")
+        stepped = np.maximum.accumulate(p[order] * (m - np.arange(m)))
+        result = np.empty(m)
+        result[order] = stepped
+    else:
+        order = np.argsort(p, kind="stable")
+        scaled = p[order] * m / np.arange(1, m + 1)
+        stepped = np.minimum.accumulate(scaled[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = stepped
+    adjusted[tested] = np.minimum(result, 1.0)
+    return adjusted
@@ -0,0 +1,190 @@
+"""
+阻塞 I/O 线程池与事件循环延迟监测
+
+数据库和研究方案服务的方法大多是 async def，但内部直接 open() 写文件、pd.read_* 解析、
+查 SQLite 和 SQLAlchemy，这些调用执行期间整个事件循环都停着，其他请求（包括健康检查）一起等待。
+这里提供统一的转交层：
+1. 磁盘类工作（写上传文件、解析 schema、生成列式副本和预览、在用户文件上执行 SQL）交给 disk 线程池；
+2. 元数据库（SQLAlchemy 会话）读写交给 db 线程池；两个池分开限流，大文件解析占满磁盘池时
+   列表、详情这类短查询不用排在后面，db 池的线程数也不超过连接池大小；
+3. LoopLagMonitor 周期性地 sleep 固定间隔，实际醒来时间与预期之差就是事件循环被阻塞的时长，
+   统计均值、分位数和最大值，/health/io 返回当前统计和两个池的排队情况。
+OFFLOAD_BLOCKING_IO=0 时直接在事件循环里调用（排查问题和做对比测试用）。
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DISK_IO_WORKERS = int(os.getenv("DISK_IO_WORKERS", str(min(8, (os.cpu_count() or 1) + 2))))
+DB_IO_WORKERS = int(os.getenv("DB_IO_WORKERS", "4"))
+OFFLOAD_BLOCKING_IO = os.getenv("OFFLOAD_BLOCKING_IO", "1") != "0"
+# 延迟监测的采样间隔和保留的样本数
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000
+LOOP_LAG_SAMPLES = 4096
+# 单次延迟超过该值记为一次卡顿
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_MS", "100")) / 1000
+
+
+class IOPool:
+    """有上限的线程池，记录正在执行和排队的任务数"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"io-{self.name}"
+                )
+            return self._executor
+
+    def _call(self, func: Callable[[], T], started: threading.Event) -> T:
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            started.set()
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """在池中执行 func(*args, **kwargs) 并等待结果；上下文变量随调用传递，同 asyncio.to_thread"""
+        if not OFFLOAD_BLOCKING_IO:
+            return func(*args, **kwargs)
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        started = threading.Event()
+        executor = self._get_executor()
+        with self._lock:
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, self._call, call, started)
+        finally:
+            with self._lock:
+                # 排队期间被取消的任务不会再执行，这里把它移出排队计数
+                if not started.is_set():
+                    self._pending -= 1
+                    started.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.max_workers, "running": self._running, "queued": self._pending}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+disk_pool = IOPool("disk", DISK_IO_WORKERS)
+db_pool = IOPool("db", DB_IO_WORKERS)
+
+
+async def run_disk(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """把文件读写、解析等阻塞工作交给磁盘线程池"""
+    return await disk_pool.run(func, *args, **kwargs)
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """把元数据库的会话读写交给数据库线程池"""
+    return await db_pool.run(func, *args, **kwargs)
+
+
+def shutdown() -> None:
+    disk_pool.shutdown()
+    db_pool.shutdown()
+
+
+class LoopLagMonitor:
+    """测量事件循环延迟：每隔 interval 醒来一次，记录比预期晚了多久"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS, max_samples: int = LOOP_LAG_SAMPLES):
+        self.interval = interval
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+        self._task: Optional[asyncio.Task] = None
+        self._max = 0.0
+        self._stalls = 0
+        self._started_at: Optional[float] = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self._samples.append(lag)
+            self._max = max(self._max, lag)
+            if lag >= LOOP_STALL_SECONDS:
+                self._stalls += 1
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self.reset()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._max = 0.0
+        self._stalls = 0
+        self._started_at = time.perf_counter()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前统计（毫秒）；分位数按最近 LOOP_LAG_SAMPLES 个样本计算，最大值和卡顿次数自 reset 起累计"""
+        samples = sorted(self._samples)
+
+        def percentile(q: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+            "mean_ms": (sum(samples) / len(samples) * 1000) if samples else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": self._max * 1000,
+            "stalls": self._stalls,
+            "stall_threshold_ms": LOOP_STALL_SECONDS * 1000,
+            "window_seconds": (time.perf_counter() - self._started_at) if self._started_at else 0.0,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def io_stats() -> Dict[str, Any]:
+    return {
+        "offload": OFFLOAD_BLOCKING_IO,
+        "loop_lag": loop_lag_monitor.snapshot(),
+        "pools": {"disk": disk_pool.stats(), "db": db_pool.stats()},
+    }
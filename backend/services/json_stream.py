@@ -0,0 +1,150 @@
+"""
+JSON 流式读取
+
+上传的 JSON 数据集通常是一个很大的顶层数组（如 EDC 系统导出）。json.load 会把整个文件读进内存再解析，
+只想取前几条记录（预览）时代价与文件大小成正比。这里按块读取文件，用 JSONDecoder.raw_decode
+逐个解析数组元素，内存只与单条记录和读块大小有关；读够需要的条数即可停止。
+
+记录里的嵌套对象展开成点分列名（{"vitals": {"sbp": 120}} -> vitals.sbp），数组保存为 JSON 文本。
+scan_json 一遍扫描统计行数并收集所有记录的列，iter_json_frames 按块产出列一致的 DataFrame。
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+# 每次从文件读取的字符数
+READ_CHUNK_CHARS = 1 << 16
+_WHITESPACE = " \t\r\n"
+
+
+class _Reader:
+    """按块读取文本，维护未解析部分的缓冲区"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """再读一块追加到缓冲区，已到文件末尾时返回 False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已解析的部分，缓冲区只保留当前记录
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符；文件结束时返回空串"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+
+def iter_json_records(file_path: Path) -> Iterator[Any]:
+    """逐条产出 JSON 文件顶层数组的元素；顶层不是数组时整体解析并作为唯一一条产出"""
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        reader = _Reader(f)
+        if reader.peek() != "[":
+            yield json.loads(reader.buffer[reader.pos:] + f.read())
+            return
+        reader.pos += 1
+        if reader.peek() == "]":
+            return
+        while True:
+            if not reader.peek():
+                raise ValueError("JSON 数组不完整")
+            try:
+                item, end = decoder.raw_decode(reader.buffer, reader.pos)
+            except json.JSONDecodeError:
+                # 当前记录跨越了读块边界，读入下一块后重新解析
+                if not reader.fill():
+                    raise
+                continue
+            follow = end
+            while follow < len(reader.buffer) and reader.buffer[follow] in _WHITESPACE:
+                follow += 1
+            if (follow == len(reader.buffer) or reader.buffer[follow] not in ",]") and reader.fill():
+                # 数字等标量可能在块末尾被截断（如 "2." 只读到 "2"），看到分隔符之前补读一块重新解析
+                continue
+            reader.pos = end
+            yield item
+            separator = reader.peek()
+            if separator == "]":
+                return
+            if not separator:
+                raise ValueError("JSON 数组不完整")
+            if separator != ",":
+                raise ValueError(f"JSON 数组格式错误: 期望 ',' 或 ']'，实际为 {separator!r}")
+            reader.pos += 1
+
+
+def _flatten_into(flat: Dict[str, Any], obj: Dict[str, Any], prefix: str, separator: str) -> None:
+    for key, value in obj.items():
+        name = prefix + key if prefix else key
+        if isinstance(value, dict):
+            _flatten_into(flat, value, name + separator, separator)
+        elif isinstance(value, list):
+            flat[name] = json.dumps(value, ensure_ascii=False)
+        else:
+            flat[name] = value
+
+
+def flatten_record(record: Any, separator: str = ".") -> Dict[str, Any]:
+    """把一条记录展开成一层：嵌套对象用点分列名，数组转成 JSON 文本，非对象的记录放在 value 列"""
+    if not isinstance(record, dict):
+        record = {"value": record}
+    flat: Dict[str, Any] = {}
+    _flatten_into(flat, record, "", separator)
+    return flat
+
+
+@dataclass
+class JSONScan:
+    """一遍扫描 JSON 数据集的结果"""
+
+    columns: List[str]
+    sample: List[Dict[str, Any]]
+    row_count: int
+
+
+def scan_json(file_path: Path, sample_rows: int) -> JSONScan:
+    """流式扫描一遍：统计行数，按首次出现顺序收集所有记录展开后的列，保留前 sample_rows 条用于推断类型"""
+    # 只用键的插入顺序，值没有意义
+    columns: Dict[str, Any] = {}
+    sample: List[Dict[str, Any]] = []
+    row_count = 0
+    for record in iter_json_records(file_path):
+        flat = flatten_record(record)
+        columns.update(flat)
+        if row_count < sample_rows:
+            sample.append(flat)
+        row_count += 1
+    return JSONScan(columns=list(columns), sample=sample, row_count=row_count)
+
+
+def iter_json_frames(file_path: Path, chunk_rows: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """按块产出展开后的记录；给定 columns（通常来自 scan_json）时每块都按这些列对齐，缺失为 NaN"""
+    batch: List[Dict[str, Any]] = []
+    for record in iter_json_records(file_path):
+        batch.append(flatten_record(record))
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
@@ -0,0 +1,120 @@
+"""
+分块写 Parquet
+
+Parquet 文件的 schema 要在写第一行之前确定，而 CSV 分块、JSON 记录块、公开数据库分页结果
+都是边读边到的：前几块里整列缺失的列推断不出类型，后面的块还可能多出新列。
+ChunkedParquetWriter 把每块先写成一个分片文件，最后按宽松规则合并各分片的 schema
+（int64 + double -> double，整块为空的列服从其他块），逐个分片补齐缺失列、转换到合并后的 schema
+写入同一个文件。内存占用只与单块大小有关。
+"""
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:  # pragma: no cover - optional dependency at runtime
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pa is not None
+
+
+class ChunkedParquetWriter:
+    """逐块追加 DataFrame，close 时合并写出到 path
+
+    text_fallback 为 False 时某列在不同块里分别是数值和文本等无法合并的类型会让 close 返回 False，
+    由调用方退回整表转换；为 True 时这样的列统一保存为文本。
+    """
+
+    def __init__(self, path: Path, text_fallback: bool = False):
+        if not PARQUET_AVAILABLE:
+            raise ValueError("未安装 pyarrow，无法写入 Parquet")
+        self.path = path
+        self.text_fallback = text_fallback
+        self.parts_dir = path.with_name(path.name + ".parts")
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        self.parts: List[Path] = []
+        self.schemas: List["pa.Schema"] = []
+        self.row_count = 0
+        self.null_counts: Dict[str, int] = {}
+
+    def append(self, chunk: pd.DataFrame) -> None:
+        chunk.columns = [str(col) for col in chunk.columns]
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if not self.text_fallback:
+                raise
+            # 同一块的某列里混有数值和文本，把对象列整列转成文本
+            chunk = chunk.apply(
+                lambda column: column.where(column.isna(), column.astype(str)) if column.dtype == object else column
+            )
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+        table = table.replace_schema_metadata(None)
+        # 整块缺失的列记为 null 类型，合并时服从其他块的类型
+        for position, column in enumerate(table.columns):
+            name = table.field(position).name
+            self.null_counts[name] = self.null_counts.get(name, 0) + column.null_count
+            if column.null_count == len(column) and column.type != pa.null():
+                table = table.set_column(position, name, pa.nulls(len(column)))
+        part_path = self.parts_dir / f"{len(self.parts):06d}.parquet"
+        pq.write_table(table, part_path)
+        self.parts.append(part_path)
+        self.schemas.append(table.schema)
+        self.row_count += table.num_rows
+
+    def _merged_schema(self) -> Optional["pa.Schema"]:
+        """按列首次出现的顺序合并各分片的类型；无法合并且不允许退回文本时返回 None"""
+        types: Dict[str, List["pa.DataType"]] = {}
+        for schema in self.schemas:
+            for field in schema:
+                types.setdefault(field.name, []).append(field.type)
+        fields = []
+        for name, candidates in types.items():
+            try:
+                merged = pa.unify_schemas(
+                    [pa.schema([pa.field(name, candidate)]) for candidate in candidates],
+                    promote_options="permissive",
+                ).field(name).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                if not self.text_fallback:
+                    return None
+                merged = pa.string()
+            # 全表都缺失的列与 read_csv 一致按 float64 保存
+            fields.append(pa.field(name, pa.float64() if merged == pa.null() else merged))
+        return pa.schema(fields)
+
+    def close(self) -> bool:
+        """合并写出，成功返回 True；没有写入任何块或类型无法合并时返回 False，不留下输出文件"""
+        try:
+            if not self.parts:
+                return False
+            schema = self._merged_schema()
+            if schema is None:
+                return False
+            with pq.ParquetWriter(self.path, schema) as writer:
+                for part_path in self.parts:
+                    table = pq.read_table(part_path)
+                    # 补齐该分片没有的列，并转换到合并后的类型
+                    columns = [
+                        table.column(field.name).cast(field.type) if field.name in table.column_names
+                        else pa.nulls(table.num_rows, field.type)
+                        for field in schema
+                    ]
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            return True
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            self.path.unlink(missing_ok=True)
+            return False
+        finally:
+            self.abort()
+
+    def abort(self) -> None:
+        """删除分片目录（close 之后也会调用）"""
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
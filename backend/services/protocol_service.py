@@ -5,10 +5,15 @@
 import os
 import uuid
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Union
 from pathlib import Path
 
+from sqlalchemy.orm import load_only
+
 from backend.database import ProtocolRecord, SessionLocal
+from backend.services import catalog_query
+from backend.services.content_store import ContentStore, write_upload
+from backend.services.io_pools import run_db
 from backend.upload_models import (
     ResearchProtocol, ProtocolCreate, ProtocolUpdate, ProtocolResponse
 )
@@ -16,6 +21,8 @@ from backend.upload_models import (
 # 上传目录配置
 UPLOAD_DIR = Path("/tmp/medroundtable/uploads")
 PROTOCOLS_DIR = UPLOAD_DIR / "protocols"
+# 按内容哈希去重保存的方案文件
+CONTENT_DIR = PROTOCOLS_DIR / "content"
 
 # 确保目录存在
 PROTOCOLS_DIR.mkdir(parents=True, exist_ok=True)
@@ -44,6 +51,14 @@ class ProtocolService:
     
     ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.md', '.txt'}
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+    # 列表只读取的列
+    SUMMARY_COLUMNS = (
+        ProtocolRecord.id, ProtocolRecord.title, ProtocolRecord.description, ProtocolRecord.file_type,
+        ProtocolRecord.file_size, ProtocolRecord.version, ProtocolRecord.status,
+        ProtocolRecord.uploaded_by, ProtocolRecord.roundtable_id,
+        ProtocolRecord.created_at, ProtocolRecord.updated_at,
+    )
     
     @staticmethod
     def get_file_extension(filename: str) -> str:
@@ -59,61 +74,75 @@ class ProtocolService:
     @classmethod
     async def upload_protocol(
         cls,
-        file_content: bytes,
+        file_content: Union[bytes, AsyncIterator[bytes]],
         filename: str,
         title: str,
         description: Optional[str] = None,
         uploaded_by: Optional[str] = None,
         roundtable_id: Optional[str] = None
     ) -> ResearchProtocol:
-        """上传研究方案"""
+        """上传研究方案
+
+        file_content 可以是字节串或按块产出字节的异步迭代器；相同内容的文件只保存一份。
+        写盘和元数据读写分别在磁盘 / 数据库线程池里执行。
+        """
         
         # 验证文件类型
         if not cls.is_allowed_file(filename):
             raise ValueError(f"不支持的文件类型。允许的类型: {cls.ALLOWED_EXTENSIONS}")
         
         # 验证文件大小
-        if len(file_content) > cls.MAX_FILE_SIZE:
+        if isinstance(file_content, bytes) and len(file_content) > cls.MAX_FILE_SIZE:
             raise ValueError(f"文件大小超过限制 ({cls.MAX_FILE_SIZE / 1024 / 1024}MB)")
         
         # 生成唯一ID
         protocol_id = str(uuid.uuid4())
         
-        # 生成存储路径
+        # 先写暂存文件并计算内容哈希，再按内容登记
         file_ext = cls.get_file_extension(filename)
-        storage_filename = f"{protocol_id}{file_ext}"
-        file_path = PROTOCOLS_DIR / storage_filename
-        
-        # 保存文件
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        now = datetime.utcnow()
-        record = ProtocolRecord(
-            id=protocol_id,
-            title=title,
-            description=description,
-            file_path=str(file_path),
-            file_type=file_ext[1:],
-            file_size=len(file_content),
-            version=1,
-            status="uploaded",
-            uploaded_by=uploaded_by,
-            roundtable_id=roundtable_id,
-            created_at=now,
-            updated_at=now,
-            extra_metadata={
-                "original_filename": filename,
-                "upload_timestamp": now.isoformat()
-            }
+        staged_path = PROTOCOLS_DIR / f"{protocol_id}{file_ext}"
+        file_size, content_hash = await write_upload(file_content, staged_path, cls.MAX_FILE_SIZE)
+        content = await run_db(
+            ContentStore.acquire, "protocol", staged_path, CONTENT_DIR, content_hash, file_ext[1:], file_size
         )
+        
+        try:
+            now = datetime.utcnow()
+            record = ProtocolRecord(
+                id=protocol_id,
+                title=title,
+                description=description,
+                file_path=str(content.file_path),
+                file_type=file_ext[1:],
+                file_size=file_size,
+                version=1,
+                status="uploaded",
+                uploaded_by=uploaded_by,
+                roundtable_id=roundtable_id,
+                created_at=now,
+                updated_at=now,
+                extra_metadata={
+                    "original_filename": filename,
+                    "upload_timestamp": now.isoformat(),
+                    "sha256": content_hash,
+                    "content_blob": content.blob_id,
+                    "deduplicated": content.reused
+                }
+            )
+
+            return await run_db(cls._insert_record, record)
+        except BaseException:
+            # 失败（包括请求被取消）时同步归还引用，不依赖之后还能 await
+            ContentStore.release(content.blob_id)
+            raise
 
+    @staticmethod
+    def _insert_record(record: ProtocolRecord) -> ResearchProtocol:
         with SessionLocal() as db:
             db.add(record)
             db.commit()
             db.refresh(record)
-
-        return _protocol_from_record(record)
+            return _protocol_from_record(record)
     
     @classmethod
     def get_protocol(cls, protocol_id: str) -> Optional[ResearchProtocol]:
@@ -128,23 +157,48 @@ class ProtocolService:
         roundtable_id: Optional[str] = None,
         status: Optional[str] = None,
         skip: int = 0,
-        limit: int = 100
-    ) -> List[ResearchProtocol]:
-        """获取研究方案列表"""
+        limit: int = 100,
+        uploaded_by: Optional[str] = None,
+        q: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[ProtocolResponse], Optional[str]]:
+        """获取研究方案列表，返回 (摘要列表, 下一页令牌)
+
+        按创建时间倒序键集分页，只读取摘要列；q 在标题和描述中检索。
+        令牌无效时抛出 ValueError。
+        """
         with SessionLocal() as db:
-            query = db.query(ProtocolRecord)
+            query = db.query(ProtocolRecord).options(load_only(*cls.SUMMARY_COLUMNS))
             if roundtable_id:
                 query = query.filter(ProtocolRecord.roundtable_id == roundtable_id)
             if status:
                 query = query.filter(ProtocolRecord.status == status)
-
-            records = (
-                query.order_by(ProtocolRecord.created_at.desc())
-                .offset(skip)
-                .limit(limit)
-                .all()
-            )
-            return [_protocol_from_record(record) for record in records]
+            if uploaded_by:
+                query = query.filter(ProtocolRecord.uploaded_by == uploaded_by)
+            if created_after:
+                query = query.filter(ProtocolRecord.created_at >= created_after)
+            if created_before:
+                query = query.filter(ProtocolRecord.created_at < created_before)
+            query = catalog_query.apply_search(query, ProtocolRecord, ("title", "description"), q)
+            records, next_cursor = catalog_query.fetch_page(query, ProtocolRecord, limit, cursor=cursor, skip=skip)
+            return [
+                ProtocolResponse(
+                    id=record.id,
+                    title=record.title,
+                    description=record.description,
+                    file_type=record.file_type,
+                    file_size=record.file_size,
+                    version=record.version,
+                    status=record.status,
+                    uploaded_by=record.uploaded_by,
+                    roundtable_id=record.roundtable_id,
+                    created_at=record.created_at,
+                    updated_at=record.updated_at,
+                )
+                for record in records
+            ], next_cursor
     
     @classmethod
     def update_protocol(
@@ -174,21 +228,44 @@ class ProtocolService:
     
     @classmethod
     def delete_protocol(cls, protocol_id: str) -> bool:
-        """删除研究方案"""
+        """删除研究方案
+
+        记录删除和内容引用计数减一在同一个事务里完成，文件在提交之后才删除。
+        """
         with SessionLocal() as db:
             record = db.query(ProtocolRecord).filter(ProtocolRecord.id == protocol_id).first()
             if not record:
                 return False
 
+            file_path = record.file_path
+            content_blob = (record.extra_metadata or {}).get("content_blob")
+            deleted = db.query(ProtocolRecord).filter(ProtocolRecord.id == protocol_id).delete(
+                synchronize_session=False
+            )
+            if deleted != 1:
+                # 另一个请求已经删除了这条记录
+                db.rollback()
+                return False
+            moved = None
+            try:
+                if content_blob:
+                    # 同一内容可能被多份方案引用，最后一个引用删除时才清理文件
+                    moved = ContentStore.release_in(db, content_blob)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                ContentStore.restore(moved or [])
+                raise
+
+        if content_blob:
+            ContentStore.purge(moved or [])
+        else:
             try:
-                if os.path.exists(record.file_path):
-                    os.remove(record.file_path)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
             except Exception as e:
                 print(f"删除文件失败: {e}")
-
-            db.delete(record)
-            db.commit()
-            return True
+        return True
     
     @classmethod
     def get_protocol_file(cls, protocol_id: str) -> Optional[tuple]:
@@ -206,7 +283,7 @@ class ProtocolService:
         
         这里可以集成AI模型或调用外部API进行分析
         """
-        protocol = cls.get_protocol(protocol_id)
+        protocol = await run_db(cls.get_protocol, protocol_id)
         if not protocol:
             raise ValueError("研究方案不存在")
         
@@ -0,0 +1,253 @@
+"""
+回归设计矩阵缓存与增量拟合
+
+用户调模型时通常一次只增删一个协变量，原来每次请求都要重新 get_dummies、dropna 并从头拟合。
+这里在分析进程内缓存准备好的设计矩阵：
+1. 按 (数据集版本, 结局变量, 缺失值策略, 参与建模的行) 缓存一份 PreparedDesign。参与建模的行由
+   结局变量和协变量的缺失模式决定，缺失模式相同的协变量组合共用同一份缓存；
+2. 每个协变量单独编码、按列均值中心化后追加进来，同时维护叉积 X'X、X'y。增加协变量时只补算
+   新列与已有列的叉积，删除协变量时直接取 X'X 的子矩阵；
+3. 线性回归直接由叉积求解（伪逆给出最小范数解，与 statsmodels OLS 一致），
+   逻辑回归用同一结局变量上一次拟合的系数作为初值（warm start）。
+缓存在每个分析工作进程内独立维护，按内存占用做 LRU 淘汰。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats as scipy_stats
+except Exception:  # pragma: no cover - optional dependency at runtime
+    scipy_stats = None
+
+DEFAULT_MAX_BYTES = int(os.getenv("REGRESSION_CACHE_MAX_MB", "256")) * 1024 * 1024
+# 目前只有整行删除（listwise）一种缺失值策略，作为缓存键的一部分保留
+NA_POLICY = "listwise"
+WARM_START_ENTRIES = 64
+
+
+def rows_digest(mask: np.ndarray) -> str:
+    """参与建模行的指纹"""
+    return hashlib.blake2b(np.packbits(mask).tobytes(), digest_size=16).hexdigest()
+
+
+def _encode_covariate(column: pd.DataFrame) -> Tuple[pd.DataFrame, bool]:
+    """与 pd.get_dummies(drop_first=True) 对单列的编码一致；返回编码后的数值列和是否做了哑变量展开"""
+    dummy = not column.select_dtypes(include=["object", "string", "category"]).empty
+    encoded = pd.get_dummies(column, drop_first=True)
+    return encoded.select_dtypes(include=[np.number, bool]).astype(float), dummy
+
+
+def _encode_target(target: pd.Series) -> Optional[Tuple[np.ndarray, str, Optional[Dict[str, int]]]]:
+    """结局变量编码：数值型走线性回归，布尔或二分类走逻辑回归，其他情况返回 None"""
+    if pd.api.types.is_bool_dtype(target):
+        return target.astype(int).to_numpy(dtype=np.float64), "logistic", None
+    if pd.api.types.is_numeric_dtype(target):
+        return target.to_numpy(dtype=np.float64), "linear", None
+    unique_values = list(target.unique())
+    if len(unique_values) != 2:
+        return None
+    mapping = {str(unique_values[0]): 0, str(unique_values[1]): 1}
+    return target.map(mapping).to_numpy(dtype=np.float64), "logistic", mapping
+
+
+class PreparedDesign:
+    """一组固定建模行上的中心化设计矩阵与叉积，可按协变量增量扩展"""
+
+    def __init__(self, y: np.ndarray, mode: str, target_mapping: Optional[Dict[str, int]]):
+        self.mode = mode
+        self.target_mapping = target_mapping
+        self.rows = int(y.size)
+        self.y_mean = float(y.mean())
+        self.y = y - self.y_mean
+        self.tss = float(self.y @ self.y)
+        self.names: List[str] = []
+        self.means = np.empty(0)
+        self.X = np.empty((self.rows, 0))
+        self.gram = np.empty((0, 0))
+        self.xty = np.empty(0)
+        # 协变量 -> (编码后的列名, 是否哑变量)
+        self.terms: Dict[str, Tuple[List[str], bool]] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.X.nbytes + self.y.nbytes + self.gram.nbytes)
+
+    def extend(self, frame: pd.DataFrame, covariates: List[str]) -> bool:
+        """补充尚未编码的协变量，返回是否有新增"""
+        missing = [covariate for covariate in covariates if covariate not in self.terms]
+        if not missing:
+            return False
+        blocks = []
+        for covariate in missing:
+            encoded, dummy = _encode_covariate(frame[[covariate]])
+            self.terms[covariate] = ([str(name) for name in encoded.columns], dummy)
+            blocks.append(encoded.to_numpy(dtype=np.float64))
+        new = np.column_stack(blocks) if blocks else np.empty((self.rows, 0))
+        if new.shape[1] == 0:
+            return True
+        means = new.mean(axis=0)
+        new = new - means
+        cross = self.X.T @ new
+        self.gram = np.block([[self.gram, cross], [cross.T, new.T @ new]])
+        self.xty = np.concatenate([self.xty, new.T @ self.y])
+        self.X = np.hstack([self.X, new])
+        self.means = np.concatenate([self.means, means])
+        for covariate in missing:
+            self.names.extend(self.terms[covariate][0])
+        return True
+
+    def select(self, covariates: List[str]) -> Tuple[List[str], np.ndarray]:
+        """按 get_dummies 的列顺序（先数值列，再各分类变量的哑变量）取出协变量对应的列"""
+        plain = [name for c in covariates if not self.terms[c][1] for name in self.terms[c][0]]
+        dummies = [name for c in covariates if self.terms[c][1] for name in self.terms[c][0]]
+        names = plain + dummies
+        position = {name: index for index, name in enumerate(self.names)}
+        return names, np.array([position[name] for name in names], dtype=np.int64)
+
+    def design_matrix(self, names: List[str], index: np.ndarray) -> pd.DataFrame:
+        """带常数项的原始（未中心化）设计矩阵，供 statsmodels 拟合"""
+        values = np.column_stack([np.ones(self.rows), self.X[:, index] + self.means[index]])
+        return pd.DataFrame(values, columns=["const"] + names)
+
+    def response(self) -> np.ndarray:
+        return self.y + self.y_mean
+
+    def fit_ols(self, names: List[str], index: np.ndarray, alpha: float = 0.05) -> Dict[str, Any]:
+        """由中心化叉积求解 OLS，结果与 statsmodels 的 OLS(y, add_constant(X)).fit() 一致"""
+        gram = self.gram[np.ix_(index, index)]
+        xty = self.xty[index]
+        inverse = np.linalg.pinv(gram)
+        slopes = inverse @ xty
+        rank = (int(np.linalg.matrix_rank(gram)) if index.size else 0) + 1
+        df_resid = self.rows - rank
+        rss = max(self.tss - float(slopes @ xty), 0.0)
+        sigma2 = rss / df_resid if df_resid > 0 else np.nan
+
+        # 中心化参数 (ȳ, b) 到原始参数 (b0, b) 的线性变换：b0 = ȳ - m'b
+        means = self.means[index]
+        transform = np.eye(index.size + 1)
+        transform[0, 1:] = -means
+        centered_cov = np.zeros((index.size + 1, index.size + 1))
+        centered_cov[0, 0] = sigma2 / self.rows
+        centered_cov[1:, 1:] = sigma2 * inverse
+        params = transform @ np.concatenate([[self.y_mean], slopes])
+        cov = transform @ centered_cov @ transform.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bse = np.sqrt(np.diag(cov))
+            statistic = params / bse
+        if scipy_stats is not None and df_resid > 0:
+            p_values = 2 * scipy_stats.t.sf(np.abs(statistic), df_resid)
+            margin = scipy_stats.t.ppf(1 - alpha / 2, df_resid) * bse
+        else:
+            p_values = np.full(params.size, np.nan)
+            margin = np.full(params.size, np.nan)
+
+        r_squared = 1 - rss / self.tss if self.tss > 0 else np.nan
+        adj_r_squared = 1 - (self.rows - 1) / df_resid * (1 - r_squared) if df_resid > 0 else np.nan
+        labels = ["const"] + names
+        return {
+            "params": pd.Series(params, index=labels),
+            "pvalues": pd.Series(p_values, index=labels),
+            "conf_int": pd.DataFrame({0: params - margin, 1: params + margin}, index=labels),
+            "rsquared": r_squared,
+            "rsquared_adj": adj_r_squared,
+        }
+
+
+class RegressionCache:
+    """PreparedDesign 的 LRU 缓存（按内存占用淘汰）以及逻辑回归的 warm start 系数"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[PreparedDesign, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._start_params: "OrderedDict[Tuple[str, str], Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, ...]) -> Optional[PreparedDesign]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Tuple[str, ...], design: PreparedDesign) -> None:
+        """写入或在扩展后重新登记一个设计矩阵的内存占用"""
+        size = design.nbytes
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (design, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def start_params(self, dataset_key: str, target: str, names: List[str]) -> Optional[np.ndarray]:
+        """上一次同一结局变量逻辑回归的系数；新增的项从 0 开始"""
+        with self._lock:
+            previous = self._start_params.get((dataset_key, target))
+        if previous is None:
+            return None
+        return np.array([previous.get(name, 0.0) for name in names])
+
+    def remember_params(self, dataset_key: str, target: str, params: pd.Series) -> None:
+        with self._lock:
+            self._start_params[(dataset_key, target)] = {str(k): float(v) for k, v in params.items()}
+            self._start_params.move_to_end((dataset_key, target))
+            while len(self._start_params) > WARM_START_ENTRIES:
+                self._start_params.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def prepare_design(
+    df: pd.DataFrame,
+    mask: np.ndarray,
+    target: str,
+    covariates: List[str],
+    dataset_key: Optional[str] = None,
+) -> Tuple[Optional[PreparedDesign], str]:
+    """取出（或构建、扩展）覆盖这组协变量的设计矩阵
+
+    mask 为参与建模的行；返回 (设计矩阵, 缓存状态 hit / extended / miss)，
+    结局变量既不是数值也不是二分类时设计矩阵为 None。dataset_key 为空时不使用缓存。
+    """
+    key = (dataset_key, target, NA_POLICY, rows_digest(mask)) if dataset_key else None
+    design = regression_cache.get(key) if key else None
+    status = "hit"
+    if design is None:
+        encoded = _encode_target(df.loc[mask, target])
+        if encoded is None:
+            return None, "miss"
+        design = PreparedDesign(*encoded)
+        status = "miss"
+    missing = [covariate for covariate in covariates if covariate not in design.terms]
+    if missing:
+        design.extend(df.loc[mask, missing], missing)
+        status = "extended" if status == "hit" else status
+    if key and status != "hit":
+        regression_cache.put(key, design)
+    return design, status
+
+
+# 全局缓存实例（每个分析工作进程各一份）
+regression_cache = RegressionCache()
@@ -0,0 +1,309 @@
+"""
+可合并的流式统计摘要（sketch）
+
+供大数据集的近似画像和分块分析使用，所有摘要都可以按块 update、彼此 merge，
+内存只与摘要参数有关，与数据行数无关：
+- RunningMoments：计数 / 均值 / 方差 / 最值，Welford + Chan 并行合并，结果精确；
+- HyperLogLog：去重计数，取值较少时保留精确集合，超过阈值才切换为寄存器估计；
+- QuantileSketch：KLL 式分层压缩的分位数摘要，并记录压缩引入的秩误差方差；
+- FrequentItems：Misra-Gries / Space-Saving 式高频值摘要，计数是下界，误差有上界。
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 99% 置信度对应的正态分位数
+Z_99 = 2.576
+
+
+def _mix64(bits: np.ndarray) -> np.ndarray:
+    """splitmix64 终混函数，把 64 位整数打散成均匀分布的哈希值"""
+    z = bits.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """把一列非空取值哈希成 uint64
+
+    数值统一转 float64 后按位哈希，保证跨分块的 dtype 漂移（int / float）不影响结果；
+    时间按纳秒整数哈希；其余类型交给 pandas 的对象哈希。
+    """
+    values = series.dropna()
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        floats = values.to_numpy(dtype=np.float64)
+        # -0.0 与 0.0 是同一个取值
+        floats = floats + 0.0
+        return _mix64(floats.view(np.uint64))
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return _mix64(values.to_numpy(dtype="datetime64[ns]").view(np.int64).view(np.uint64))
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class RunningMoments:
+    """流式计数、均值、方差和最值（精确）"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        other = RunningMoments()
+        other.count = int(values.size)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.minimum = float(values.min())
+        other.maximum = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "RunningMoments") -> None:
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class HyperLogLog:
+    """HyperLogLog 去重计数
+
+    不同取值不超过 exact_limit 时直接保存哈希集合，计数是精确的；
+    超过后转成 2^precision 个寄存器，相对标准误差约 1.04 / sqrt(2^precision)。
+    """
+
+    def __init__(self, precision: int = 14, exact_limit: int = 4096):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self._exact: Optional[np.ndarray] = np.empty(0, dtype=np.uint64)
+        self._registers: Optional[np.ndarray] = None
+
+    @property
+    def is_exact(self) -> bool:
+        return self._exact is not None
+
+    @property
+    def relative_error(self) -> float:
+        return 0.0 if self.is_exact else 1.04 / math.sqrt(1 << self.precision)
+
+    def _add_to_registers(self, hashes: np.ndarray) -> None:
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - p)) - 1)
+        # remainder < 2^50，转 float64 无损，frexp 的指数就是二进制位数
+        _, bit_length = np.frexp(remainder.astype(np.float64))
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def _switch_to_registers(self) -> None:
+        exact, self._exact = self._exact, None
+        self._registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._add_to_registers(exact)
+
+    def update_hashes(self, hashes: np.ndarray) -> None:
+        if hashes.size == 0:
+            return
+        if self._exact is not None:
+            self._exact = np.union1d(self._exact, hashes)
+            if self._exact.size <= self.exact_limit:
+                return
+            self._switch_to_registers()
+            return
+        self._add_to_registers(hashes)
+
+    def update(self, series: pd.Series) -> None:
+        self.update_hashes(hash_values(series))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other._exact is not None:
+            self.update_hashes(other._exact)
+            return
+        if self._exact is not None:
+            self._switch_to_registers()
+        np.maximum(self._registers, other._registers, out=self._registers)
+
+    def estimate(self) -> int:
+        if self._exact is not None:
+            return int(self._exact.size)
+        m = float(self._registers.size)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self._registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数区间用线性计数修正
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class QuantileSketch:
+    """KLL 式分位数摘要
+
+    第 h 层的每个元素代表 2^h 个原始值。某层超过 capacity 时排序后随机取奇数位或偶数位
+    升到上一层；每次压缩对任意查询点的秩误差至多为该层权重、期望为 0，
+    因此把各次压缩的权重平方累加起来，就得到秩误差的方差，可据此给出误差界。
+    """
+
+    def __init__(self, capacity: int = 256, exact_limit: int = 0, seed: Optional[int] = None):
+        """exact_limit：原始值个数不超过它时不做任何压缩，分位数是精确的"""
+        self.capacity = capacity
+        self.exact_limit = exact_limit
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.rank_variance = 0.0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.count += other.count
+        self.rank_variance += other.rank_variance
+        for height, items in enumerate(other.levels):
+            if height >= len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[height] = np.concatenate([self.levels[height], items])
+        self._compress()
+
+    def _compress(self) -> None:
+        if self.is_exact and self.levels[0].size <= self.exact_limit:
+            return
+        height = 0
+        while height < len(self.levels):
+            items = self.levels[height]
+            if items.size > self.capacity:
+                items = np.sort(items)
+                # 奇数个时留一个在本层，其余两两配对取其一
+                keep = items[-1:] if items.size % 2 else items[:0]
+                paired = items[:items.size - keep.size]
+                promoted = paired[int(self._rng.integers(2))::2]
+                self.levels[height] = keep
+                if height + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+                self.rank_variance += float(4 ** height)
+            height += 1
+
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(items.size, 2.0 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        if self.count == 0:
+            return [math.nan for _ in qs]
+        if self.is_exact:
+            # 未发生压缩时所有原始值都在第 0 层，按线性插值给出与 pandas 一致的精确分位数
+            return [float(value) for value in np.quantile(self.levels[0], qs)]
+        values, cumulative = self._weighted()
+        total = cumulative[-1]
+        results = []
+        for q in qs:
+            position = int(np.searchsorted(cumulative, q * total, side="left"))
+            results.append(float(values[min(position, values.size - 1)]))
+        return results
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    @property
+    def is_exact(self) -> bool:
+        return self.rank_variance == 0.0
+
+    @property
+    def rank_error(self) -> float:
+        """99% 置信度下的归一化秩误差（0 表示未发生压缩，结果精确）"""
+        if self.count == 0:
+            return 0.0
+        return Z_99 * math.sqrt(self.rank_variance) / self.count
+
+
+class FrequentItems:
+    """Misra-Gries / Space-Saving 式高频值摘要
+
+    最多保留 capacity 个计数器。超出时所有计数同时减去第 capacity+1 大的计数，
+    累计减去的量就是任一取值计数的最大低估量；不同取值未超过 capacity 时计数精确。
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.max_error = 0
+        self.total = 0
+
+    def _merge_counts(self, counts: pd.Series, error: int) -> None:
+        if len(self.counts):
+            # 按首次出现的顺序合并，同计数的取值排序与 value_counts 保持一致
+            merged = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum()
+        else:
+            merged = counts
+        self.max_error += error
+        if len(merged) > self.capacity:
+            threshold = merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged - threshold
+            merged = merged[merged > 0]
+            self.max_error += int(threshold)
+        self.counts = merged.astype(np.int64)
+
+    def update_counts(self, counts: pd.Series) -> None:
+        """合并一个分块的 value_counts 结果"""
+        counts = counts[counts > 0]
+        if counts.empty:
+            return
+        if isinstance(counts.index, pd.CategoricalIndex):
+            counts.index = counts.index.astype(object)
+        self.total += int(counts.sum())
+        self._merge_counts(counts, 0)
+
+    def update(self, series: pd.Series) -> None:
+        self.update_counts(series.value_counts(dropna=True, sort=False))
+
+    def merge(self, other: "FrequentItems") -> None:
+        self.total += other.total
+        self._merge_counts(other.counts, other.max_error)
+
+    @property
+    def is_exact(self) -> bool:
+        return self.max_error == 0
+
+    def top(self, n: int = 5) -> List[Tuple[Any, int]]:
+        if self.counts.empty:
+            return []
+        ordered = self.counts.sort_values(ascending=False, kind="stable")
+        return list(ordered.head(n).items())
+
+    def summary(self) -> Dict[str, Any]:
+        return {"total": self.total, "max_count_error": self.max_error}
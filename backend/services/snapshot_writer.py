@@ -0,0 +1,47 @@
+"""
+公开数据库快照写入
+
+把公开数据库（PubMed、ClinicalTrials.gov 等）的查询结果保存成服务器数据集时，原来要等全部结果
+拼成一个列表再写盘。SnapshotWriter 按页接收记录：每页展开嵌套字段（规则同 JSON 上传，
+嵌套对象为点分列名、数组为 JSON 文本）后立即写成 Parquet 分片，结束时合并成一个文件，
+内存只与单页大小有关。同一列在不同页里类型冲突（如有的记录年份是数字、有的是文本）时保存为文本。
+写出的 Parquet 本身就是列式副本，分析直接读取，不再解析。
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, List
+
+import pandas as pd
+
+from backend.services.json_stream import flatten_record
+from backend.services.parquet_parts import ChunkedParquetWriter
+
+
+class SnapshotWriter:
+    """逐页追加记录，finish 时写出 Parquet 快照"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.page_count = 0
+        self._writer = ChunkedParquetWriter(path, text_fallback=True)
+
+    @property
+    def row_count(self) -> int:
+        return self._writer.row_count
+
+    def append_page(self, records: List[Any]) -> int:
+        """写入一页记录，返回本页行数；空页不计入页数"""
+        if not records:
+            return 0
+        self._writer.append(pd.DataFrame.from_records([flatten_record(record) for record in records]))
+        self.page_count += 1
+        return len(records)
+
+    def finish(self) -> bool:
+        """合并写出快照；没有任何记录时返回 False，不留下文件"""
+        return self._writer.close()
+
+    def abort(self) -> None:
+        self._writer.abort()
+        self.path.unlink(missing_ok=True)
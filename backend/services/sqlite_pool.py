@@ -0,0 +1,295 @@
+"""
+SQLite 只读连接池与查询沙箱
+
+execute_sql 原来每次查询新开一个连接、把结果全部转成字典，再把用户 SQL 包进
+SELECT COUNT(*) 重新执行一遍计数。这里改为：
+1. 每个 SQLite 文件一个连接池，连接以 mode=ro 的 URI 打开并设置 query_only，
+   授权回调禁止 ATTACH/DETACH 和修改型 PRAGMA；
+2. 连接复用，sqlite3 模块按 SQL 文本缓存的预编译语句在多次请求之间保留；
+3. 单遍读取：跳过 offset 行、取一页，再在同一个游标上继续计数（可选只计到上限或不计数）；
+4. 每个连接挂一个进度回调，超过截止时间就中断执行，失控的查询不会一直占着工作线程；
+5. 每页行数有服务端上限，超出部分通过续页令牌（cursor token）继续读取。续页时 offset 下推到
+   SQLite（包一层 LIMIT/OFFSET，跳过的行不回到 Python），第一页已经算出的总数随令牌带回，
+   后续页不再重复计数；也可以用 NDJSON 流式读取整个结果集，内存占用与批大小有关。
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+MAX_POOLS = int(os.getenv("SQLITE_MAX_POOLS", "32"))
+STATEMENT_CACHE_SIZE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("SQL_QUERY_TIMEOUT_SECONDS", "10"))
+# 等待空闲连接的最长时间
+ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("SQLITE_POOL_ACQUIRE_TIMEOUT", "30"))
+# 进度回调的调用间隔（SQLite 虚拟机指令数）
+PROGRESS_INTERVAL = 10000
+# count_mode=estimate 时在当前页之后最多再扫描的行数
+COUNT_SCAN_ROWS = int(os.getenv("SQL_COUNT_SCAN_ROWS", "100000"))
+FETCH_BATCH_ROWS = 1000
+COUNT_MODES = ("exact", "estimate", "none")
+# 分页查询每页的最大行数
+MAX_PAGE_ROWS = int(os.getenv("SQL_MAX_PAGE_ROWS", "5000"))
+# 流式查询单次最多返回的行数、每行批的行数和执行时限（包含客户端读取的时间）
+STREAM_MAX_ROWS = int(os.getenv("SQL_STREAM_MAX_ROWS", "1000000"))
+STREAM_BATCH_ROWS = 1000
+STREAM_TIMEOUT_SECONDS = float(os.getenv("SQL_STREAM_TIMEOUT_SECONDS", "300"))
+# 可以包一层子查询下推 LIMIT/OFFSET 的语句
+_PUSHDOWN_PREFIXES = ("select", "with", "values")
+_OFFSET_PARAM = "_page_offset"
+
+# 允许的只读 PRAGMA（查看表结构用）
+READ_ONLY_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "database_list", "collation_list", "function_list",
+}
+
+
+class SQLQueryTimeoutError(ValueError):
+    """查询执行超过时限被中断"""
+
+
+def _authorizer(action: int, arg1: Optional[str], arg2: Optional[str], db_name: Optional[str], source: Optional[str]) -> int:
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_PRAGMA and ((arg1 or "").lower() not in READ_ONLY_PRAGMAS):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+class _PooledConnection:
+    """池中的一个只读连接及其当前查询的截止时间"""
+
+    def __init__(self, file_path: Path):
+        uri = f"file:{quote(str(file_path))}?mode=ro"
+        self.conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+        )
+        self.conn.execute("PRAGMA query_only = ON")
+        self.conn.set_authorizer(_authorizer)
+        self.deadline: Optional[float] = None
+        self.timed_out = False
+        self.conn.set_progress_handler(self._check_deadline, PROGRESS_INTERVAL)
+
+    def _check_deadline(self) -> int:
+        # 返回非零值让 SQLite 中断当前语句（抛出 OperationalError: interrupted）
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.timed_out = True
+            return 1
+        return 0
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+
+
+class SQLiteReadPool:
+    """单个 SQLite 文件的只读连接池"""
+
+    def __init__(self, file_path: Path, size: int = POOL_SIZE):
+        self.file_path = Path(file_path)
+        self.size = max(1, size)
+        self._idle: List[_PooledConnection] = []
+        self._created = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _acquire(self) -> _PooledConnection:
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT_SECONDS
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise ValueError("数据库连接繁忙，请稍后重试")
+        try:
+            return _PooledConnection(self.file_path)
+        except BaseException:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, pooled: _PooledConnection) -> None:
+        with self._condition:
+            if self._closed:
+                self._created -= 1
+                pooled.close()
+            else:
+                self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout_seconds: float = QUERY_TIMEOUT_SECONDS) -> Iterator[sqlite3.Connection]:
+        """借出一个连接；连接上的语句执行超过 timeout_seconds 会被中断并抛出 SQLQueryTimeoutError"""
+        pooled = self._acquire()
+        pooled.timed_out = False
+        pooled.deadline = time.monotonic() + timeout_seconds
+        try:
+            yield pooled.conn
+        except sqlite3.OperationalError as e:
+            if pooled.timed_out:
+                raise SQLQueryTimeoutError(f"SQL执行超时（超过 {timeout_seconds:g} 秒）") from e
+            raise
+        finally:
+            pooled.deadline = None
+            if pooled.conn.in_transaction:
+                pooled.conn.rollback()
+            self._release(pooled)
+
+    def close(self) -> None:
+        """关闭空闲连接；借出中的连接归还时关闭"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for pooled in idle:
+            pooled.close()
+
+
+class SQLitePoolRegistry:
+    """按文件路径管理连接池，池的数量超过上限时关闭最久未用的"""
+
+    def __init__(self, max_pools: int = MAX_POOLS):
+        self.max_pools = max(1, max_pools)
+        self._pools: "OrderedDict[str, SQLiteReadPool]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path: Path) -> SQLiteReadPool:
+        key = str(file_path)
+        evicted = []
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = SQLiteReadPool(Path(file_path))
+                while len(self._pools) > self.max_pools:
+                    evicted.append(self._pools.popitem(last=False)[1])
+            else:
+                self._pools.move_to_end(key)
+        for old in evicted:
+            old.close()
+        return pool
+
+    def close(self, file_path: Path) -> None:
+        with self._lock:
+            pool = self._pools.pop(str(file_path), None)
+        if pool is not None:
+            pool.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), OrderedDict()
+        for pool in pools:
+            pool.close()
+
+
+def fetch_page(
+    cursor: sqlite3.Cursor,
+    offset: int,
+    limit: int,
+    count_mode: str = "exact",
+    scan_rows: int = COUNT_SCAN_ROWS,
+) -> Tuple[List[Dict[str, Any]], Optional[int], bool, bool]:
+    """在一个游标上单遍读取一页结果并计数
+
+    count_mode: exact 读到结果末尾得到精确总数；estimate 在当前页之后最多再扫描 scan_rows 行，
+    超过时总数为下界；none 不计数，只多读一行判断是否还有下一页。
+    只有当前页的行转换成字典，跳过和计数的行不做转换。
+    返回 (当前页, 总行数, 总数是否精确, 是否还有下一页)。
+    """
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"不支持的计数方式: {count_mode}，可选 {', '.join(COUNT_MODES)}")
+    columns = [description[0] for description in cursor.description or []]
+    seen = 0
+    while seen < offset:
+        batch = cursor.fetchmany(min(FETCH_BATCH_ROWS, offset - seen))
+        if not batch:
+            return [], seen, True, False
+        seen += len(batch)
+
+    page = cursor.fetchmany(limit) if limit > 0 else []
+    rows = [dict(zip(columns, row)) for row in page]
+    seen += len(page)
+    if len(page) < limit:
+        return rows, seen, True, False
+    if count_mode == "none":
+        return rows, None, False, cursor.fetchone() is not None
+
+    extra = 0
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+        if not batch:
+            return rows, seen + extra, True, extra > 0
+        extra += len(batch)
+        if count_mode == "estimate" and extra >= scan_rows:
+            return rows, seen + extra, False, True
+
+
+
+def query_digest(sql: str, params: Optional[Dict[str, Any]]) -> str:
+    """SQL 与参数的指纹，续页令牌只能用于生成它的同一个查询"""
+    payload = json.dumps([sql, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def encode_cursor(digest: str, offset: int, count_mode: str, total: Optional[int]) -> str:
+    """续页令牌：查询指纹、下一页的起始行、计数方式以及（已知时）精确总行数"""
+    state = {"q": digest, "o": offset, "m": count_mode, "t": total}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, digest: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = int(state["o"])
+    except Exception:
+        raise ValueError("无效的分页令牌")
+    if state.get("q") != digest or offset < 0:
+        raise ValueError("分页令牌与当前查询不匹配")
+    return {"offset": offset, "count_mode": state.get("m") or "exact", "total": state.get("t")}
+
+
+def paginate_sql(sql: str, params: Optional[Dict[str, Any]], offset: int) -> Tuple[str, Dict[str, Any], int]:
+    """把 offset 下推到 SQLite：返回 (执行的 SQL, 参数, 仍需在 Python 端跳过的行数)
+
+    只有 SELECT / WITH / VALUES 语句可以包成子查询；换行包裹避免用户 SQL 末尾的注释吞掉右括号。
+    """
+    params = dict(params or {})
+    statement = sql.strip().rstrip(";").rstrip()
+    if offset <= 0 or not statement.lower().startswith(_PUSHDOWN_PREFIXES):
+        return sql, params, offset
+    params[_OFFSET_PARAM] = offset
+    return f"SELECT * FROM (\n{statement}\n) LIMIT -1 OFFSET :{_OFFSET_PARAM}", params, 0
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps 的 default：SQLite 的 BLOB 以 base64 字符串输出，其余类型（时间、Decimal 等）转成字符串"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return str(value)
+
+
+def ndjson_line(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, ensure_ascii=False, default=json_default) + "\n").encode()
+
+
+# 全局连接池注册表
+sqlite_pools = SQLitePoolRegistry()
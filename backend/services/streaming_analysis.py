@@ -0,0 +1,226 @@
+"""
+分块流式分析
+
+描述性统计和组间比较原来要求整份数据是一个内存中的 DataFrame。这里提供可合并的累加器，
+按块（CSV 行块、Parquet record batch、SQLite 游标批次）逐块 update，内存与数据行数无关：
+- 描述性统计复用 ColumnSketch：Welford 均值/方差、分位数摘要求中位数、高频值摘要；
+- 组间比较按分组累积 count / mean / M2（Chan 合并公式），中位数用每组的分位数摘要；
+  检验由 hypothesis_tests 直接在各组充分统计量上批量计算，不需要保留原始值。
+数据量在精确区间内（见 EXACT_QUANTILE_LIMIT / TOP_VALUES_CAPACITY）时结果与内存路径一致。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.dataset_profiler import ColumnSketch
+from backend.services.sketches import QuantileSketch
+
+# 每列（或每个分组）在这么多个值以内中位数是精确的，超过后转为分位数摘要
+EXACT_QUANTILE_LIMIT = int(os.getenv("STREAMING_EXACT_QUANTILE_LIMIT", "50000"))
+# 不同取值在这么多个以内高频值计数是精确的
+TOP_VALUES_CAPACITY = int(os.getenv("STREAMING_TOP_VALUES_CAPACITY", "1024"))
+# 所有分组中位数摘要合计的精确区间预算（值个数），变量很多时按变量数分摊
+EXACT_QUANTILE_BUDGET = int(os.getenv("STREAMING_EXACT_QUANTILE_BUDGET", "4000000"))
+# 组间比较最多允许的分组数：每个分组 × 变量都要一份中位数摘要和矩统计，高基数分组列会让内存无界增长
+MAX_GROUPS = int(os.getenv("STREAMING_MAX_GROUPS", "100"))
+
+
+def _select_variables(requested: Optional[List[str]], columns: List[Hashable]) -> List[Hashable]:
+    selected = [column for column in (requested or columns) if column in columns]
+    return selected or list(columns)
+
+
+def _group_key(key: Any) -> Any:
+    # NaN 作为字典键无法跨分块命中（NaN != NaN），统一成 None
+    return None if pd.isna(key) else key
+
+
+class DescriptiveAccumulator:
+    """描述性统计的分块累加器"""
+
+    def __init__(self, variables: Optional[List[str]] = None):
+        self.requested = variables
+        self.variables: Optional[List[Hashable]] = None
+        self.columns: List[Hashable] = []
+        self.total_rows = 0
+        self.sketches: Dict[Hashable, ColumnSketch] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.variables is None:
+            self.variables = _select_variables(self.requested, chunk.columns.tolist())
+        for column in chunk.columns:
+            if column not in self.columns:
+                self.columns.append(column)
+        self.total_rows += len(chunk)
+        for column in self.variables:
+            if column not in chunk.columns:
+                continue
+            sketch = self.sketches.get(column)
+            if sketch is None:
+                sketch = self.sketches[column] = ColumnSketch(
+                    column,
+                    chunk[column],
+                    quantile_exact_limit=EXACT_QUANTILE_LIMIT,
+                    top_capacity=TOP_VALUES_CAPACITY,
+                    track_distinct=False,
+                    detect_datetime=False,
+                )
+            sketch.update(chunk[column])
+
+    def result(self) -> Dict[str, Any]:
+        """返回未取整的原始汇总：numeric / categorical 两类变量的统计量及近似说明"""
+        numeric: Dict[Hashable, Dict[str, Any]] = {}
+        categorical: Dict[Hashable, Dict[str, Any]] = {}
+        approximate: Dict[str, Dict[str, Any]] = {}
+        for column in self.variables or []:
+            sketch = self.sketches.get(column)
+            if sketch is None:
+                continue
+            stats = sketch.finish(top_n=5)
+            missing = self.total_rows - stats.non_null_count
+            if stats.kind == "numeric":
+                numeric[column] = {"count": stats.non_null_count, **stats.numeric_summary, "missing": missing}
+            else:
+                categorical[column] = {
+                    "unique_count": stats.unique_count,
+                    "missing": missing,
+                    "top_values": stats.top_values,
+                }
+            if stats.approximate_fields:
+                approximate[str(column)] = stats.error_bounds
+        return {
+            "total_rows": self.total_rows,
+            "total_columns": len(self.columns),
+            "variables": [column for column in (self.variables or []) if column in self.sketches],
+            "numeric": numeric,
+            "categorical": categorical,
+            "approximate": approximate,
+        }
+
+
+class GroupComparisonAccumulator:
+    """按分组累积数值变量的充分统计量（count / mean / M2）和中位数摘要"""
+
+    def __init__(self, group_by: str, variables: Optional[List[str]] = None, max_groups: int = MAX_GROUPS):
+        self.group_by = group_by
+        self.requested = variables
+        self.max_groups = max_groups
+        self.numeric_vars: Optional[List[Hashable]] = None
+        self.count: Optional[pd.DataFrame] = None
+        self.mean: Optional[pd.DataFrame] = None
+        self.m2: Optional[pd.DataFrame] = None
+        self.medians: Dict[Any, QuantileSketch] = {}
+        self.exact_limit = EXACT_QUANTILE_LIMIT
+
+    def _resolve(self, chunk: pd.DataFrame) -> None:
+        variables = _select_variables(self.requested, chunk.columns.tolist())
+        self.numeric_vars = [column for column in variables if pd.api.types.is_numeric_dtype(chunk[column])]
+        if self.numeric_vars:
+            # 变量很多时按总预算分摊每个中位数摘要的精确区间
+            self.exact_limit = min(EXACT_QUANTILE_LIMIT, max(256, EXACT_QUANTILE_BUDGET // len(self.numeric_vars)))
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.group_by not in chunk.columns:
+            return
+        if self.numeric_vars is None:
+            self._resolve(chunk)
+        if not self.numeric_vars:
+            return
+
+        values = chunk[self.numeric_vars]
+        drifted = [column for column in self.numeric_vars if not pd.api.types.is_numeric_dtype(values[column])]
+        if drifted:
+            values = values.copy()
+            for column in drifted:
+                values[column] = pd.to_numeric(values[column], errors="coerce")
+        values = values.astype(np.float64)
+        grouped = values.groupby(chunk[self.group_by], dropna=False, sort=False)
+
+        count = grouped.count()
+        self._check_groups(count.index)
+        mean = grouped.mean().fillna(0.0)
+        m2 = (grouped.var(ddof=1) * (count - 1)).fillna(0.0)
+        self._merge(count, mean, m2)
+
+        matrix = values.to_numpy()
+        for key, positions in grouped.indices.items():
+            normalized = _group_key(key)
+            block = matrix[positions]
+            for offset, column in enumerate(self.numeric_vars):
+                sketch = self.medians.get((normalized, column))
+                if sketch is None:
+                    sketch = self.medians[(normalized, column)] = QuantileSketch(exact_limit=self.exact_limit)
+                sketch.update(block[:, offset])
+
+    def _check_groups(self, keys: pd.Index) -> None:
+        """在创建新分组的统计量之前检查分组数，超过上限直接报错"""
+        total = len(keys) if self.count is None else len(self.count.index.union(keys))
+        if total > self.max_groups:
+            raise ValueError(
+                f"分组变量 {self.group_by} 的取值超过 {self.max_groups} 个，不适合做组间比较，"
+                f"请选择取值较少的分组变量（上限可通过 STREAMING_MAX_GROUPS 调整）"
+            )
+
+    def _merge(self, count: pd.DataFrame, mean: pd.DataFrame, m2: pd.DataFrame) -> None:
+        """Chan 并行合并：两批数据的均值和离差平方和可以按计数加权精确合并"""
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        count_a, count_b = self.count.align(count, fill_value=0)
+        mean_a, mean_b = self.mean.align(mean, fill_value=0.0)
+        m2_a, m2_b = self.m2.align(m2, fill_value=0.0)
+        total = count_a + count_b
+        safe_total = total.where(total > 0, 1)
+        delta = mean_b - mean_a
+        self.mean = mean_a + delta * count_b / safe_total
+        self.m2 = m2_a + m2_b + delta * delta * count_a * count_b / safe_total
+        self.count = total
+
+    def _ordered_groups(self) -> List[Any]:
+        keys = list(self.count.index)
+        try:
+            # 与 groupby(sort=True, dropna=False) 一致：取值排序，缺失分组排最后
+            return list(pd.Index(keys).sort_values(na_position="last"))
+        except TypeError:
+            return keys
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """返回 (分组 × 变量) 的 count / mean / var / median 矩阵（分组按取值排序），无数据时返回 None"""
+        if self.count is None:
+            return None
+
+        groups = self._ordered_groups()
+        count = self.count.reindex(index=groups, columns=self.numeric_vars).to_numpy(dtype=np.float64)
+        mean = self.mean.reindex(index=groups, columns=self.numeric_vars).to_numpy(dtype=np.float64)
+        m2 = self.m2.reindex(index=groups, columns=self.numeric_vars).to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = np.where(count > 1, m2 / (count - 1), np.nan)
+        mean = np.where(count > 0, mean, np.nan)
+
+        median = np.full(count.shape, np.nan)
+        approximate: Dict[str, Dict[str, Any]] = {}
+        for j, column in enumerate(self.numeric_vars):
+            rank_errors = []
+            for i, key in enumerate(groups):
+                sketch = self.medians.get((_group_key(key), column))
+                if sketch is None:
+                    continue
+                median[i, j] = sketch.quantile(0.5)
+                if not sketch.is_exact:
+                    rank_errors.append(sketch.rank_error)
+            if rank_errors:
+                approximate[str(column)] = {"median": {"rank_error": round(max(rank_errors), 6)}}
+
+        return {
+            "groups": groups,
+            "numeric_vars": self.numeric_vars,
+            "count": count,
+            "mean": mean,
+            "var": var,
+            "median": median,
+            "approximate": approximate,
+        }
@@ -61,11 +61,23 @@ class DatabaseColumn(BaseModel):
     nullable: bool = True
     description: Optional[str] = None
 
+class DatabaseTable(BaseModel):
+    """数据文件中的一张表（Excel 工作表 / SQLite 表或视图）"""
+    name: str
+    kind: str = "table"  # table, view, sheet
+    row_count: Optional[int] = None
+    row_count_exact: bool = True  # False 表示来自索引统计或 rowid 的估计值
+    column_count: Optional[int] = None
+    columns: List[DatabaseColumn] = []
+    primary_key: Optional[List[str]] = None
+    indexes: Optional[List[Dict[str, Any]]] = None
+
 class DatabaseSchema(BaseModel):
     """数据库Schema信息"""
     columns: List[DatabaseColumn]
     primary_key: Optional[List[str]] = None
     indexes: Optional[List[Dict[str, Any]]] = None
+    tables: Optional[List[DatabaseTable]] = None  # 多表文件的全部表，columns 对应默认读取的第一张表
 
 class ResearchDatabase(BaseModel):
     """研究数据库数据模型"""
@@ -114,6 +126,23 @@ class DatabaseResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class DatabaseSummary(BaseModel):
+    """数据库列表项：只含摘要字段，不带 schema"""
+    id: str
+    name: str
+    description: Optional[str] = None
+    file_type: str
+    file_size: int
+    row_count: Optional[int] = None
+    column_count: Optional[int] = None
+    uploaded_by: Optional[str] = None
+    roundtable_id: Optional[str] = None
+    protocol_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    # 只保留列表展示需要的元数据键，见 DatabaseService.SUMMARY_METADATA_KEYS
+    metadata: Optional[Dict[str, Any]] = None
+
 class DatabasePreview(BaseModel):
     """数据库预览响应"""
     columns: List[str]
@@ -136,6 +165,11 @@ class AnalysisConfig(BaseModel):
     sample_rows: int = 1000
     max_categories: int = 10
     hypothesis: Optional[str] = None
+    timeout_seconds: Optional[float] = None  # 单任务超时，默认取 ANALYSIS_TASK_TIMEOUT
+    streaming: Optional[bool] = None  # 分块流式执行；None 时按数据集大小自动选择
+    p_adjust_method: str = "fdr_bh"  # 多重检验校正：fdr_bh, holm, bonferroni, none
+    correlation_method: str = "pearson"  # 相关系数：pearson, spearman
+    table: Optional[str] = None  # 多表文件（SQLite / Excel）中要分析的表，默认第一张
 
 class AnalysisTask(BaseModel):
     """分析任务数据模型"""
@@ -144,7 +178,7 @@ class AnalysisTask(BaseModel):
     description: Optional[str] = None
     database_id: str
     analysis_type: str  # descriptive, comparative, correlation, regression, custom
-    status: str = "pending"  # pending, running, completed, failed
+    status: str = "pending"  # pending, running, completed, failed, cancelled
     config: Optional[AnalysisConfig] = None
     result: Optional[Dict[str, Any]] = None
     error_message: Optional[str] = None
@@ -184,12 +218,16 @@ class ColumnProfile(BaseModel):
     sample_values: List[Any] = []
     numeric_summary: Optional[Dict[str, Any]] = None
     categorical_summary: Optional[Dict[str, Any]] = None
+    approximate_fields: List[str] = []  # 近似画像模式下为估计值的字段
+    error_bounds: Dict[str, Any] = {}
+
 
 
 class DatabaseProfile(BaseModel):
     """数据库分析画像"""
     database_id: str
     database_name: str
+    table: Optional[str] = None  # 多表数据库（SQLite / Excel）画像对应的表
     total_rows: int
     total_columns: int
     numeric_columns: List[str]
@@ -199,6 +237,7 @@ class DatabaseProfile(BaseModel):
     recommended_targets: List[str]
     missingness_overview: List[Dict[str, Any]]
     column_profiles: List[ColumnProfile]
+    profile_mode: str = "exact"  # exact, sketch
     generated_at: datetime
 
 
@@ -222,6 +261,7 @@ class AnalysisPlanRequest(BaseModel):
     preferred_analysis_types: List[str] = []
     required_outputs: List[str] = []
     constraints: List[str] = []
+    table: Optional[str] = None  # 多表文件中要规划的表，默认第一张
 
 
 class AnalysisPlanResponse(BaseModel):
@@ -233,6 +273,23 @@ class AnalysisPlanResponse(BaseModel):
     recommended_agents: List[str]
     execution_notes: List[str]
 
+
+class AnalysisPlanStep(BaseModel):
+    """分析规划中的一个执行步骤"""
+    analysis_type: str
+    title: Optional[str] = None
+    config: Optional[AnalysisConfig] = None
+
+
+class AnalysisPlanExecuteRequest(BaseModel):
+    """整份分析规划一次执行的请求"""
+    database_id: str
+    steps: List[AnalysisPlanStep] = []  # 为空时按数据画像生成建议步骤
+    suggested_analyses: List[AnalysisSuggestion] = []  # 也可以直接传 /plan 返回的 suggested_analyses
+    preferred_analysis_types: List[str] = []
+    timeout_seconds: Optional[float] = None  # 整份规划的超时，默认按步骤数放大单任务超时
+    table: Optional[str] = None  # 多表文件中要分析的表（整份规划共用，步骤里的 config.table 不生效）
+
 # ============== API调用日志模型 ==============
 
 class APICallLog(BaseModel):
@@ -255,12 +312,19 @@ class SQLQuery(BaseModel):
     params: Optional[Dict[str, Any]] = None
     limit: int = 100
     offset: int = 0
+    # exact: 同一遍扫描精确计数；estimate: 最多多扫描一定行数，超过时返回下界；none: 不计数
+    count_mode: str = "exact"
+    # 上一页返回的 next_cursor；带上时 offset 与计数方式以令牌为准
+    cursor: Optional[str] = None
 
 class SQLQueryResult(BaseModel):
     """SQL查询结果"""
     columns: List[str]
     rows: List[Dict[str, Any]]
-    total_count: int
+    total_count: Optional[int] = None
+    total_count_exact: bool = True
+    has_more: bool = False
+    next_cursor: Optional[str] = None
     execution_time_ms: int
 
 # ============== 外部API调用模型 ==============
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark SQL aggregates on an uploaded CSV: columnar engine vs the pandas path.
+
+Uploads a synthetic CSV through DatabaseService (which writes the Parquet copy),
+then runs a few filter/group-by aggregates two ways:
+
+* columnar: the /query path, DuckDB scanning the Parquet copy with projection
+  and predicate pushdown;
+* pandas: load the dataset the way analyses do (full Parquet read into a
+  DataFrame), then filter and group in pandas. "cold" includes the load,
+  "warm" reuses the already loaded frame.
+
+Checks that both return the same numbers and prints wall time for each.
+
+    python scripts/bench_columnar_sql.py --rows 1000000 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.upload_models import SQLQuery  # noqa: E402
+
+QUERIES = {
+    "filtered group-by": (
+        "SELECT arm, count(*) AS n, avg(sbp) AS mean_sbp FROM data WHERE age >= 65 GROUP BY arm ORDER BY arm",
+        lambda df: df[df["age"] >= 65].groupby("arm")["sbp"].agg(n="count", mean_sbp="mean").reset_index(),
+    ),
+    "selective filter": (
+        "SELECT count(*) AS n, max(ldl) AS max_ldl FROM data WHERE site = 'site_7' AND bmi > 35",
+        lambda df: pd.DataFrame([{
+            "n": int(((df["site"] == "site_7") & (df["bmi"] > 35)).sum()),
+            "max_ldl": df.loc[(df["site"] == "site_7") & (df["bmi"] > 35), "ldl"].max(),
+        }]),
+    ),
+    "two-key group-by": (
+        "SELECT site, sex, avg(ldl) AS mean_ldl FROM data GROUP BY site, sex ORDER BY site, sex",
+        lambda df: df.groupby(["site", "sex"])["ldl"].mean().rename("mean_ldl").reset_index(),
+    ),
+}
+
+
+def build_csv(rows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "patient_id": np.arange(rows),
+        "site": np.array([f"site_{i}" for i in range(20)])[rng.integers(0, 20, rows)],
+        "arm": rng.choice(["placebo", "low", "high"], rows),
+        "sex": rng.choice(["F", "M"], rows),
+        "age": rng.integers(18, 95, rows),
+        "bmi": rng.normal(27, 5, rows).round(1),
+        "sbp": rng.normal(130, 15, rows).round(0),
+        "ldl": rng.normal(3.2, 0.8, rows).round(2),
+    })
+    for column in [f"lab_{i}" for i in range(4)]:
+        df[column] = rng.normal(size=rows).round(3)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def best_of(repeat: int, fn) -> tuple:
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    database = asyncio.run(DatabaseService.upload_database(build_csv(args.rows), "bench.csv", "bench"))
+    try:
+        file_path, file_type = DatabaseService.resolve_dataset_file(database)
+        print(f"{args.rows:,} rows, dataset file {file_path.name} ({file_type}, {file_path.stat().st_size / 1e6:.1f} MB)")
+        print(f"{'query':<20} {'columnar':>10} {'pandas cold':>12} {'pandas warm':>12}")
+        loaded = pd.read_parquet(file_path)
+        for name, (sql, pandas_fn) in QUERIES.items():
+            columnar, result = best_of(
+                args.repeat, lambda: DatabaseService._run_columnar_sql(database, SQLQuery(sql=sql, limit=1000))
+            )
+            cold, expected = best_of(args.repeat, lambda: pandas_fn(pd.read_parquet(file_path)))
+            warm, _ = best_of(args.repeat, lambda: pandas_fn(loaded))
+            got = pd.DataFrame(result.rows)
+            pd.testing.assert_frame_equal(
+                got.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False, rtol=1e-9
+            )
+            print(f"{name:<20} {columnar:>9.3f}s {cold:>11.3f}s {warm:>11.3f}s")
+    finally:
+        DatabaseService.delete_database(database.id)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
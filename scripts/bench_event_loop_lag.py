@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Measure event-loop lag under concurrent dataset uploads and previews.
+
+Runs the same workload twice on one event loop: once with blocking I/O called
+inline (OFFLOAD_BLOCKING_IO off, the old behaviour) and once offloaded to the
+disk / db thread pools. The workload is:
+
+* --uploads concurrent CSV uploads of --rows rows each (distinct contents, so
+  every upload is parsed and converted to Parquet);
+* --previews concurrent uncached previews (limit above the cached head, so
+  each one reads the data file) plus catalog listings.
+
+While it runs, LoopLagMonitor samples how late the loop wakes up. The report
+shows lag percentiles, the worst stall and wall time for each mode.
+
+    python scripts/bench_event_loop_lag.py --uploads 8 --rows 200000 --previews 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.database import init_db  # noqa: E402
+from backend.services import io_pools  # noqa: E402
+from backend.services.database_service import PREVIEW_CACHE_ROWS, DatabaseService  # noqa: E402
+
+
+def build_csv(rows: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "patient_id": np.arange(rows),
+        "arm": rng.choice(["placebo", "low", "high"], rows),
+        "age": rng.integers(18, 95, rows),
+        "sbp": rng.normal(130, 15, rows).round(0),
+        "ldl": rng.normal(3.2, 0.8, rows).round(2),
+    })
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+async def run_workload(payloads, preview_ids, previews: int) -> float:
+    started = time.perf_counter()
+    uploads = [
+        DatabaseService.upload_database(payload, "bench.csv", f"lag-bench-{i}")
+        for i, payload in enumerate(payloads)
+    ]
+    reads = []
+    for i in range(previews):
+        database_id = preview_ids[i % len(preview_ids)]
+        reads.append(DatabaseService.get_preview(database_id, limit=PREVIEW_CACHE_ROWS * 5))
+        reads.append(io_pools.run_db(DatabaseService.get_databases, limit=50))
+    results = await asyncio.gather(*uploads, *reads)
+    elapsed = time.perf_counter() - started
+    for database in results[:len(uploads)]:
+        await io_pools.run_db(DatabaseService.delete_database, database.id)
+    return elapsed
+
+
+async def measure(offload: bool, payloads, preview_ids, previews: int) -> dict:
+    io_pools.OFFLOAD_BLOCKING_IO = offload
+    monitor = io_pools.loop_lag_monitor
+    monitor.start()
+    # let the monitor enter its first sleep before the workload can block the loop,
+    # and wake up once more afterwards so a stall at the very end is recorded
+    await asyncio.sleep(monitor.interval * 2)
+    monitor.reset()
+    try:
+        elapsed = await run_workload(payloads, preview_ids, previews)
+        await asyncio.sleep(monitor.interval * 2)
+    finally:
+        stats = monitor.snapshot()
+        await monitor.stop()
+    stats["wall_seconds"] = elapsed
+    return stats
+
+
+async def main_async(args) -> int:
+    init_db()
+    payloads = [build_csv(args.rows, seed) for seed in range(args.uploads)]
+    # preview targets are uploaded up front and not part of the measurement
+    preview_sources = [
+        await DatabaseService.upload_database(build_csv(args.rows, 1000 + i), "bench.csv", f"lag-bench-preview-{i}")
+        for i in range(2)
+    ]
+    try:
+        preview_ids = [database.id for database in preview_sources]
+        print(
+            f"{args.uploads} uploads x {args.rows:,} rows, {args.previews} previews + listings, "
+            f"disk pool {io_pools.DISK_IO_WORKERS}, db pool {io_pools.DB_IO_WORKERS}"
+        )
+        print(f"{'mode':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>9} {'stalls':>7} {'wall':>8}")
+        for label, offload in (("inline", False), ("offload", True)):
+            stats = await measure(offload, payloads, preview_ids, args.previews)
+            print(
+                f"{label:<8} {stats['p50_ms']:>6.1f}ms {stats['p95_ms']:>6.1f}ms {stats['p99_ms']:>6.1f}ms "
+                f"{stats['max_ms']:>7.1f}ms {stats['stalls']:>7} {stats['wall_seconds']:>7.2f}s"
+            )
+    finally:
+        io_pools.OFFLOAD_BLOCKING_IO = True
+        for database in preview_sources:
+            DatabaseService.delete_database(database.id)
+        io_pools.shutdown()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--previews", type=int, default=40)
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Benchmark the single-pass dataset profiler against the old per-column loop.
+
+Builds a synthetic frame (default 1,000,000 rows x 200 columns: floats with
+missing values, integers, low-cardinality strings and timestamps), checks that
+both implementations agree, and prints wall time and peak traced memory. The
+streaming sketch profiler is timed over the same frame in fixed-size chunks.
+
+    python scripts/bench_profiler.py --rows 1000000 --cols 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.services.dataset_profiler import profile_dataframe, sketch_profile  # noqa: E402
+
+
+def build_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    categories = np.array(["control", "treatment", "placebo", "unknown"], dtype=object)
+    data: Dict[str, Any] = {}
+    for i in range(cols):
+        kind = i % 10
+        if kind < 5:
+            values = rng.normal(50, 10, rows)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"lab_{i}"] = values
+        elif kind < 8:
+            data[f"score_{i}"] = rng.integers(0, 1000, rows)
+        elif kind == 8:
+            data[f"group_{i}"] = categories[rng.integers(0, len(categories), rows)]
+        else:
+            data[f"visit_{i}"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(
+                rng.integers(0, 365, rows), unit="D"
+            )
+    return pd.DataFrame(data)
+
+
+def legacy_profile(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """The previous implementation: every statistic is a separate scan."""
+    result: Dict[str, Dict[str, Any]] = {}
+    for column in df.columns:
+        series = df[column]
+        entry: Dict[str, Any] = {
+            "non_null": int(series.notna().sum()),
+            "missing": int(series.isna().sum()),
+            "unique": int(series.nunique(dropna=True)),
+        }
+        if pd.api.types.is_numeric_dtype(series):
+            entry.update(
+                mean=series.mean(), std=series.std(), min=series.min(),
+                median=series.median(), max=series.max(),
+            )
+        elif not pd.api.types.is_datetime64_any_dtype(series):
+            entry["top"] = list(series.value_counts(dropna=True).head(5).items())
+        result[column] = entry
+    # recommendation logic re-scanned every column again
+    for column in df.columns:
+        df[column].nunique(dropna=True)
+    return result
+
+
+def check_equivalent(df: pd.DataFrame, legacy: Dict[str, Dict[str, Any]]) -> None:
+    stats = profile_dataframe(df)
+    for column, expected in legacy.items():
+        actual = stats.columns[column]
+        assert actual.non_null_count == expected["non_null"], column
+        assert actual.unique_count == expected["unique"], column
+        if actual.numeric_summary is not None:
+            for key, value in actual.numeric_summary.items():
+                reference = math.nan if pd.isna(expected[key]) else float(expected[key])
+                assert math.isclose(value, reference, rel_tol=1e-9, abs_tol=1e-9) or (
+                    math.isnan(value) and math.isnan(reference)
+                ), (column, key, value, reference)
+        if actual.top_values is not None:
+            assert actual.top_values == expected["top"], column
+
+
+def measure(label: str, func: Callable[[], Any]) -> Any:
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:8.2f} s   peak {peak / 1024 / 1024:8.1f} MiB")
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=200)
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="chunk size for the sketch pass")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the new profiler")
+    args = parser.parse_args()
+
+    print(f"building {args.rows:,} x {args.cols} frame ...")
+    df = build_frame(args.rows, args.cols)
+    print(f"frame size {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MiB")
+
+    measure("single-pass", lambda: profile_dataframe(df))
+    measure(
+        "sketch",
+        lambda: sketch_profile(df.iloc[start:start + args.chunk_rows] for start in range(0, len(df), args.chunk_rows)),
+    )
+    if not args.skip_legacy:
+        legacy = measure("legacy", lambda: legacy_profile(df))
+        check_equivalent(df, legacy)
+        print("results match")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Local fake servers for the biomedical database connectors.
+
+Serves deterministic canned responses shaped like the real upstream APIs, so
+the live connectors in backend/services/connectors can be exercised offline:
+
+* NCBI E-utilities  -- /eutils/esearch.fcgi, /eutils/esummary.fcgi
+  (db=pubmed and db=clinvar, retstart/retmax paging)
+* ClinicalTrials.gov v2 -- /ctgov/studies, /ctgov/studies/<nctId>
+  (pageSize/pageToken paging, filter.overallStatus)
+* Europe PMC -- /europepmc/search (pageSize/cursorMark paging)
+
+Every source holds --records records per query, so pagination, rate limiting
+and caching are visible. Queries containing "fail" return HTTP 500.
+
+    # point a dev server at the fakes
+    python scripts/fake_biomedical_sources.py --serve --port 8765
+
+    # run every connector against the fakes and assert the results
+    python scripts/fake_biomedical_sources.py --check
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+STATUSES = ["RECRUITING", "COMPLETED", "ACTIVE_NOT_RECRUITING"]
+
+
+def _pubmed_summary(uid: str, n: int) -> Dict[str, Any]:
+    return {
+        "uid": uid,
+        "title": f"Study {n} of the fake corpus",
+        "authors": [{"name": "Zhang S"}, {"name": "Li W"}],
+        "fulljournalname": "Journal of Fake Medicine",
+        "source": "J Fake Med",
+        "pubdate": f"{2000 + n % 25} Jan",
+        "articleids": [{"idtype": "pubmed", "value": uid}, {"idtype": "doi", "value": f"10.9999/fake.{n}"}],
+    }
+
+
+def _clinvar_summary(uid: str, n: int) -> Dict[str, Any]:
+    return {
+        "uid": uid,
+        "accession": f"VCV{int(uid):09d}",
+        "title": f"NM_000000.{n}(FAKE1):c.{n}A>G",
+        "genes": [{"symbol": "FAKE1"}],
+        "germline_classification": {
+            "description": "Pathogenic" if n % 2 else "Benign",
+            "trait_set": [{"trait_name": "Fake syndrome"}],
+        },
+        "variation_set": [{"variation_loc": [
+            {"status": "current", "assembly_name": "GRCh38", "chr": "1", "start": str(1000000 + n)},
+        ]}],
+    }
+
+
+def _study(n: int) -> Dict[str, Any]:
+    return {"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{n:08d}", "briefTitle": f"Fake trial {n}"},
+        "statusModule": {"overallStatus": STATUSES[n % 3], "startDateStruct": {"date": "2024-01"}},
+        "designModule": {"phases": ["PHASE3"], "enrollmentInfo": {"count": 100 + n}},
+        "conditionsModule": {"conditions": ["Fake disease"]},
+        "sponsorCollaboratorsModule": {"leadSponsor": {"name": "Fake Sponsor"}},
+        "contactsLocationsModule": {"locations": [{"country": "China"}, {"country": "China"}, {"country": "USA"}]},
+    }}
+
+
+class FakeSources:
+    """Canned corpus shared by the request handlers, with a request counter."""
+
+    def __init__(self, records: int):
+        self.records = records
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, Any]:
+        if "fail" in " ".join(params.values()):
+            return 500, {"error": "fake upstream failure"}
+        if path == "/eutils/esearch.fcgi":
+            start, size = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+            base = 38000000 if params.get("db") == "pubmed" else 100
+            ids = [str(base + n) for n in range(start, min(start + size, self.records))]
+            return 200, {"esearchresult": {"count": str(self.records), "retstart": str(start), "idlist": ids}}
+        if path == "/eutils/esummary.fcgi":
+            pubmed = params.get("db") == "pubmed"
+            base = 38000000 if pubmed else 100
+            uids = [uid for uid in params.get("id", "").split(",") if uid and 0 <= int(uid) - base < self.records]
+            result: Dict[str, Any] = {"uids": uids}
+            for uid in uids:
+                n = int(uid) - base
+                result[uid] = _pubmed_summary(uid, n) if pubmed else _clinvar_summary(uid, n)
+            return 200, {"result": result}
+        if path == "/ctgov/studies":
+            numbers = list(range(self.records))
+            if params.get("filter.overallStatus"):
+                numbers = [n for n in numbers if STATUSES[n % 3] == params["filter.overallStatus"]]
+            start, size = int(params.get("pageToken") or 0), int(params.get("pageSize", 10))
+            payload: Dict[str, Any] = {"studies": [_study(n) for n in numbers[start:start + size]]}
+            if params.get("countTotal") == "true":
+                payload["totalCount"] = len(numbers)
+            if start + size < len(numbers):
+                payload["nextPageToken"] = str(start + size)
+            return 200, payload
+        if path.startswith("/ctgov/studies/NCT"):
+            n = int(path.rsplit("NCT", 1)[1])
+            return (200, _study(n)) if n < self.records else (404, {"message": "not found"})
+        if path == "/europepmc/search":
+            query = params.get("query", "")
+            if query.startswith("EXT_ID:"):
+                numbers = [int(query[7:]) - 1000] if query[7:].isdigit() and int(query[7:]) - 1000 < self.records else []
+            else:
+                numbers = list(range(self.records))
+            cursor = params.get("cursorMark", "*")
+            start, size = (0 if cursor == "*" else int(cursor)), int(params.get("pageSize", 25))
+            page = numbers[start:start + size]
+            return 200, {
+                "hitCount": len(numbers),
+                "nextCursorMark": str(start + len(page)) if page else cursor,
+                "resultList": {"result": [
+                    {"id": str(1000 + n), "source": "MED", "pmid": str(1000 + n), "title": f"Europe PMC paper {n}",
+                     "authorString": "Wang H, Chen L.", "journalTitle": "Fake Reports", "pubYear": "2023",
+                     "citedByCount": n}
+                    for n in page
+                ]},
+            }
+        return 404, {"error": f"unknown path {path}"}
+
+
+def make_server(port: int, records: int) -> Tuple[ThreadingHTTPServer, FakeSources]:
+    sources = FakeSources(records)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802 - http.server API
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            sources.count(url.path)
+            status, payload = sources.handle(url.path, params)
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler), sources
+
+
+def env_vars(base: str) -> Dict[str, str]:
+    return {
+        "NCBI_EUTILS_URL": f"{base}/eutils",
+        "CLINICALTRIALS_API_URL": f"{base}/ctgov",
+        "EUROPEPMC_API_URL": f"{base}/europepmc",
+    }
+
+
+async def run_checks(base: str, records: int, sources: FakeSources) -> None:
+    from backend.services.connectors import (
+        ClinVarConnector, ClinicalTrialsConnector, ConnectorError, ConnectorHTTP, EuropePMCConnector,
+        PubMedConnector,
+    )
+
+    http = ConnectorHTTP()
+    urls = env_vars(base)
+    connectors = [
+        PubMedConnector(http, base_url=urls["NCBI_EUTILS_URL"], api_key="fake-key"),
+        ClinVarConnector(http, base_url=urls["NCBI_EUTILS_URL"], api_key="fake-key"),
+        ClinicalTrialsConnector(http, base_url=urls["CLINICALTRIALS_API_URL"]),
+        EuropePMCConnector(http, base_url=urls["EUROPEPMC_API_URL"]),
+    ]
+    sample_ids = {"pubmed": "38000003", "clinvar": "103", "clinicaltrials-gov": "NCT00000003", "europe-pmc": "1003"}
+    want = min(records, 450)
+    try:
+        for connector in connectors:
+            started = time.perf_counter()
+            page = await connector.search("fake", {}, limit=10)
+            assert len(page.records) == 10 and page.total == records and page.next_cursor, connector.source_id
+
+            rows, pages = 0, 0
+            async for chunk in connector.paginate("fake", {}, limit=want):
+                rows += len(chunk)
+                pages += 1
+            assert rows == want, (connector.source_id, rows)
+
+            record = await connector.fetch(sample_ids[connector.source_id])
+            assert record is not None, connector.source_id
+            missing = await connector.fetch("NCT99999999" if connector.source_id == "clinicaltrials-gov" else "99999")
+            assert missing is None, connector.source_id
+
+            # the identical request is answered from the response cache
+            hits, requests = http.stats[connector.source_id].cache_hits, http.stats[connector.source_id].requests
+            await connector.search("fake", {}, limit=10)
+            assert http.stats[connector.source_id].requests == requests, connector.source_id
+            assert http.stats[connector.source_id].cache_hits > hits, connector.source_id
+
+            try:
+                await connector.search("fail", {}, limit=10)
+                raise AssertionError(f"{connector.source_id}: upstream failure not raised")
+            except ConnectorError:
+                pass
+            print(
+                f"{connector.source_id:20s} {rows:5d} rows in {pages:2d} pages, "
+                f"{(time.perf_counter() - started) * 1000:7.1f} ms, stats {http.stats[connector.source_id].as_dict()}"
+            )
+
+        recruiting = await connectors[2].search("", {"status": "recruiting"}, limit=1000)
+        assert all(row["status"] == "RECRUITING" for row in recruiting.records) and recruiting.records
+        assert connectors[2].__class__(http, base_url=urls["CLINICALTRIALS_API_URL"])._query_params(
+            "", {"phase": "Phase III"}
+        )["filter.advanced"] == "AREA[Phase]PHASE3"
+        assert "2019:2024[dp]" in connectors[0].build_term("aspirin", {"year_from": 2019, "year_to": 2024})
+    finally:
+        await http.aclose()
+    print("upstream requests:", dict(sorted(sources.requests.items())))
+    print("all connector checks passed")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--serve", action="store_true", help="serve the fakes until interrupted")
+    mode.add_argument("--check", action="store_true", help="run every connector against the fakes")
+    parser.add_argument("--port", type=int, default=0, help="port to listen on (0 picks a free one)")
+    parser.add_argument("--records", type=int, default=1200, help="records per source")
+    args = parser.parse_args()
+
+    server, sources = make_server(args.port, args.records)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print("fake biomedical sources listening; start the app with:")
+        for key, value in env_vars(base).items():
+            print(f"  export {key}={value}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run(run_checks(base, args.records, sources))
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())